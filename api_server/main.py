@@ -1,17 +1,36 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, EmailStr, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from jose import jwt
+import asyncio
+import base64
+import hashlib
+import json
 import os
-from uuid import uuid4
+import re
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from uuid import UUID, uuid4, uuid5
 import motor.motor_asyncio
+from bson import json_util
+from pymongo import ASCENDING, DESCENDING, TEXT, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 from passlib.context import CryptContext
 
+# zstandard 가 설치되어 있으면 메시지 압축에 zstd 사용 (없으면 zlib)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 app = FastAPI(title="Pensieve API", version="1.0.0")
 
 # CORS 설정
@@ -21,6 +40,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 # 환경 변수
@@ -29,17 +49,235 @@ JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = "pensieve"
+# 인증된 사용자 조회 캐시 (TTL 초, 최대 항목 수)
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1024"))
+# 비밀번호 해시 전용 스레드 수와 대기열 한도 (초과 시 503)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+# 대량 가져오기 시 insert_many 한 번에 넣을 문서 수와 한 줄(대화 하나)의 최대 크기
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "200"))
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", str(16 * 1024 * 1024)))
+# 내보내기 시 Mongo 커서가 한 번에 가져올 문서 수 (기본값/최대값)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "100"))
+EXPORT_MAX_BATCH_SIZE = 1000
+# 변경 동기화: 아직 커밋 중일 수 있는 최근 쓰기를 건너뛰는 시간, 한 번에 돌려줄 최대 변경 수,
+# 삭제 기록(tombstone) 보관 기간 - 이보다 오래 동기화하지 않은 클라이언트는 삭제를 놓칠 수 있음
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "2"))
+SYNC_MAX_CHANGES = 500
+TOMBSTONE_TTL_DAYS = int(os.getenv("TOMBSTONE_TTL_DAYS", "90"))
+# append 중복 방지: 대화별로 기억할 Idempotency-Key 수, dedup append 가 비교하는 마지막 메시지 해시 수
+APPEND_KEY_HISTORY = int(os.getenv("APPEND_KEY_HISTORY", "50"))
+APPEND_TAIL_HASHES = int(os.getenv("APPEND_TAIL_HASHES", "50"))
+# dedup append 판별 뒤 다른 append 가 끼어들었을 때 다시 판별하는 횟수
+APPEND_MAX_ATTEMPTS = 3
+# 큰 메시지 본문 압축: 기준 크기, 방식(auto/zstd/zlib/none), zstd 사전 파일,
+# 텍스트 검색과 미리보기를 위해 content 에 평문으로 남기는 앞부분 길이
+MESSAGE_COMPRESS_MIN_BYTES = int(os.getenv("MESSAGE_COMPRESS_MIN_BYTES", "4096"))
+MESSAGE_COMPRESSION = os.getenv("MESSAGE_COMPRESSION", "auto").lower()
+MESSAGE_COMPRESSION_DICT = os.getenv("MESSAGE_COMPRESSION_DICT")
+MESSAGE_COMPRESSED_PREFIX_CHARS = 1024
+# 이 크기 이상의 본문은 사용자별 message_blobs 에 해시 기준으로 한 번만 저장하고
+# 메시지에는 content_ref 만 남김 (문서 16MB 제한과 반복되는 프롬프트/파일 중복 방지)
+MESSAGE_BLOB_MIN_BYTES = int(os.getenv("MESSAGE_BLOB_MIN_BYTES", str(16 * 1024)))
+# 인덱스 상태 등 관리자 엔드포인트에 접근할 수 있는 이메일 (쉼표 구분)
+ADMIN_EMAILS = {email.strip() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
 
 # MongoDB 연결
 client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URL)
 db = client[DATABASE_NAME]
 users_collection = db.users
 conversations_collection = db.conversations
+tombstones_collection = db.conversation_tombstones
+blobs_collection = db.message_blobs
+# 한 번만 실행하면 되는 백필 작업의 완료 기록
+migrations_collection = db.schema_migrations
+
+# 컬렉션별 인덱스 선언 (시작 시 생성하고 검증)
+INDEX_SPECS: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        {"name": "email_unique", "keys": [("email", ASCENDING)], "unique": True},
+    ],
+    "conversations": [
+        {"name": "user_created", "keys": [("user_id", ASCENDING), ("created_at", DESCENDING)]},
+        # 변경 동기화 (changed_at, _id) 오름차순 범위 탐색
+        {
+            "name": "user_changed_id",
+            "keys": [("user_id", ASCENDING), ("changed_at", ASCENDING), ("_id", ASCENDING)],
+        },
+        # 커서 페이지네이션 (updated_at, _id) 정렬을 그대로 지원
+        {
+            "name": "user_updated_id",
+            "keys": [("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)],
+        },
+        # 태그 필터 목록 (multikey)
+        {
+            "name": "user_tags_updated",
+            "keys": [("user_id", ASCENDING), ("metadata.tags", ASCENDING), ("updated_at", DESCENDING)],
+        },
+        # 역할 필터 (multikey)
+        {"name": "user_roles", "keys": [("user_id", ASCENDING), ("messages.role", ASCENDING)]},
+        {
+            "name": "conversation_text",
+            "keys": [("messages.content", TEXT), ("metadata.title", TEXT), ("metadata.tags", TEXT)],
+            "weights": {"metadata.title": 5, "metadata.tags": 3, "messages.content": 1},
+            # 한국어 형태소 분석을 지원하지 않으므로 영어 stemming 도 끔
+            "default_language": "none",
+        },
+    ],
+    "conversation_tombstones": [
+        {
+            "name": "user_deleted_id",
+            "keys": [("user_id", ASCENDING), ("deleted_at", ASCENDING), ("_id", ASCENDING)],
+        },
+        {
+            "name": "deleted_ttl",
+            "keys": [("deleted_at", ASCENDING)],
+            "expireAfterSeconds": TOMBSTONE_TTL_DAYS * 86400,
+        },
+    ],
+}
+
+# 마지막 인덱스 생성/검증 결과
+index_status: Dict[str, Any] = {"checked_at": None, "collections": {}}
 
 # 보안
 security = HTTPBearer()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+class TTLCache:
+    """항목 수 제한과 만료 시간을 가진 LRU 캐시 (이벤트 루프 단일 스레드에서 사용)"""
+    
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def put(self, key: str, value: Any) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, key: str) -> None:
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+class PasswordHasher:
+    """bcrypt 해시/검증을 이벤트 루프 밖의 전용 스레드 풀에서 실행
+
+    bcrypt 는 한 번에 수백 ms 가 걸리므로 핸들러에서 직접 호출하면 그동안
+    다른 모든 요청이 멈춘다. 대기 중인 작업이 한도를 넘으면 큐를 더 쌓지 않고
+    바로 503 을 돌려준다.
+    """
+    
+    def __init__(self, context: CryptContext, workers: int, max_queue: int):
+        self.context = context
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pensieve-bcrypt")
+        self.in_flight = 0
+        self.rejected = 0
+        self.calls = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+    
+    def _timed(self, func, submitted: float, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            # 통계는 GIL 하의 단순 누적이므로 근사치로 충분
+            finished = time.perf_counter()
+            queued = started - submitted
+            elapsed = finished - started
+            self.calls += 1
+            self.queue_seconds_total += queued
+            self.queue_seconds_max = max(self.queue_seconds_max, queued)
+            self.hash_seconds_total += elapsed
+            self.hash_seconds_max = max(self.hash_seconds_max, elapsed)
+    
+    async def _run(self, func, *args):
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, self._timed, func, time.perf_counter(), *args
+            )
+        finally:
+            self.in_flight -= 1
+    
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+    
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, password, hashed_password)
+    
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        calls = self.calls or 1
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": max(self.in_flight - self.workers, 0),
+            "rejected": self.rejected,
+            "calls": self.calls,
+            "hash_ms_avg": round(self.hash_seconds_total / calls * 1000, 2),
+            "hash_ms_max": round(self.hash_seconds_max * 1000, 2),
+            "queue_ms_avg": round(self.queue_seconds_total / calls * 1000, 2),
+            "queue_ms_max": round(self.queue_seconds_max * 1000, 2),
+        }
+
+password_hasher = PasswordHasher(pwd_context, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+# 토큰의 이메일(sub) -> 사용자 레코드. 인증마다 Mongo 왕복을 하지 않도록 짧게 보관
+user_cache = TTLCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)
+
+def invalidate_cached_user(email: str) -> None:
+    """사용자 레코드가 바뀌면 호출해 캐시된 레코드를 버림"""
+    user_cache.invalidate(email)
+
 # 모델
 class UserCreate(BaseModel):
     email: EmailStr  # 이메일 형식 검증
@@ -65,6 +303,13 @@ class ConversationCreate(BaseModel):
     messages: List[Message]
     metadata: Optional[Dict[str, Any]] = None
 
+class ConversationImport(BaseModel):
+    id: Optional[str] = None  # 클라이언트 측 대화 ID (재시도 시 중복 방지 키)
+    messages: List[Message]
+    metadata: Optional[Dict[str, Any]] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 class ConversationUpdate(BaseModel):
     messages: List[Message]
 
@@ -72,7 +317,561 @@ class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
 
+# 메시지 압축
+if MESSAGE_COMPRESSION == "auto":
+    COMPRESSION_CODEC = "zstd" if zstandard is not None else "zlib"
+elif MESSAGE_COMPRESSION == "zstd" and zstandard is None:
+    print("MESSAGE_COMPRESSION=zstd but zstandard is not installed, falling back to zlib")
+    COMPRESSION_CODEC = "zlib"
+else:
+    COMPRESSION_CODEC = MESSAGE_COMPRESSION
+
+compression_dict = None
+if MESSAGE_COMPRESSION_DICT and COMPRESSION_CODEC == "zstd":
+    with open(MESSAGE_COMPRESSION_DICT, "rb") as f:
+        compression_dict = zstandard.ZstdCompressionDict(f.read())
+
+def compress_bytes(raw: bytes) -> Dict[str, Any]:
+    """설정된 방식으로 압축한 {"codec", "data", "dict"(선택)}"""
+    if COMPRESSION_CODEC == "none":
+        return {"codec": "none", "data": raw}
+    if COMPRESSION_CODEC == "zstd":
+        envelope = {"codec": "zstd", "data": zstandard.ZstdCompressor(level=9, dict_data=compression_dict).compress(raw)}
+        if compression_dict is not None:
+            envelope["dict"] = compression_dict.dict_id()
+        return envelope
+    return {"codec": "zlib", "data": zlib.compress(raw, 6)}
+
+def decompress_bytes(envelope: Dict[str, Any]) -> bytes:
+    data = bytes(envelope["data"])
+    if envelope["codec"] == "none":
+        return data
+    if envelope["codec"] == "zstd":
+        if zstandard is None:
+            raise HTTPException(status_code=500, detail="zstandard is required to read this message")
+        dict_data = compression_dict if envelope.get("dict") is not None else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+    return zlib.decompress(data)
+
+def compress_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """content 가 크면 전체를 content_z 에 압축하고 content 에는 앞부분만 남김
+
+    앞부분은 텍스트 인덱스와 목록 미리보기가 압축을 풀지 않고 쓰는 용도다.
+    """
+    content = message.get("content", "")
+    raw = content.encode("utf-8")
+    if COMPRESSION_CODEC == "none" or "content_ref" in message or len(raw) < MESSAGE_COMPRESS_MIN_BYTES:
+        return message
+    envelope = compress_bytes(raw)
+    if len(envelope["data"]) > len(raw) * 0.9:
+        return message
+    return dict(message, content=content[:MESSAGE_COMPRESSED_PREFIX_CHARS], content_z=envelope)
+
+def expand_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """압축된 메시지의 content 를 복원 (응답으로 돌려줄 메시지에만 호출)"""
+    envelope = message.get("content_z")
+    if envelope is None:
+        return message
+    expanded = {key: value for key, value in message.items() if key != "content_z"}
+    expanded["content"] = decompress_bytes(envelope).decode("utf-8")
+    return expanded
+
+# 메시지 본문 blob 저장소
+def blob_id(user_id: str, digest: str) -> str:
+    # 사용자별로 나눠 두어 다른 계정의 본문이 참조되거나 지워지지 않게 함
+    return f"{user_id}:{digest}"
+
+async def store_blobs(user_id: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """큰 본문을 blob 으로 저장(참조 수 증가)하고 content_ref 를 가진 메시지로 바꿈
+
+    대화 문서를 쓰기 전에 호출해 문서가 없는 blob 을 가리키는 일이 없게 한다.
+    쓰기가 일어나지 않으면 release_blobs 로 되돌린다.
+    """
+    stored: List[Dict[str, Any]] = []
+    blobs: Dict[str, Dict[str, Any]] = {}
+    counts: Dict[str, int] = {}
+    for message in messages:
+        content = message.get("content", "")
+        raw = content.encode("utf-8")
+        if len(raw) < MESSAGE_BLOB_MIN_BYTES:
+            stored.append(message)
+            continue
+        digest = hashlib.sha256(raw).hexdigest()
+        _id = blob_id(user_id, digest)
+        counts[_id] = counts.get(_id, 0) + 1
+        if _id not in blobs:
+            blobs[_id] = {
+                "user_id": user_id,
+                "size": len(raw),
+                "data": compress_bytes(raw),
+                "created_at": datetime.utcnow(),
+            }
+        stored.append(dict(
+            message,
+            content=content[:MESSAGE_COMPRESSED_PREFIX_CHARS],
+            content_ref={"hash": digest, "size": len(raw)},
+        ))
+    if counts:
+        await blobs_collection.bulk_write([
+            UpdateOne({"_id": _id}, {"$setOnInsert": blobs[_id], "$inc": {"refs": count}}, upsert=True)
+            for _id, count in counts.items()
+        ], ordered=False)
+    return stored
+
+async def release_blobs(user_id: str, messages: List[Dict[str, Any]]) -> None:
+    """메시지가 가리키던 blob 의 참조 수를 줄이고 0 이 된 blob 삭제"""
+    counts: Dict[str, int] = {}
+    for message in messages:
+        ref = message.get("content_ref")
+        if ref:
+            _id = blob_id(user_id, ref["hash"])
+            counts[_id] = counts.get(_id, 0) + 1
+    if not counts:
+        return
+    await blobs_collection.bulk_write([
+        UpdateOne({"_id": _id}, {"$inc": {"refs": -count}}) for _id, count in counts.items()
+    ], ordered=False)
+    # 그 사이 다른 쓰기가 참조를 늘렸다면 refs > 0 이므로 지워지지 않음
+    await blobs_collection.delete_many({"_id": {"$in": list(counts)}, "refs": {"$lte": 0}})
+
+async def resolve_messages(user_id: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """압축/blob 참조 메시지의 content 를 복원 (blob 은 한 번의 $in 조회로 읽음)"""
+    messages = [expand_message(message) for message in messages]
+    ids = {blob_id(user_id, message["content_ref"]["hash"]) for message in messages if "content_ref" in message}
+    if not ids:
+        return messages
+    contents = {
+        blob["_id"]: decompress_bytes(blob["data"]).decode("utf-8")
+        async for blob in blobs_collection.find({"_id": {"$in": list(ids)}}, {"data": 1})
+    }
+    resolved = []
+    for message in messages:
+        ref = message.get("content_ref")
+        if ref is not None:
+            message = {key: value for key, value in message.items() if key != "content_ref"}
+            message["content"] = contents.get(blob_id(user_id, ref["hash"]), message.get("content", ""))
+        resolved.append(message)
+    return resolved
+
+async def stored_messages(user_id: str, messages: List[Message]) -> List[Dict[str, Any]]:
+    return [compress_message(msg) for msg in await store_blobs(user_id, [msg.dict() for msg in messages])]
+
+def message_hash(message: Dict[str, Any]) -> str:
+    """메시지 (role, content) 의 내용 해시"""
+    return hashlib.sha256(json.dumps([message["role"], message["content"]], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def tail_hashes(messages: List[Dict[str, Any]]) -> List[str]:
+    """dedup append 비교용으로 문서에 보관하는 마지막 메시지들의 해시"""
+    return [message_hash(message) for message in messages[-APPEND_TAIL_HASHES:]]
+
+def tail_overlap(tail: List[str], hashes: List[str]) -> int:
+    """hashes 의 앞부분이 tail 의 끝부분과 겹치는 최대 길이 (이미 추가된 메시지 수)"""
+    for size in range(min(len(tail), len(hashes)), 0, -1):
+        if tail[-size:] == hashes[:size]:
+            return size
+    return 0
+
+class AppendConflict(Exception):
+    """판별한 뒤 매번 다른 쓰기가 끼어들어 APPEND_MAX_ATTEMPTS 번 안에 추가하지 못함"""
+
+class MongoConversationBackend:
+    """한 사용자의 대화를 mcp_server StorageBackend 와 같은 연산(read/write/append/delete/iter_all)으로
+    다루는 Motor 비동기 어댑터
+
+    blob 분리, 압축, 참조 정리, dedup 해시, 삭제 기록은 모두 여기서 한다. 메시지 구간 조회,
+    목록/검색 집계, 변경 피드, 가져오기 배치처럼 Mongo 쿼리 자체가 기능인 경로만 컬렉션을
+    직접 쓴다. (api_server 는 mcp_server 를 import 하지 않고 따로 배포되므로 타입은 공유하지 않음)
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+
+    def _owner(self, conversation_id: str) -> Dict[str, Any]:
+        return {"_id": conversation_id, "user_id": self.user_id}
+
+    async def read(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """메시지를 복원한 대화 문서 (없으면 None)"""
+        conversation = await conversations_collection.find_one(self._owner(conversation_id), INTERNAL_FIELDS)
+        if conversation is not None:
+            conversation["messages"] = await resolve_messages(self.user_id, conversation.get("messages", []))
+        return conversation
+
+    async def write(self, data: Dict[str, Any], create: bool = False) -> Optional[int]:
+        """data 의 메시지로 대화를 새로 만들거나(create) 기존 대화의 메시지를 교체하고 rewrite_version 반환
+
+        교체할 대화가 없으면 None. 교체했으면 이전 메시지가 가리키던 blob 참조를 정리한다.
+        """
+        messages = data["messages"]
+        stored = [compress_message(message) for message in await store_blobs(self.user_id, messages)]
+        now = datetime.utcnow()
+        fields = {
+            "messages": stored,
+            "message_count": len(messages),
+            # 문서를 다시 썼으므로 dedup 비교 대상도 새 메시지 기준으로 교체
+            "tail_hashes": tail_hashes(messages),
+            "updated_at": now,
+            "changed_at": now
+        }
+        if create:
+            try:
+                await conversations_collection.insert_one({
+                    **self._owner(data["id"]),
+                    "metadata": data.get("metadata") or {},
+                    "created_at": now,
+                    **fields
+                })
+            except Exception:
+                await release_blobs(self.user_id, stored)
+                raise
+            return 0
+        
+        # 교체 전 문서의 blob 참조만 받아 와서 참조 수를 정리
+        previous = await conversations_collection.find_one_and_update(
+            self._owner(data["id"]),
+            {
+                "$set": fields,
+                # 동기화 클라이언트가 메시지 수만으로는 알 수 없는 재작성을 감지하도록 버전을 올림
+                "$inc": {"rewrite_version": 1}
+            },
+            projection={"messages.content_ref": 1, "rewrite_version": 1}
+        )
+        if previous is None:
+            await release_blobs(self.user_id, stored)
+            return None
+        await release_blobs(self.user_id, previous.get("messages", []))
+        return previous.get("rewrite_version", 0) + 1
+
+    async def append(
+        self,
+        conversation_id: str,
+        messages: List[Dict[str, Any]],
+        idempotency_key: Optional[str] = None,
+        dedup: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """메시지를 추가하고 {added, skipped, duplicate} 반환 (대화가 없으면 None)
+
+        판별은 읽기로 먼저 하므로 중복이면 blob 도 문서도 쓰지 않는다. 판별과 쓰기 사이에
+        다른 쓰기가 끼어들면 다시 판별하고, APPEND_MAX_ATTEMPTS 번 모두 그러면 AppendConflict.
+        """
+        hashes = [message_hash(message) for message in messages]
+        owner = self._owner(conversation_id)
+        duplicate = {"added": 0, "skipped": len(messages), "duplicate": True}
+        
+        for _ in range(APPEND_MAX_ATTEMPTS):
+            current = await conversations_collection.find_one(owner, {"append_keys": 1, "tail_hashes": 1})
+            if current is None:
+                return None
+            if idempotency_key and idempotency_key in current.get("append_keys", []):
+                return duplicate
+            tail = current.get("tail_hashes")
+            skip = tail_overlap(tail or [], hashes) if dedup else 0
+            if messages and skip == len(messages):
+                return duplicate
+            
+            query: Dict[str, Any] = dict(owner)
+            if idempotency_key:
+                query["append_keys"] = {"$ne": idempotency_key}
+            if dedup:
+                # 판별한 뒤 다른 append 가 끼어들었으면 쓰지 않고 다시 판별
+                query["tail_hashes"] = tail
+            
+            now = datetime.utcnow()
+            stored = [compress_message(message) for message in await store_blobs(self.user_id, messages[skip:])]
+            update: Dict[str, Any] = {
+                "$push": {
+                    "messages": {"$each": stored},
+                    "tail_hashes": {"$each": hashes[skip:], "$slice": -APPEND_TAIL_HASHES}
+                },
+                "$inc": {"message_count": len(stored)},
+                "$set": {"updated_at": now, "changed_at": now}
+            }
+            if idempotency_key:
+                update["$push"]["append_keys"] = {"$each": [idempotency_key], "$slice": -APPEND_KEY_HISTORY}
+            result = await conversations_collection.update_one(query, update)
+            if result.matched_count:
+                return {"added": len(stored), "skipped": skip, "duplicate": False}
+            # 그 사이 삭제되었거나 같은 키/다른 append 가 먼저 반영됨 - 참조를 되돌리고 다시 판별
+            await release_blobs(self.user_id, stored)
+        
+        raise AppendConflict(conversation_id)
+
+    async def delete(self, conversation_id: str) -> bool:
+        """대화를 지우고 blob 참조를 정리한 뒤 삭제 기록을 남김 - 대화가 있었으면 True"""
+        deleted = await conversations_collection.find_one_and_delete(
+            self._owner(conversation_id),
+            projection={"messages.content_ref": 1}
+        )
+        if deleted is None:
+            return False
+        
+        await release_blobs(self.user_id, deleted.get("messages", []))
+        # 다른 기기가 /conversations/changes 로 삭제를 알 수 있도록 기록
+        await tombstones_collection.update_one(
+            {"_id": conversation_id},
+            {"$set": {"user_id": self.user_id, "deleted_at": datetime.utcnow()}},
+            upsert=True
+        )
+        return True
+
+    async def iter_all(self, batch_size: int = EXPORT_BATCH_SIZE):
+        """모든 대화를 최근 생성 순으로 메시지를 복원해 하나씩 (커서에서 batch_size 개씩 읽음)"""
+        cursor = conversations_collection.find(
+            {"user_id": self.user_id}, {"user_id": 0, **INTERNAL_FIELDS}
+        ).sort([("created_at", DESCENDING)]).batch_size(batch_size)
+        async for conv in cursor:
+            conv["messages"] = await resolve_messages(self.user_id, conv.get("messages", []))
+            yield conv
+
 # 헬퍼 함수
+def make_etag(*parts: Any) -> str:
+    """응답 버전을 나타내는 약한 ETag 생성"""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+# 대화 조회 시 fields 파라미터로 선택할 수 있는 최상위 필드
+PROJECTABLE_FIELDS = {"user_id", "metadata", "created_at", "updated_at", "messages", "message_count"}
+# 중복 append 판별용 내부 필드 (응답에서 제외)
+# last_append_* 는 이전 버전이 남긴 필드
+INTERNAL_FIELDS = {"append_keys": 0, "tail_hashes": 0, "last_append_digest": 0, "last_append_at": 0}
+# $slice 에 개수 제한이 없을 때 쓰는 값
+MAX_SLICE = 2 ** 31 - 1
+
+def build_conversation_projection(
+    tail: Optional[int],
+    after: Optional[int],
+    limit: Optional[int],
+    fields: Optional[str]
+) -> Dict[str, Any]:
+    """메시지 범위/필드 선택을 Mongo $project 단계로 변환 (전체 배열을 내려받지 않음)"""
+    if (tail is not None and tail < 1) or (after is not None and after < -1) or (limit is not None and limit < 1):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="tail/limit must be positive and after must be >= -1"
+        )
+    
+    if fields:
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested - PROJECTABLE_FIELDS
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+    else:
+        requested = PROJECTABLE_FIELDS
+    
+    projection: Dict[str, Any] = {
+        field: 1 for field in requested - {"messages", "message_count"}
+    }
+    # 구간 위치 계산에 항상 필요 - 배열 길이를 다시 세지 않고 저장된 값(시작 시 backfill)을 씀
+    projection["message_count"] = 1
+    if "messages" in requested:
+        if tail is not None:
+            projection["messages"] = {"$slice": ["$messages", -tail]}
+        else:
+            start = after + 1 if after is not None else 0
+            projection["messages"] = {"$slice": ["$messages", start, limit or MAX_SLICE]}
+    return projection
+
+# 목록 미리보기에 포함할 마지막 메시지 길이
+PREVIEW_SNIPPET_CHARS = 200
+# 검색 결과의 일치 메시지 스니펫 길이, 대화당 최대 일치 메시지 수, 스니펫당 최대 일치 위치 수
+SEARCH_SNIPPET_CHARS = 160
+SEARCH_MAX_MATCHES = 20
+SEARCH_MAX_MATCH_OFFSETS = 20
+# 패싯마다 돌려줄 최대 값 수
+FACET_LIMIT = 20
+
+def summary_projection(preview: bool = False) -> Dict[str, Any]:
+    """목록 조회용 프로젝션 - 메시지 본문은 제외하고 미리보기면 마지막 메시지만"""
+    if preview:
+        return {"messages": {"$slice": -1}}
+    return {"messages": 0}
+
+def conversation_summary(conv: Dict[str, Any], preview: bool = False) -> Dict[str, Any]:
+    """대화 문서를 목록 항목으로 변환 (message_count 는 유지되는 필드를 사용)"""
+    summary = {
+        "id": conv["_id"],
+        "metadata": conv.get("metadata", {}),
+        "created_at": conv["created_at"],
+        "updated_at": conv.get("updated_at"),
+        "message_count": conv.get("message_count", 0)
+    }
+    if preview:
+        last = (conv.get("messages") or [None])[-1]
+        summary["preview"] = {
+            "title": summary["metadata"].get("title"),
+            "last_message": {
+                "role": last.get("role"),
+                "snippet": last.get("content", "")[:PREVIEW_SNIPPET_CHARS]
+            } if last else None
+        }
+    return summary
+
+def encode_cursor(updated_at: datetime, conversation_id: str) -> str:
+    """(updated_at, _id) 위치를 불투명한 커서 문자열로 인코딩"""
+    raw = json.dumps([updated_at.isoformat(), conversation_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, conversation_id = json.loads(raw)
+        return datetime.fromisoformat(updated_at), str(conversation_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def conversation_filters(
+    tags: Optional[List[str]] = Query(None),
+    title: Optional[str] = None,
+    role: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """목록/검색 공통 필터 쿼리 파라미터를 Mongo 조건으로 변환
+
+    tags 는 모두 포함, title 은 대소문자 무시 부분 일치, role 은 그 역할의 메시지가 있는
+    대화, 시각 범위는 하한 포함/상한 미포함이다.
+    """
+    conditions: Dict[str, Any] = {}
+    if tags:
+        conditions["metadata.tags"] = {"$all": tags}
+    if title:
+        conditions["metadata.title"] = {"$regex": re.escape(title), "$options": "i"}
+    if role:
+        conditions["messages.role"] = role
+    for field, lower, upper in (
+        ("created_at", created_after, created_before),
+        ("updated_at", updated_after, updated_before),
+    ):
+        bounds = {}
+        if lower:
+            bounds["$gte"] = lower
+        if upper:
+            bounds["$lt"] = upper
+        if bounds:
+            conditions[field] = bounds
+    return conditions
+
+async def conversation_facets(match: Dict[str, Any]) -> Dict[str, Any]:
+    """조건에 맞는 대화의 전체 수와 태그/생성 월/메시지 역할별 개수를 한 번의 $facet 집계로 계산"""
+    def counts(field: str, limit: Optional[int] = None, by_key: bool = False) -> List[Dict[str, Any]]:
+        stages: List[Dict[str, Any]] = [
+            {"$group": {"_id": field, "count": {"$sum": 1}}},
+            {"$sort": {"_id": -1} if by_key else {"count": -1, "_id": 1}},
+        ]
+        return stages + [{"$limit": limit}] if limit else stages
+    
+    cursor = conversations_collection.aggregate([
+        {"$match": match},
+        {"$project": {
+            "tags": {"$ifNull": ["$metadata.tags", []]},
+            "month": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
+            "roles": {"$setUnion": [{"$ifNull": ["$messages.role", []]}, []]},
+        }},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "tags": [{"$unwind": "$tags"}] + counts("$tags", FACET_LIMIT),
+            "months": counts("$month", by_key=True),
+            "roles": [{"$unwind": "$roles"}] + counts("$roles"),
+        }},
+    ])
+    result = (await cursor.to_list(length=1))[0]
+    facets: Dict[str, Any] = {"total": result["total"][0]["count"] if result["total"] else 0}
+    for key in ("tags", "months", "roles"):
+        facets[key] = {bucket["_id"]: bucket["count"] for bucket in result[key] if bucket["_id"] is not None}
+    return facets
+
+async def fetch_conversation_page(
+    user_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    preview: bool = False,
+    filters: Optional[Dict[str, Any]] = None
+) -> tuple:
+    """updated_at, _id 내림차순 keyset 페이지와 다음 커서 반환
+
+    cursor 가 있으면 그 위치 이후부터 인덱스 범위 탐색으로 읽으므로 깊은 페이지도
+    비용이 일정하다. skip 은 이전 클라이언트 호환을 위해서만 남겨 둔다.
+    filters 는 conversation_filters 가 만든 조건이다.
+    """
+    query: Dict[str, Any] = dict(filters or {}, user_id=user_id)
+    if cursor:
+        updated_at, conversation_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"updated_at": {"$lt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$lt": conversation_id}}
+        ]
+    
+    results = conversations_collection.find(query, summary_projection(preview)).sort(
+        [("updated_at", DESCENDING), ("_id", DESCENDING)]
+    )
+    if skip and not cursor:
+        results = results.skip(skip)
+    docs = await results.limit(limit).to_list(length=limit)
+    
+    next_cursor = None
+    if docs and len(docs) == limit:
+        next_cursor = encode_cursor(docs[-1]["updated_at"], docs[-1]["_id"])
+    return [conversation_summary(doc, preview) for doc in docs], next_cursor
+
+def page_headers(etag: str, next_cursor: Optional[str]) -> Dict[str, str]:
+    headers = {"ETag": etag}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return headers
+
+async def backfill_message_counts() -> int:
+    """message_count 필드가 없는 기존 문서에 값을 채움 (파이프라인 업데이트로 서버에서 $size 계산)"""
+    result = await conversations_collection.update_many(
+        {"message_count": {"$exists": False}},
+        [{"$set": {"message_count": {"$size": {"$ifNull": ["$messages", []]}}}}]
+    )
+    return result.modified_count
+
+async def backfill_changed_at() -> int:
+    """changed_at 필드가 없는 기존 문서는 updated_at 을 변경 시각으로 사용"""
+    result = await conversations_collection.update_many(
+        {"changed_at": {"$exists": False}},
+        [{"$set": {"changed_at": {"$ifNull": ["$updated_at", "$$NOW"]}}}]
+    )
+    return result.modified_count
+
+BACKFILLS = {
+    "backfill_message_counts": backfill_message_counts,
+    "backfill_changed_at": backfill_changed_at,
+}
+
+async def run_backfills() -> Dict[str, Any]:
+    """완료 기록이 없는 백필만 실행하고 끝나면 schema_migrations 에 기록"""
+    done = {doc["_id"] async for doc in migrations_collection.find({"_id": {"$in": list(BACKFILLS)}}, {"_id": 1})}
+    results: Dict[str, Any] = {}
+    for name, backfill in BACKFILLS.items():
+        if name in done:
+            continue
+        results[name] = await backfill()
+        await migrations_collection.update_one(
+            {"_id": name},
+            {"$set": {"completed_at": datetime.utcnow(), "modified": results[name]}},
+            upsert=True
+        )
+    return results
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
@@ -95,14 +894,101 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail="Invalid authentication credentials",
         )
     
-    user = await users_collection.find_one({"email": email})
+    user = user_cache.get(email)
+    if user is not None:
+        return user
+    
+    # 요청 처리에 비밀번호 해시는 필요 없으므로 캐시에도 담지 않는다
+    user = await users_collection.find_one({"email": email}, {"hashed_password": 0})
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
         )
+    user_cache.put(email, user)
     return user
 
+async def ensure_indexes() -> Dict[str, Any]:
+    """INDEX_SPECS 의 인덱스를 생성 (이미 있으면 그대로 둠)"""
+    results: Dict[str, Any] = {}
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = db[collection_name]
+        for spec in specs:
+            options = {key: value for key, value in spec.items() if key != "keys"}
+            try:
+                await collection.create_index(spec["keys"], **options)
+                results[spec["name"]] = "ok"
+            except PyMongoError as e:
+                # 충돌하는 기존 인덱스나 중복 이메일 등은 기록만 하고 기동은 계속
+                results[spec["name"]] = f"error: {e}"
+                print(f"Index creation failed for {collection_name}.{spec['name']}: {e}")
+    return results
+
+async def verify_indexes(created: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """선언한 인덱스가 실제로 존재하고 키가 일치하는지 확인"""
+    collections: Dict[str, Any] = {}
+    for collection_name, specs in INDEX_SPECS.items():
+        existing = await db[collection_name].index_information()
+        report = {}
+        for spec in specs:
+            info = existing.get(spec["name"])
+            if info is None:
+                state = "missing"
+            elif any(direction == TEXT for _, direction in spec["keys"]):
+                # 텍스트 인덱스는 _fts/_ftsx 키로 저장되므로 가중치로 비교
+                state = "ok" if set(info.get("weights", {})) == {field for field, _ in spec["keys"]} else "mismatch"
+            else:
+                state = "ok" if list(info["key"]) == list(spec["keys"]) else "mismatch"
+            report[spec["name"]] = {"state": state}
+            if created and created.get(spec["name"], "ok") != "ok":
+                report[spec["name"]]["create_error"] = created[spec["name"]]
+        collections[collection_name] = report
+    index_status["checked_at"] = datetime.utcnow()
+    index_status["collections"] = collections
+    return index_status
+
+@app.on_event("startup")
+async def on_startup():
+    try:
+        await verify_indexes(await ensure_indexes())
+        await run_backfills()
+    except PyMongoError as e:
+        # Mongo 에 닿지 않아도 기동은 계속 (백필은 다음 기동 때 다시 시도)
+        print(f"Index bootstrap failed: {e}")
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    password_hasher.shutdown()
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    if current_user.get("email") not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required",
+        )
+    return current_user
+
+def summarize_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """explain() 결과에서 실행 단계와 사용한 인덱스만 추림"""
+    stages: List[str] = []
+    indexes: List[str] = []
+    stack = [explain.get("queryPlanner", {}).get("winningPlan", {})]
+    while stack:
+        plan = stack.pop()
+        if not isinstance(plan, dict):
+            continue
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        if "indexName" in plan:
+            indexes.append(plan["indexName"])
+        stack.extend(plan.get(key) for key in ("inputStage", "queryPlan") if key in plan)
+        stack.extend(plan.get("inputStages", []))
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collection_scan": "COLLSCAN" in stages,
+    }
+
 # 인증 엔드포인트
 @app.post("/auth/register", response_model=Token)
 async def register(user: UserCreate):
@@ -114,7 +1000,7 @@ async def register(user: UserCreate):
         )
     
     # 사용자 생성
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     user_doc = {
         "_id": str(uuid4()),
         "email": user.email,
@@ -122,6 +1008,7 @@ async def register(user: UserCreate):
         "created_at": datetime.utcnow()
     }
     await users_collection.insert_one(user_doc)
+    invalidate_cached_user(user.email)
     
     # 토큰 생성
     access_token = create_access_token(data={"sub": user.email})
@@ -131,7 +1018,7 @@ async def register(user: UserCreate):
 async def login(user: UserLogin):
     # 사용자 확인
     db_user = await users_collection.find_one({"email": user.email})
-    if not db_user or not pwd_context.verify(user.password, db_user["hashed_password"]):
+    if not db_user or not await password_hasher.verify(user.password, db_user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -147,49 +1034,433 @@ async def create_conversation(
     conversation: ConversationCreate,
     current_user: dict = Depends(get_current_user)
 ):
-    conversation_doc = {
-        "_id": str(uuid4()),
-        "user_id": current_user["_id"],
+    conversation_id = str(uuid4())
+    await MongoConversationBackend(current_user["_id"]).write({
+        "id": conversation_id,
         "messages": [msg.dict() for msg in conversation.messages],
-        "metadata": conversation.metadata or {},
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
-    }
+        "metadata": conversation.metadata
+    }, create=True)
+    return {"id": conversation_id, "message": "Conversation created successfully"}
+
+# 가져온 대화의 _id 를 (사용자, 클라이언트 ID)로부터 결정적으로 만들기 위한 네임스페이스
+IMPORT_NAMESPACE = UUID("5f0c8f8e-6b1d-4c53-9a38-2f1d0c6e7a41")
+
+def import_document_id(user_id: str, client_id: str) -> str:
+    """같은 클라이언트 ID 를 다시 가져오면 같은 _id 가 되어 중복 삽입이 막힌다"""
+    return str(uuid5(IMPORT_NAMESPACE, f"{user_id}:{client_id}"))
+
+async def iter_ndjson_lines(request: Request):
+    """요청 본문을 전부 메모리에 올리지 않고 줄 단위로 읽음"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+        if len(buffer) > IMPORT_MAX_LINE_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Line exceeds {IMPORT_MAX_LINE_BYTES} bytes",
+            )
+    if buffer:
+        yield buffer
+
+async def inserted_import_ids(docs: List[Dict[str, Any]]) -> Optional[set]:
+    """insert_many 가 도중에 끊겼을 때 실제로 저장된 문서 id (조회도 실패하면 None)"""
+    try:
+        cursor = conversations_collection.find({"_id": {"$in": [doc["_id"] for doc in docs]}}, {"_id": 1})
+        return {doc["_id"] async for doc in cursor}
+    except PyMongoError:
+        return None
+
+async def insert_import_chunk(chunk: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> None:
+    """순서 없는 insert_many 로 묶음을 넣고 항목별 결과를 채움"""
+    docs = [item.pop("doc") for item in chunk]
+    failures: Dict[int, Dict[str, Any]] = {}
+    # 들어가지 않은 것이 확실해서 blob 참조를 되돌릴 문서
+    released = set()
+    try:
+        await conversations_collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        failures = {error["index"]: error for error in e.details.get("writeErrors", [])}
+        released = set(failures)
+    except Exception as e:
+        # 네트워크 오류/시간 초과 등은 어디까지 들어갔는지 모르므로 다시 조회해서 판단
+        inserted = await inserted_import_ids(docs)
+        for index, doc in enumerate(docs):
+            if inserted is not None and doc["_id"] in inserted:
+                # 이번에 넣었는지 원래 있었는지 구분할 수 없지만 어느 쪽이든 저장되어 있음
+                failures[index] = {"code": 11000}
+            else:
+                failures[index] = {"errmsg": str(e) or type(e).__name__}
+                # 조회까지 실패하면 참조를 그대로 둠 (잘못 줄이면 쓰이는 blob 이 지워질 수 있음)
+                if inserted is not None:
+                    released.add(index)
+    # 들어가지 않은 문서가 미리 늘려 둔 blob 참조를 되돌림
+    for index in released:
+        await release_blobs(docs[index]["user_id"], docs[index]["messages"])
+    for index, item in enumerate(chunk):
+        error = failures.get(index)
+        if error is None:
+            item["status"] = "created"
+        elif error.get("code") == 11000:
+            item["status"] = "exists"
+        else:
+            item["status"] = "error"
+            item["error"] = error.get("errmsg", "write failed")
+        results.append(item)
+
+@app.post("/conversations/import")
+async def import_conversations(
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """NDJSON(한 줄에 대화 하나) 대량 가져오기
+
+    각 줄은 {"id", "messages", "metadata", "created_at", "updated_at"} 형식이며
+    id 가 있으면 같은 대화를 다시 보내도 새로 만들지 않고 "exists" 로 보고한다.
+    """
+    user_id = current_user["_id"]
+    results: List[Dict[str, Any]] = []
+    chunk: List[Dict[str, Any]] = []
+    line_number = 0
     
-    await conversations_collection.insert_one(conversation_doc)
-    return {"id": conversation_doc["_id"], "message": "Conversation created successfully"}
+    async for line in iter_ndjson_lines(request):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            item = ConversationImport(**json.loads(line))
+        except (ValueError, TypeError) as e:
+            results.append({"line": line_number, "status": "error", "error": str(e)})
+            continue
+        
+        now = datetime.utcnow()
+        doc_id = import_document_id(user_id, item.id) if item.id else str(uuid4())
+        chunk.append({
+            "line": line_number,
+            "client_id": item.id,
+            "id": doc_id,
+            "doc": {
+                "_id": doc_id,
+                "user_id": user_id,
+                "client_id": item.id,
+                "messages": await stored_messages(user_id, item.messages),
+                "metadata": item.metadata or {},
+                "message_count": len(item.messages),
+                "tail_hashes": tail_hashes([msg.dict() for msg in item.messages]),
+                "created_at": item.created_at or now,
+                "updated_at": item.updated_at or item.created_at or now,
+                # 가져온 updated_at 은 과거일 수 있으므로 동기화 기준은 서버 시각
+                "changed_at": now,
+            },
+        })
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await insert_import_chunk(chunk, results)
+            chunk = []
+    
+    if chunk:
+        await insert_import_chunk(chunk, results)
+    
+    summary = {"created": 0, "exists": 0, "error": 0}
+    for item in results:
+        summary[item["status"]] += 1
+    return {**summary, "results": results}
 
 @app.get("/conversations")
 async def list_conversations(
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
+    preview: bool = False,
+    facets: bool = False,
+    filters: Dict[str, Any] = Depends(conversation_filters),
+    current_user: dict = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
+):
+    """최근 수정 순 대화 목록 - 다음 페이지 커서는 X-Next-Cursor 헤더로 전달
+
+    facets 이면 {"conversations", "facets"} 로 필터에 맞는 전체 대화의 개수 집계를 함께 반환
+    """
+    page = fetch_conversation_page(current_user["_id"], limit, cursor, offset, preview, filters)
+    if facets:
+        (conversations, next_cursor), counts = await asyncio.gather(
+            page, conversation_facets(dict(filters, user_id=current_user["_id"]))
+        )
+        content = jsonable_encoder({"conversations": conversations, "facets": counts})
+    else:
+        conversations, next_cursor = await page
+        content = jsonable_encoder(conversations)
+    
+    # 목록 내용이 같으면 본문 없이 304 로 응답
+    etag = make_etag(json.dumps(content, sort_keys=True))
+    if etag_matches(if_none_match, etag):
+        response = not_modified(etag)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response
+    return JSONResponse(content=content, headers=page_headers(etag, next_cursor))
+
+def export_line(conv: Dict[str, Any]) -> bytes:
+    """가져오기(/conversations/import)와 같은 형식의 NDJSON 한 줄 (메시지는 복원된 상태)"""
+    record = {
+        "id": conv["_id"],
+        "messages": conv.get("messages", []),
+        "metadata": conv.get("metadata", {}),
+        "created_at": conv.get("created_at"),
+        "updated_at": conv.get("updated_at"),
+    }
+    return (json.dumps(jsonable_encoder(record), ensure_ascii=False) + "\n").encode("utf-8")
+
+async def stream_export(user_id: str, batch_size: int, compress: bool):
+    """Mongo 커서에서 한 배치씩 읽어 바로 내보내므로 계정 크기와 무관하게 메모리가 일정"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    async for conv in MongoConversationBackend(user_id).iter_all(batch_size):
+        line = export_line(conv)
+        if compressor is None:
+            yield line
+            continue
+        chunk = compressor.compress(line)
+        if chunk:
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+# /conversations/{conversation_id} 보다 먼저 등록해야 "export"/"changes"/"search" 가 ID 로 잡히지 않음
+@app.get("/conversations/export")
+async def export_conversations(
+    gzip: bool = False,
+    batch_size: int = EXPORT_BATCH_SIZE,
     current_user: dict = Depends(get_current_user)
 ):
-    cursor = conversations_collection.find(
-        {"user_id": current_user["_id"]}
-    ).skip(offset).limit(limit)
-    
-    conversations = []
-    async for conv in cursor:
-        conversations.append({
-            "id": conv["_id"],
-            "metadata": conv.get("metadata", {}),
-            "created_at": conv["created_at"],
-            "updated_at": conv["updated_at"],
-            "message_count": len(conv.get("messages", []))
-        })
+    """사용자의 모든 대화를 NDJSON 스트림으로 내보내기 (gzip=true 이면 .ndjson.gz)"""
+    batch_size = min(max(batch_size, 1), EXPORT_MAX_BATCH_SIZE)
+    filename = "conversations.ndjson.gz" if gzip else "conversations.ndjson"
+    return StreamingResponse(
+        stream_export(current_user["_id"], batch_size, gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+def encode_sync_token(position: Dict[str, Optional[list]]) -> str:
+    """대화/삭제 두 스트림의 (시각, _id) 위치를 하나의 동기화 토큰으로 인코딩"""
+    raw = json.dumps(position).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_sync_token(token: Optional[str]) -> Dict[str, Optional[tuple]]:
+    if not token:
+        return {"conversations": None, "deleted": None}
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return {
+            key: (datetime.fromisoformat(raw[key][0]), str(raw[key][1])) if raw.get(key) else None
+            for key in ("conversations", "deleted")
+        }
+    except (ValueError, TypeError, KeyError, IndexError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid sync token"
+        )
+
+async def read_changes(
+    collection,
+    user_id: str,
+    field: str,
+    position: Optional[tuple],
+    until: datetime,
+    limit: int,
+    projection: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """(field, _id) 오름차순으로 position 이후 until 까지의 문서"""
+    query: Dict[str, Any] = {"user_id": user_id, field: {"$lte": until}}
+    if position:
+        changed, last_id = position
+        query["$or"] = [
+            {field: {"$gt": changed}},
+            {field: changed, "_id": {"$gt": last_id}}
+        ]
+    cursor = collection.find(query, projection).sort([(field, ASCENDING), ("_id", ASCENDING)])
+    return await cursor.to_list(length=limit)
+
+@app.get("/conversations/changes")
+async def conversation_changes(
+    since: Optional[str] = None,
+    limit: int = SYNC_MAX_CHANGES,
+    current_user: dict = Depends(get_current_user)
+):
+    """since 토큰 이후 바뀌거나 삭제된 대화 (메시지 본문 없이 요약만)
+
+    새 메시지는 message_count 를 보고 GET /conversations/{id}?after=N 으로 받는다.
+    rewrite_version 은 PUT 으로 문서를 다시 쓸 때마다 1씩 늘어나므로, 메시지 수가
+    같거나 늘었더라도 값이 바뀌었으면 기존 메시지가 교체된 것이다.
+    응답의 next_token 을 다음 호출의 since 로 넘기며, has_more 이면 바로 이어서 호출한다.
+    """
+    limit = min(max(limit, 1), SYNC_MAX_CHANGES)
+    position = decode_sync_token(since)
+    until = datetime.utcnow() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    user_id = current_user["_id"]
+    
+    changed = await read_changes(
+        conversations_collection, user_id, "changed_at", position["conversations"], until, limit,
+        {"messages": 0, "user_id": 0}
+    )
+    deleted = await read_changes(
+        tombstones_collection, user_id, "deleted_at", position["deleted"], until, limit,
+        {"deleted_at": 1}
+    )
     
-    return conversations
+    next_position = {
+        key: [docs[-1][field].isoformat(), docs[-1]["_id"]] if docs else (
+            [value[0].isoformat(), value[1]] if value else None
+        )
+        for key, field, docs, value in (
+            ("conversations", "changed_at", changed, position["conversations"]),
+            ("deleted", "deleted_at", deleted, position["deleted"]),
+        )
+    }
+    return {
+        "conversations": [
+            dict(
+                conversation_summary(conv),
+                client_id=conv.get("client_id"),
+                changed_at=conv["changed_at"],
+                rewrite_version=conv.get("rewrite_version", 0),
+            )
+            for conv in changed
+        ],
+        "deleted": [{"id": doc["_id"], "deleted_at": doc["deleted_at"]} for doc in deleted],
+        "next_token": encode_sync_token(next_position),
+        "has_more": len(changed) == limit or len(deleted) == limit,
+    }
+
+def search_pattern(query: str) -> str:
+    """질의 단어 중 하나와 일치하는 정규식 ($text 와 같이 대소문자 무시, 영문은 단어 단위)"""
+    terms = sorted({term for term in re.findall(r"\w+", query.lower())}, key=len, reverse=True)
+    return "|".join(rf"\b{re.escape(term)}\b" if term.isascii() else re.escape(term) for term in terms)
+
+def build_snippet(content: str, pattern: str) -> Dict[str, Any]:
+    """첫 일치 위치 주변의 스니펫과 메시지 본문 기준 일치 위치"""
+    offsets = [[m.start(), m.end()] for m in re.finditer(pattern, content, re.IGNORECASE)] if pattern else []
+    start = max(0, min(offsets[0][0] - SEARCH_SNIPPET_CHARS // 3, len(content) - SEARCH_SNIPPET_CHARS)) if offsets else 0
+    return {
+        "snippet": content[start:start + SEARCH_SNIPPET_CHARS],
+        "snippet_offset": start,
+        "offsets": offsets[:SEARCH_MAX_MATCH_OFFSETS],
+    }
+
+@app.get("/conversations/search")
+async def search_conversations(
+    query: str,
+    limit: int = 20,
+    preview: bool = False,
+    matches: int = 3,
+    facets: bool = False,
+    filters: Dict[str, Any] = Depends(conversation_filters),
+    current_user: dict = Depends(get_current_user)
+):
+    """텍스트 검색 - 관련도 순으로 대화마다 일치한 메시지 matches 개를 스니펫과 함께 반환
+
+    일치 메시지는 같은 집계 안에서 $filter 로 골라 해당 메시지의 role/content 만
+    가져오므로 대화 전체를 다시 읽을 필요가 없다. 압축/blob 으로 저장된 큰 메시지는
+    평문으로 남긴 앞부분에서만 일치 위치를 찾는다. role 필터가 있으면 일치 메시지도
+    그 역할만 고르고, facets 이면 {"results", "facets"} 로 검색에 걸린 전체 대화의
+    개수 집계를 함께 반환한다.
+    """
+    matches = min(max(matches, 0), SEARCH_MAX_MATCHES)
+    pattern = search_pattern(query)
+    match = dict(filters, user_id=current_user["_id"])
+    match["$text"] = {"$search": query}
+    messages = {"$ifNull": ["$messages", []]}
+    condition: Any = {"$regexMatch": {
+        "input": {"$ifNull": ["$$message.content", ""]}, "regex": pattern, "options": "i"
+    }} if pattern else False
+    if pattern and filters.get("messages.role"):
+        condition = {"$and": [{"$eq": ["$$message.role", filters["messages.role"]]}, condition]}
+    projection: Dict[str, Any] = {
+        "metadata": 1,
+        "created_at": 1,
+        "updated_at": 1,
+        "message_count": 1,
+        "score": {"$meta": "textScore"},
+        "matches": {"$slice": [{
+            "$filter": {
+                "input": {"$map": {
+                    "input": {"$range": [0, {"$size": messages}]},
+                    "as": "i",
+                    "in": {"$let": {
+                        "vars": {"message": {"$arrayElemAt": [messages, "$$i"]}},
+                        "in": {"index": "$$i", "role": "$$message.role", "content": "$$message.content"}
+                    }}
+                }},
+                "as": "message",
+                "cond": condition
+            }
+        }, max(matches, 1)]},
+    }
+    if preview:
+        projection["messages"] = {"$slice": [messages, -1]}
+    
+    cursor = conversations_collection.aggregate([
+        {"$match": match},
+        {"$sort": {"score": {"$meta": "textScore"}}},
+        {"$limit": limit},
+        {"$project": projection},
+    ])
+    if facets:
+        docs, counts = await asyncio.gather(cursor.to_list(length=limit), conversation_facets(match))
+    else:
+        docs = await cursor.to_list(length=limit)
+    
+    results = []
+    for conv in docs:
+        result = conversation_summary(conv, preview)
+        result["score"] = round(conv["score"], 4)
+        result["matches"] = [
+            {"message_index": match["index"], "role": match.get("role"), **build_snippet(match.get("content") or "", pattern)}
+            for match in conv.get("matches", [])[:matches]
+        ]
+        results.append(result)
+    if facets:
+        return {"results": results, "facets": counts}
+    return results
 
 @app.get("/conversations/{conversation_id}")
 async def get_conversation(
     conversation_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
+    tail: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None
 ):
-    conversation = await conversations_collection.find_one({
-        "_id": conversation_id,
-        "user_id": current_user["_id"]
-    })
+    """대화 조회
+
+    tail(마지막 N개), after(해당 인덱스 이후), limit, fields(쉼표 구분 필드)를
+    주면 Mongo $slice 프로젝션으로 필요한 메시지만 읽는다.
+    """
+    query = {"_id": conversation_id, "user_id": current_user["_id"]}
+    windowed = any(value is not None for value in (tail, after, limit, fields))
+    
+    # 조건부 요청이면 updated_at 만 먼저 조회해 변경이 없으면 문서를 읽지 않는다
+    if if_none_match:
+        version = await conversations_collection.find_one(query, {"updated_at": 1, "message_count": 1})
+        if version:
+            etag = make_etag(version["_id"], version["updated_at"].isoformat(), version.get("message_count"))
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+    
+    if windowed:
+        projection = build_conversation_projection(tail, after, limit, fields)
+        projection["updated_at"] = 1
+        projection["rewrite_version"] = 1
+        cursor = conversations_collection.aggregate([
+            {"$match": query},
+            {"$project": projection}
+        ])
+        conversation = next(iter(await cursor.to_list(length=1)), None)
+    else:
+        conversation = await MongoConversationBackend(current_user["_id"]).read(conversation_id)
     
     if not conversation:
         raise HTTPException(
@@ -197,7 +1468,20 @@ async def get_conversation(
             detail="Conversation not found"
         )
     
-    return conversation
+    if windowed and "messages" in conversation:
+        conversation["messages"] = await resolve_messages(current_user["_id"], conversation["messages"])
+        # 반환된 메시지 구간의 시작 위치와 다음 페이지 커서
+        total = conversation["message_count"]
+        if tail is not None:
+            offset = max(total - tail, 0)
+        else:
+            offset = min(after + 1 if after is not None else 0, total)
+        end = offset + len(conversation["messages"])
+        conversation["message_offset"] = offset
+        conversation["next_after"] = end - 1 if end < total else None
+    
+    etag = make_etag(conversation["_id"], conversation["updated_at"].isoformat(), conversation.get("message_count"))
+    return JSONResponse(content=jsonable_encoder(conversation), headers={"ETag": etag})
 
 @app.put("/conversations/{conversation_id}")
 async def update_conversation(
@@ -205,57 +1489,60 @@ async def update_conversation(
     update: ConversationUpdate,
     current_user: dict = Depends(get_current_user)
 ):
-    result = await conversations_collection.update_one(
-        {"_id": conversation_id, "user_id": current_user["_id"]},
-        {
-            "$set": {
-                "messages": [msg.dict() for msg in update.messages],
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
+    rewrite_version = await MongoConversationBackend(current_user["_id"]).write({
+        "id": conversation_id,
+        "messages": [msg.dict() for msg in update.messages]
+    })
     
-    if result.matched_count == 0:
+    if rewrite_version is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
     
-    return {"message": "Conversation updated successfully"}
+    return {"message": "Conversation updated successfully", "rewrite_version": rewrite_version}
 
 @app.post("/conversations/{conversation_id}/messages")
 async def append_messages(
     conversation_id: str,
     messages: List[Message],
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None),
+    dedup: bool = False
 ):
-    result = await conversations_collection.update_one(
-        {"_id": conversation_id, "user_id": current_user["_id"]},
-        {
-            "$push": {"messages": {"$each": [msg.dict() for msg in messages]}},
-            "$set": {"updated_at": datetime.utcnow()}
-        }
-    )
+    """메시지 추가 - 재시도로 같은 요청이 다시 오면 쓰기 없이 무시
+
+    Idempotency-Key 가 최근 APPEND_KEY_HISTORY 개의 키에 있으면 중복이다. dedup=true 이면
+    메시지별 해시를 대화의 마지막 APPEND_TAIL_HASHES 개 메시지 해시와 비교해 이미 있는
+    앞쪽 메시지는 건너뛰고 나머지만 추가한다. 둘 다 없으면 같은 내용이 연달아 와도 추가한다.
+    판별은 읽기로 먼저 하므로 중복이면 blob 도 문서도 쓰지 않는다.
+    """
+    try:
+        result = await MongoConversationBackend(current_user["_id"]).append(
+            conversation_id, [msg.dict() for msg in messages], idempotency_key, dedup
+        )
+    except AppendConflict:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Conversation changed during append; retry"
+        )
     
-    if result.matched_count == 0:
+    if result is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
     
-    return {"message": f"Added {len(messages)} messages to conversation"}
+    if result["duplicate"]:
+        return {"message": "Duplicate append ignored", **result}
+    return {"message": f"Added {result['added']} messages to conversation", **result}
 
 @app.delete("/conversations/{conversation_id}")
 async def delete_conversation(
     conversation_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    result = await conversations_collection.delete_one({
-        "_id": conversation_id,
-        "user_id": current_user["_id"]
-    })
-    
-    if result.deleted_count == 0:
+    if not await MongoConversationBackend(current_user["_id"]).delete(conversation_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
@@ -263,31 +1550,6 @@ async def delete_conversation(
     
     return {"message": "Conversation deleted successfully"}
 
-@app.get("/conversations/search")
-async def search_conversations(
-    query: str,
-    limit: int = 20,
-    current_user: dict = Depends(get_current_user)
-):
-    # MongoDB 텍스트 검색 사용
-    cursor = conversations_collection.find(
-        {
-            "user_id": current_user["_id"],
-            "$text": {"$search": query}
-        }
-    ).limit(limit)
-    
-    results = []
-    async for conv in cursor:
-        results.append({
-            "id": conv["_id"],
-            "metadata": conv.get("metadata", {}),
-            "created_at": conv["created_at"],
-            "message_count": len(conv.get("messages", []))
-        })
-    
-    return results
-
 # 웹 페이지 라우트
 @app.get("/", response_class=HTMLResponse)
 async def dashboard():
@@ -343,32 +1605,31 @@ async def api_register(user: UserCreate):
 async def api_get_conversations(
     limit: int = 20,
     skip: int = 0,
+    cursor: Optional[str] = None,
+    filters: Dict[str, Any] = Depends(conversation_filters),
     current_user: dict = Depends(get_current_user)
 ):
-    """사용자의 대화 목록 조회"""
-    cursor = conversations_collection.find(
-        {"user_id": current_user["_id"]}
-    ).sort("created_at", -1).limit(limit).skip(skip)
-
-    conversations = []
-    async for conv in cursor:
-        conversations.append({
-            "id": conv["_id"],
-            "messages": conv.get("messages", []),
-            "metadata": conv.get("metadata", {}),
-            "created_at": conv["created_at"],
-            "updated_at": conv["updated_at"]
-        })
-
-    return conversations
+    """사용자의 대화 목록 조회 (메시지 본문 대신 메시지 수와 미리보기만 포함)"""
+    conversations, next_cursor = await fetch_conversation_page(
+        current_user["_id"], limit, cursor, skip, preview=True, filters=filters
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return JSONResponse(content=jsonable_encoder(conversations), headers=headers)
 
 @app.get("/api/conversations/{conversation_id}")
 async def api_get_conversation(
     conversation_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
+    tail: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None
 ):
     """특정 대화 상세 조회"""
-    return await get_conversation(conversation_id, current_user)
+    return await get_conversation(
+        conversation_id, current_user, if_none_match, tail, after, limit, fields
+    )
 
 @app.delete("/api/conversations/{conversation_id}")
 async def api_delete_conversation(
@@ -378,6 +1639,44 @@ async def api_delete_conversation(
     """대화 삭제"""
     return await delete_conversation(conversation_id, current_user)
 
+# 관리자 라우트
+@app.get("/admin/metrics")
+async def admin_metrics(admin_user: dict = Depends(get_admin_user)):
+    """프로세스 내 캐시 및 비밀번호 해시 풀 통계"""
+    return {"user_cache": user_cache.stats(), "password_hasher": password_hasher.stats()}
+
+@app.get("/admin/indexes")
+async def admin_index_health(
+    verbose: bool = False,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """인덱스 상태와 주요 쿼리의 실행 계획"""
+    status_report = await verify_indexes()
+    user_id = admin_user["_id"]
+    hot_queries = {
+        "user_lookup": users_collection.find({"email": admin_user["email"]}).limit(1),
+        "list_by_created": conversations_collection.find(
+            {"user_id": user_id}, {"messages": 0}
+        ).sort("created_at", -1).limit(20),
+        "list_by_updated": conversations_collection.find(
+            {"user_id": user_id}, {"messages": 0}
+        ).sort([("updated_at", DESCENDING), ("_id", DESCENDING)]).limit(20),
+        "text_search": conversations_collection.find(
+            {"user_id": user_id, "$text": {"$search": "pensieve"}}, {"messages": 0}
+        ).limit(20),
+    }
+    plans: Dict[str, Any] = {}
+    for name, cursor in hot_queries.items():
+        try:
+            explain = await cursor.explain()
+            plans[name] = summarize_plan(explain)
+            if verbose:
+                # explain 결과에는 BSON 전용 타입이 섞여 있어 extended JSON 으로 변환
+                plans[name]["explain"] = json.loads(json_util.dumps(explain))
+        except PyMongoError as e:
+            plans[name] = {"error": str(e)}
+    return jsonable_encoder({"indexes": status_report, "plans": plans})
+
 # 기존 API 호환성을 위한 라우트
 @app.get("/health")
 async def health_check():
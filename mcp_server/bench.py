@@ -0,0 +1,268 @@
+"""저장 엔진 벤치마크 (pensieve-bench)
+
+합성 대화 말뭉치(한국어/영어)를 만들어 엔진마다 같은 순서로 ConversationStore 의
+write_many, write, read, append, list, search, delete 를 실행하고 연산별 처리량과 p50/p99 지연 시간을 보고한다.
+
+    pensieve-bench --engines memory,json,sqlite --conversations 10000 --language mixed
+    pensieve-bench --engines mongo --mongo-url mongodb://localhost:27017 --json
+
+말뭉치는 시드로 결정되는 생성기라서 대화 수가 커도 메모리에 한꺼번에 올리지 않는다
+(memory 엔진은 저장한 대화를 모두 메모리에 두므로 예외).
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from mcp_server.stores import ENGINES, ConversationStore, MongoStore, open_store
+
+# 합성 본문에 쓰는 어휘 (한국어는 조사가 붙은 어절 포함)
+KOREAN_WORDS = (
+    "데이터베이스 인덱스를 설계할 때 쿼리 성능이 중요합니다 캐시는 메모리에 저장하고 서버가 요청을 "
+    "처리하는 동안 로그를 기록합니다 사용자는 대화를 검색하고 목록에서 선택한 뒤 메시지를 추가했다 "
+    "배포 환경에서 설정 파일을 확인하세요 비동기 작업이 끝나면 결과를 반환하고 오류가 발생하면 "
+    "다시 시도합니다 압축된 본문은 필요할 때만 복원된다 동기화 충돌은 최신 버전을 기준으로 해결한다"
+).split()
+ENGLISH_WORDS = (
+    "the database index query cache memory server request response latency throughput storage "
+    "conversation message search result page cursor token model prompt context window deploy config "
+    "async task retry error compress snapshot replica shard vector embedding migrate schema table row "
+    "column transaction commit rollback lock thread pool queue batch stream export import sync"
+).split()
+ROLES = ("user", "assistant")
+PERCENTILES = (50, 99)
+
+
+def synthetic_text(rng: random.Random, chars: int, language: str) -> str:
+    """대략 chars 글자의 합성 문장 (mixed 는 문장마다 언어를 고름)"""
+    words: List[str] = []
+    length = 0
+    vocabulary = KOREAN_WORDS if language == "ko" else ENGLISH_WORDS
+    while length < chars:
+        if language == "mixed" and rng.random() < 0.1:
+            vocabulary = KOREAN_WORDS if vocabulary is ENGLISH_WORDS else ENGLISH_WORDS
+        word = rng.choice(vocabulary)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:chars]
+
+
+class Corpus:
+    """시드로 결정되는 합성 대화 생성기"""
+
+    def __init__(
+        self,
+        conversations: int,
+        messages: int,
+        min_chars: int,
+        max_chars: int,
+        language: str = "mixed",
+        seed: int = 0,
+    ):
+        self.conversations = conversations
+        self.messages = messages
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.language = language
+        self.seed = seed
+
+    def conversation_id(self, number: int) -> str:
+        return f"bench-{self.seed}-{number:08d}"
+
+    def messages_for(self, rng: random.Random, count: int, offset: int = 0) -> List[Dict[str, Any]]:
+        return [
+            {
+                "role": ROLES[(offset + index) % 2],
+                "content": synthetic_text(rng, rng.randint(self.min_chars, self.max_chars), self.language),
+            }
+            for index in range(count)
+        ]
+
+    def conversation(self, number: int) -> Dict[str, Any]:
+        rng = random.Random(f"{self.seed}:{number}")
+        now = time.time() - (self.conversations - number)
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now))
+        return {
+            "id": self.conversation_id(number),
+            "messages": self.messages_for(rng, self.messages),
+            "metadata": {
+                "title": synthetic_text(rng, 30, self.language),
+                "tags": rng.sample(ENGLISH_WORDS, 2),
+            },
+            "created_at": timestamp,
+            "updated_at": timestamp,
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for number in range(self.conversations):
+            yield self.conversation(number)
+
+    def query(self, rng: random.Random) -> str:
+        korean = self.language == "ko" or (self.language == "mixed" and rng.random() < 0.5)
+        return " ".join(rng.sample(KOREAN_WORDS if korean else ENGLISH_WORDS, 2))
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """정렬된 값의 nearest-rank 백분위수"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def measure(
+    samples: int,
+    operation: Callable[[Any], Any],
+    prepare: Optional[Callable[[int], Any]] = None,
+    items: Callable[[Any], int] = lambda _: 1,
+) -> Dict[str, Any]:
+    """operation 을 samples 번 실행하고 처리량과 지연 시간 백분위수 (ms) 계산
+
+    prepare(i) 가 있으면 그 결과를 operation 에 넘기며 준비 시간은 재지 않는다.
+    items(인자) 는 한 번의 호출이 처리한 대화 수로, 일괄 저장의 처리량을 대화 기준으로 센다.
+    """
+    latencies: List[float] = []
+    processed = 0
+    for i in range(samples):
+        argument = prepare(i) if prepare else i
+        begin = time.perf_counter()
+        operation(argument)
+        latencies.append(time.perf_counter() - begin)
+        processed += items(argument)
+    elapsed = sum(latencies)
+    latencies.sort()
+    report = {
+        "calls": samples,
+        "items": processed,
+        "seconds": round(elapsed, 4),
+        "throughput": round(processed / elapsed, 1) if elapsed > 0 else None,
+    }
+    for p in PERCENTILES:
+        report[f"p{p}_ms"] = round(percentile(latencies, p) * 1000, 3)
+    return report
+
+
+def run_engine(store: ConversationStore, corpus: Corpus, operations: int, batch_size: int, seed: int) -> Dict[str, Any]:
+    """한 엔진에서 모든 연산을 측정"""
+    rng = random.Random(seed)
+    results: Dict[str, Any] = {}
+
+    # 말뭉치 생성 시간은 빼고 저장 시간만 잼
+    batches = -(-corpus.conversations // batch_size)
+    stream = iter(corpus)
+    results["write_many"] = measure(
+        batches,
+        store.write_many,
+        prepare=lambda i: [next(stream) for _ in range(min(batch_size, corpus.conversations - i * batch_size))],
+        items=len,
+    )
+
+    extra = [corpus.conversation(corpus.conversations + i) for i in range(operations)]
+    results["write"] = measure(operations, lambda i: store.write(extra[i]))
+
+    ids = [corpus.conversation_id(rng.randrange(corpus.conversations)) for _ in range(operations)]
+    results["read"] = measure(operations, lambda i: store.read(ids[i]))
+
+    appends = [corpus.messages_for(rng, 2, offset=corpus.messages) for _ in range(operations)]
+    results["append"] = measure(operations, lambda i: store.append(ids[i], appends[i], datetime.now().isoformat()))
+
+    pages: Dict[str, Optional[str]] = {"cursor": None}
+
+    def list_page(_: int) -> None:
+        _, pages["cursor"] = store.list(50, pages["cursor"])
+
+    results["list"] = measure(operations, list_page)
+
+    queries = [corpus.query(rng) for _ in range(operations)]
+    results["search"] = measure(operations, lambda i: store.search(queries[i], 20))
+
+    results["delete"] = measure(operations, lambda i: store.delete(extra[i]["id"]))
+    return results
+
+
+def format_table(report: Dict[str, Dict[str, Dict[str, Any]]]) -> str:
+    header = f"{'engine':<8} {'operation':<10} {'calls':>8} {'items/s':>12} {'p50 ms':>10} {'p99 ms':>10}"
+    lines = [header, "-" * len(header)]
+    for engine, operations in report.items():
+        if "error" in operations:
+            lines.append(f"{engine:<8} {'error':<10} {operations['error']}")
+            continue
+        for name, stats in operations.items():
+            lines.append(
+                f"{engine:<8} {name:<10} {stats['calls']:>8} {stats['throughput'] or 0:>12.1f} "
+                f"{stats['p50_ms']:>10.3f} {stats['p99_ms']:>10.3f}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="pensieve-bench", description="대화 저장 엔진 벤치마크")
+    parser.add_argument("--engines", default="memory,json,sqlite", help=f"쉼표 구분 엔진 목록 ({', '.join(ENGINES)})")
+    parser.add_argument("--conversations", type=int, default=1000, help="일괄 저장할 대화 수 (기본 1000)")
+    parser.add_argument("--messages", type=int, default=10, help="대화당 메시지 수 (기본 10)")
+    parser.add_argument("--min-chars", type=int, default=100, help="메시지 최소 글자 수")
+    parser.add_argument("--max-chars", type=int, default=800, help="메시지 최대 글자 수")
+    parser.add_argument("--language", choices=("ko", "en", "mixed"), default="mixed", help="본문 언어")
+    parser.add_argument("--operations", type=int, default=200, help="연산별 측정 횟수 (기본 200)")
+    parser.add_argument("--batch-size", type=int, default=500, help="일괄 저장 한 번의 대화 수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", help="로컬 엔진 작업 디렉토리 (기본: 임시 디렉토리, 끝나면 삭제)")
+    parser.add_argument("--mongo-url", default=os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--mongo-db", default="pensieve_bench")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON 으로 출력")
+    args = parser.parse_args(argv)
+
+    engines = [engine.strip() for engine in args.engines.split(",") if engine.strip()]
+    unknown = [engine for engine in engines if engine not in ENGINES]
+    if unknown:
+        parser.error(f"알 수 없는 엔진: {', '.join(unknown)}")
+    if args.conversations < 1 or args.operations < 1 or args.min_chars > args.max_chars:
+        parser.error("--conversations/--operations 는 1 이상, --min-chars 는 --max-chars 이하여야 합니다")
+    # 측정 중 삭제/추가 대상이 모자라지 않도록
+    operations = min(args.operations, args.conversations)
+
+    corpus = Corpus(args.conversations, args.messages, args.min_chars, args.max_chars, args.language, args.seed)
+    workdir = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="pensieve-bench-"))
+    report: Dict[str, Any] = {}
+    try:
+        for engine in engines:
+            directory = workdir / engine
+            if directory.exists():
+                shutil.rmtree(directory)
+            options = {}
+            if engine == "mongo":
+                options = {"url": args.mongo_url, "database": args.mongo_db, "collection": f"bench_{os.getpid()}"}
+            try:
+                store = open_store(engine, directory, **options)
+            except Exception as e:
+                report[engine] = {"error": str(e)}
+                continue
+            print(f"{engine}: 대화 {args.conversations}개로 측정 중...", file=sys.stderr)
+            try:
+                report[engine] = run_engine(store, corpus, operations, args.batch_size, args.seed)
+            finally:
+                if isinstance(store, MongoStore):
+                    store.drop()
+                store.close()
+    finally:
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        # 접속 정보가 담길 수 있는 mongo_url 은 출력하지 않음
+        settings = {key: value for key, value in vars(args).items() if key not in ("mongo_url", "json")}
+        print(json.dumps({"settings": settings, "results": report}, ensure_ascii=False, indent=2))
+    else:
+        print(format_table(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""큰 메시지 본문을 한 번만 저장하는 내용 주소(content-addressed) blob 저장소
+
+본문이 PENSIEVE_BLOB_MIN_BYTES 이상인 메시지는 content 대신
+content_ref = {"hash", "size"} 를 대화 문서에 기록하고, 본문은 sha256 해시를 이름으로
+blobs/ 아래에 압축해 한 번만 저장한다. 여러 대화에 반복되는 시스템 프롬프트나 붙여 넣은
+파일이 한 벌만 남는다.
+
+어떤 대화가 어떤 blob 을 몇 번 참조하는지는 refs.db 에 기록하며, 대화를 다시 쓰거나
+삭제할 때 참조를 갱신하고 더 이상 참조되지 않는 blob 파일은 지운다. 참조는 대화
+문서를 쓴 뒤에 commit 으로 기록하고, 그 사이에는 blob 을 고정(pin)해 정리 작업이
+지우지 않게 한다.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from mcp_server.compression import expand_message, pack_bytes, unpack_bytes
+from mcp_server.storage import atomic_write_bytes
+
+BLOB_MIN_BYTES = int(os.getenv("PENSIEVE_BLOB_MIN_BYTES", str(16 * 1024)))
+
+
+class BlobStore:
+    """해시 -> 압축된 본문 파일 + 대화별 참조 수"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        # store_messages 로 썼지만 아직 commit/abort 되지 않은 blob (해시 -> 고정 수)
+        self._pinned: Counter = Counter()
+        self._conn = sqlite3.connect(str(self.directory / "refs.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS refs (
+                    conversation_id TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (conversation_id, hash)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS refs_hash ON refs (hash);
+                """
+            )
+
+    def path(self, digest: str) -> Path:
+        return self.directory / digest[:2] / digest
+
+    # 본문
+
+    def put(self, content: str) -> Dict[str, Any]:
+        """본문을 저장하고 참조 정보 반환 (같은 본문이 이미 있으면 쓰지 않음)"""
+        raw = content.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self.path(digest)
+        with self._lock:
+            if not path.exists():
+                path.parent.mkdir(exist_ok=True)
+                atomic_write_bytes(path, pack_bytes(raw))
+        return {"hash": digest, "size": len(raw)}
+
+    def get(self, digest: str) -> str:
+        return unpack_bytes(self.path(digest).read_bytes()).decode("utf-8")
+
+    # 메시지 변환
+
+    def store_messages(self, messages: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """큰 본문을 blob 으로 쓰고 (참조로 바꾼 메시지 목록, blob 해시 목록) 반환
+
+        참조는 아직 기록하지 않는다. 대화 문서를 쓴 뒤 commit, 쓰지 못했으면 abort 를
+        호출해야 하며 그때까지 해시들은 고정되어 정리 작업이 지우지 않는다.
+        """
+        stored: List[Dict[str, Any]] = []
+        hashes: List[str] = []
+        with self._lock:
+            for message in messages:
+                content = message.get("content")
+                # 문자 수로 먼저 거르고 (UTF-8 은 문자당 최대 4바이트) 후보만 인코딩
+                if (
+                    isinstance(content, str)
+                    and len(content) * 4 >= BLOB_MIN_BYTES
+                    and len(content.encode("utf-8")) >= BLOB_MIN_BYTES
+                ):
+                    ref = self.put(content)
+                    message = {key: value for key, value in message.items() if key != "content"}
+                    message["content_ref"] = ref
+                    hashes.append(ref["hash"])
+                stored.append(message)
+            self._pinned.update(hashes)
+        return stored, hashes
+
+    def _unpin(self, hashes: Iterable[str]) -> None:
+        self._pinned.subtract(hashes)
+        self._pinned = +self._pinned
+
+    def resolve_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """blob 참조나 압축된 본문을 복원한 메시지 (해당 없으면 원본)"""
+        ref = message.get("content_ref")
+        if ref is None:
+            return expand_message(message)
+        resolved = {key: value for key, value in message.items() if key != "content_ref"}
+        resolved["content"] = self.get(ref["hash"])
+        return resolved
+
+    def resolve_conversation(self, conversation: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if conversation is None:
+            return None
+        messages = conversation.get("messages", [])
+        if not any("content_ref" in message or "content_z" in message for message in messages):
+            return conversation
+        return dict(conversation, messages=[self.resolve_message(message) for message in messages])
+
+    # 참조 수
+
+    def _add(self, conversation_id: str, hashes: Iterable[str]) -> None:
+        self._conn.executemany(
+            "INSERT INTO refs (conversation_id, hash, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(conversation_id, hash) DO UPDATE SET count = count + excluded.count",
+            [(conversation_id, digest, count) for digest, count in Counter(hashes).items()],
+        )
+
+    def _collect(self, candidates: Iterable[str]) -> int:
+        """candidates 중 더 이상 참조되지 않는 blob 파일 삭제"""
+        removed = 0
+        for digest in set(candidates):
+            if digest in self._pinned:
+                continue
+            if self._conn.execute("SELECT 1 FROM refs WHERE hash = ? LIMIT 1", (digest,)).fetchone():
+                continue
+            try:
+                self.path(digest).unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _release(self, conversation_id: str) -> List[str]:
+        previous = [
+            row[0] for row in self._conn.execute(
+                "SELECT hash FROM refs WHERE conversation_id = ?", (conversation_id,)
+            )
+        ]
+        self._conn.execute("DELETE FROM refs WHERE conversation_id = ?", (conversation_id,))
+        return previous
+
+    def commit(self, conversation_id: str, hashes: List[str], replace: bool = False) -> int:
+        """대화 문서를 쓴 뒤 store_messages 의 해시를 참조로 기록하고 고정 해제
+
+        replace 이면 대화 전체를 다시 쓴 경우로 기존 참조를 교체하고 고아가 된 blob 을
+        정리한다. 반환값은 지운 blob 수.
+        """
+        with self._lock:
+            with self._conn:
+                previous = self._release(conversation_id) if replace else []
+                self._add(conversation_id, hashes)
+            self._unpin(hashes)
+            return self._collect(previous)
+
+    def abort(self, hashes: List[str]) -> int:
+        """대화 문서를 쓰지 못했을 때 store_messages 의 고정을 풀고 참조 없는 blob 정리"""
+        with self._lock:
+            self._unpin(hashes)
+            return self._collect(hashes)
+
+    def release(self, conversation_id: str) -> int:
+        """대화 삭제 시 참조를 모두 지우고 고아가 된 blob 을 정리"""
+        return self.commit(conversation_id, [], replace=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            blobs, references = self._conn.execute(
+                "SELECT COUNT(DISTINCT hash), COALESCE(SUM(count), 0) FROM refs"
+            ).fetchone()
+        return {"blobs": blobs, "references": references}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,137 @@
+"""항목 수와 대략적인 바이트 크기로 제한되는 LRU 대화 캐시"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# 메시지/문서당 고정 오버헤드 추정치 (dict, 키 문자열 등)
+_MESSAGE_OVERHEAD = 64
+_DOCUMENT_OVERHEAD = 256
+
+
+def estimate_size(value: Any) -> int:
+    """JSON 형태 값의 대략적인 메모리 크기 (정확한 계산 대신 문자열 길이 합)"""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return _MESSAGE_OVERHEAD + sum(len(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, list):
+        return 8 * len(value) + sum(estimate_size(item) for item in value)
+    return 8
+
+
+class _Entry:
+    __slots__ = ("value", "size", "mtime")
+
+    def __init__(self, value: Dict[str, Any], size: int, mtime: float):
+        self.value = value
+        self.size = size
+        self.mtime = mtime
+
+
+class ConversationCache:
+    """mtime 기반 무효화를 지원하는 LRU 캐시
+
+    다른 프로세스가 파일을 수정하면 저장된 mtime 과 달라지므로 다음 조회에서
+    항목을 버리고 다시 읽게 된다. 저장된 문서는 고치지 않고 교체만 하므로 get 이
+    돌려준 문서는 호출한 쪽이 잠금 없이 읽어도 된다.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, mtime: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """항목 조회 - mtime 이 주어지고 저장 시점과 다르면 무효화"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if mtime is not None and entry.mtime != mtime:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def put(self, key: str, value: Dict[str, Any], mtime: float) -> None:
+        size = _DOCUMENT_OVERHEAD + estimate_size(value)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = _Entry(value, size, mtime)
+            self._bytes += size
+            self._evict()
+
+    def append_messages(self, key: str, messages: List[Dict[str, Any]], updated_at: str, mtime: float) -> None:
+        """캐시된 문서에 메시지를 덧붙인 새 문서로 교체 (문서 전체 크기를 다시 계산하지 않음)
+
+        get 이 돌려준 문서를 다른 스레드가 직렬화하고 있을 수 있으므로 기존 문서와
+        메시지 목록은 고치지 않는다.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.value = dict(
+                entry.value, messages=entry.value.get("messages", []) + messages, updated_at=updated_at
+            )
+            added = estimate_size(messages)
+            entry.size += added
+            entry.mtime = mtime
+            self._bytes += added
+            self._entries.move_to_end(key)
+            if entry.size > self.max_bytes:
+                self._remove(key)
+            self._evict()
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """적중/실패/축출 카운터와 현재 사용량"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,207 @@
+"""큰 메시지 본문의 저장 시 압축
+
+content 가 PENSIEVE_COMPRESS_MIN_BYTES 이상인 메시지는 저장할 때
+content 대신 content_z = {"codec", "data"(base64), "dict"(선택)} 로 바꿔 기록한다.
+캐시에도 압축된 형태로 올라가며, 실제로 메시지를 돌려주거나 본문이 필요할 때만
+expand_message 로 풀어낸다.
+
+- PENSIEVE_COMPRESSION: auto(기본, zstandard 가 있으면 zstd 아니면 zlib) | zstd | zlib | none
+- PENSIEVE_COMPRESSION_DICT: zstd 사전 파일 경로 (pensieve-train-dict 로 생성)
+
+    pensieve-train-dict ~/.pensieve-mcp/exports/conversations.ndjson -o ~/.pensieve-mcp/zstd.dict
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import sys
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("PENSIEVE_COMPRESS_MIN_BYTES", "4096"))
+# 압축 후 크기가 원본의 이 비율보다 크면 압축하지 않음
+COMPRESS_MAX_RATIO = 0.9
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+
+_requested = os.getenv("PENSIEVE_COMPRESSION", "auto").lower()
+if _requested == "auto":
+    CODEC = "zstd" if zstandard is not None else "zlib"
+elif _requested == "zstd" and zstandard is None:
+    # stdio MCP 서버에서는 stdout 이 JSON-RPC 채널이므로 stderr 로 알림
+    print("PENSIEVE_COMPRESSION=zstd 이지만 zstandard 가 설치되지 않아 zlib 을 사용합니다", file=sys.stderr)
+    CODEC = "zlib"
+else:
+    CODEC = _requested
+
+_dictionary = None
+_dict_path = os.getenv("PENSIEVE_COMPRESSION_DICT")
+if _dict_path and zstandard is not None and CODEC == "zstd":
+    _dictionary = zstandard.ZstdCompressionDict(Path(_dict_path).expanduser().read_bytes())
+
+
+def _compress(raw: bytes) -> Dict[str, Any]:
+    if CODEC == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=_dictionary)
+        envelope = {"codec": "zstd", "data": compressor.compress(raw)}
+        if _dictionary is not None:
+            envelope["dict"] = _dictionary.dict_id()
+        return envelope
+    return {"codec": "zlib", "data": zlib.compress(raw, ZLIB_LEVEL)}
+
+
+def _decompress(envelope: Dict[str, Any], data: bytes) -> bytes:
+    codec = envelope["codec"]
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd 로 압축된 메시지를 읽으려면 zstandard 패키지가 필요합니다")
+        dict_id = envelope.get("dict")
+        if dict_id is not None and (_dictionary is None or _dictionary.dict_id() != dict_id):
+            raise RuntimeError(f"zstd 사전(id={dict_id})이 필요합니다: PENSIEVE_COMPRESSION_DICT 를 확인하세요")
+        return zstandard.ZstdDecompressor(dict_data=_dictionary if dict_id is not None else None).decompress(data)
+    raise ValueError(f"알 수 없는 압축 방식: {codec}")
+
+
+def pack_bytes(raw: bytes) -> bytes:
+    """압축 방식 정보를 담은 자기 기술형 바이트로 압축 (blob 파일용)
+
+    첫 줄은 {"codec", "dict"} JSON 헤더이고 그 뒤가 압축된 데이터다.
+    """
+    if CODEC == "none":
+        envelope = {"codec": "none", "data": raw}
+    else:
+        envelope = _compress(raw)
+    header = {key: value for key, value in envelope.items() if key != "data"}
+    return json.dumps(header).encode("ascii") + b"\n" + envelope["data"]
+
+
+def unpack_bytes(packed: bytes) -> bytes:
+    header, _, data = packed.partition(b"\n")
+    envelope = json.loads(header)
+    if envelope["codec"] == "none":
+        return data
+    return _decompress(envelope, data)
+
+
+def _compress_text(content: Any) -> Optional[Dict[str, Any]]:
+    """content 가 충분히 크고 압축 효과가 있으면 압축 결과, 아니면 None"""
+    if CODEC == "none" or not isinstance(content, str) or len(content) < COMPRESS_MIN_BYTES:
+        return None
+    raw = content.encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return None
+    envelope = _compress(raw)
+    if len(envelope["data"]) > len(raw) * COMPRESS_MAX_RATIO:
+        return None
+    return envelope
+
+
+def pack_text(content: str) -> Union[str, bytes]:
+    """compress_message 와 같은 기준으로 크면 pack_bytes 형식의 bytes, 아니면 원문 (SQLite 열 보관용)"""
+    envelope = _compress_text(content)
+    if envelope is None:
+        return content
+    header = {key: value for key, value in envelope.items() if key != "data"}
+    return json.dumps(header).encode("ascii") + b"\n" + envelope["data"]
+
+
+def unpack_text(value: Union[str, bytes]) -> str:
+    return value if isinstance(value, str) else unpack_bytes(value).decode("utf-8")
+
+
+def compress_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """content 가 충분히 크면 압축한 사본을, 아니면 원본을 반환"""
+    envelope = _compress_text(message.get("content"))
+    if envelope is None:
+        return message
+    envelope["data"] = base64.b64encode(envelope["data"]).decode("ascii")
+    compressed = {key: value for key, value in message.items() if key != "content"}
+    compressed["content_z"] = envelope
+    return compressed
+
+
+def compress_messages(messages: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [compress_message(message) for message in messages]
+
+
+def expand_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """압축된 메시지면 content 를 복원한 사본을, 아니면 원본을 반환"""
+    envelope = message.get("content_z")
+    if envelope is None:
+        return message
+    raw = _decompress(envelope, base64.b64decode(envelope["data"]))
+    expanded = {key: value for key, value in message.items() if key != "content_z"}
+    expanded["content"] = raw.decode("utf-8")
+    return expanded
+
+
+def train_dictionary(samples: Iterable[str], path: Path, size: int = 112 * 1024) -> Path:
+    """저장된 메시지 본문으로 zstd 사전을 학습해 path 에 저장
+
+    비슷한 코드/로그가 반복되는 말뭉치에서는 사전이 작은 메시지의 압축률을 크게
+    높인다. 사전을 바꾸면 이전 사전으로 압축된 메시지를 읽을 수 없으므로 기존 파일은
+    보관해 두어야 한다.
+    """
+    if zstandard is None:
+        raise RuntimeError("사전 학습에는 zstandard 패키지가 필요합니다")
+    dictionary = zstandard.train_dictionary(size, [sample.encode("utf-8") for sample in samples])
+    path = Path(path).expanduser()
+    path.write_bytes(dictionary.as_bytes())
+    return path
+
+
+def export_samples(paths: Iterable[Path], limit: int) -> Iterator[str]:
+    """내보내기 NDJSON(.ndjson / .ndjson.gz) 파일에서 메시지 본문을 최대 limit 개 읽음"""
+    count = 0
+    for path in paths:
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                for message in json.loads(line).get("messages", []):
+                    content = message.get("content")
+                    if isinstance(content, str) and content:
+                        yield content
+                        count += 1
+                        if count >= limit:
+                            return
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """pensieve-train-dict: 내보낸 대화로 zstd 사전을 학습
+
+    로컬(export_conversations)과 API(GET /conversations/export) 내보내기 모두 같은
+    형식이므로, 만든 사전은 PENSIEVE_COMPRESSION_DICT 와 MESSAGE_COMPRESSION_DICT 어느 쪽에도 쓸 수 있다.
+    """
+    parser = argparse.ArgumentParser(prog="pensieve-train-dict", description="내보낸 대화로 zstd 압축 사전 학습")
+    parser.add_argument("exports", nargs="+", type=Path, help="내보내기 파일 (.ndjson 또는 .ndjson.gz)")
+    parser.add_argument("-o", "--output", type=Path, required=True, help="사전을 저장할 경로")
+    parser.add_argument("--size", type=int, default=112 * 1024, help="사전 크기 (바이트, 기본 112 KiB)")
+    parser.add_argument("--max-samples", type=int, default=100000, help="학습에 쓸 최대 메시지 수")
+    args = parser.parse_args(argv)
+
+    if zstandard is None:
+        parser.error("사전 학습에는 zstandard 패키지가 필요합니다 (pip install 'pensieve-mcp[zstd]')")
+    if args.output.expanduser().exists():
+        # 이전 사전으로 압축된 메시지를 읽을 수 없게 되므로 덮어쓰지 않음
+        parser.error(f"이미 있는 사전 파일입니다: {args.output}")
+    samples = list(export_samples([path.expanduser() for path in args.exports], args.max_samples))
+    if not samples:
+        parser.error("학습할 메시지가 없습니다")
+    path = train_dictionary(samples, args.output, args.size)
+    print(f"메시지 {len(samples)}개로 사전을 만들었습니다: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,432 @@
+"""대화 요약 정보(manifest) 저장소
+
+list_conversations 가 대화 파일을 열지 않고도 id, 메타데이터, 타임스탬프,
+메시지 수를 돌려줄 수 있도록 쓰기 시점마다 요약 필드를 SQLite 에 동기화한다.
+제목/태그/메시지 역할은 보조 테이블과 인덱스로 두어 필터와 패싯 집계에 쓴다.
+"""
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MANIFEST_VERSION = "2"
+
+# 필터로 받는 키 (tags 는 모두 포함, title 은 부분 일치, 날짜는 ISO 문자열 [after, before))
+FILTER_KEYS = ("tags", "title", "role", "created_after", "created_before", "updated_after", "updated_before")
+# 패싯마다 돌려줄 최대 값 수
+FACET_LIMIT = 20
+
+# 대화별로 기억할 append 기록 수 (Idempotency-Key 비교 대상)
+APPEND_HISTORY_SIZE = 50
+# 대화별로 기억할 마지막 메시지 해시 수 (dedup append 의 비교 대상)
+APPEND_TAIL_SIZE = 50
+
+
+def message_hash(message: Dict[str, Any]) -> str:
+    """메시지 (role, content) 의 내용 해시 (API 서버와 같은 방식)"""
+    return hashlib.sha256(
+        json.dumps([message.get("role"), message.get("content")], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def tail_overlap(tail: List[str], hashes: List[str]) -> int:
+    """hashes 의 앞부분이 tail 의 끝부분과 겹치는 최대 길이 (이미 추가된 메시지 수)"""
+    for size in range(min(len(tail), len(hashes)), 0, -1):
+        if tail[-size:] == hashes[:size]:
+            return size
+    return 0
+
+
+def metadata_tags(metadata: Dict[str, Any]) -> List[str]:
+    """metadata.tags (목록 또는 쉼표 구분 문자열)를 중복 없는 태그 목록으로"""
+    tags = metadata.get("tags") if isinstance(metadata, dict) else None
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    if not isinstance(tags, list):
+        return []
+    return list(dict.fromkeys(str(tag).strip() for tag in tags if str(tag).strip()))
+
+
+def encode_cursor(sort_key: float, conversation_id: str) -> str:
+    """(정렬 키, id) 위치를 불투명한 커서 문자열로 인코딩"""
+    raw = json.dumps([sort_key, conversation_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_key, conversation_id = json.loads(raw)
+        return float(sort_key), str(conversation_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"잘못된 커서입니다: {cursor}") from e
+
+
+class ConversationManifest:
+    """대화별 요약 필드를 담는 SQLite 테이블"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY,
+                    metadata TEXT NOT NULL,
+                    created_at TEXT,
+                    updated_at TEXT,
+                    message_count INTEGER NOT NULL,
+                    sort_key REAL NOT NULL
+                );
+                DROP INDEX IF EXISTS conversations_sort;
+                CREATE INDEX IF NOT EXISTS conversations_sort_id
+                    ON conversations (sort_key DESC, id DESC);
+                CREATE TABLE IF NOT EXISTS append_history (
+                    conversation_id TEXT NOT NULL,
+                    idempotency_key TEXT,
+                    appended_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS append_history_conversation
+                    ON append_history (conversation_id, appended_at);
+                CREATE TABLE IF NOT EXISTS append_tail (
+                    conversation_id TEXT PRIMARY KEY,
+                    hashes TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS conversation_tags (
+                    conversation_id TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    PRIMARY KEY (tag, conversation_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS conversation_tags_conversation
+                    ON conversation_tags (conversation_id);
+                CREATE TABLE IF NOT EXISTS conversation_roles (
+                    conversation_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (role, conversation_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS conversation_roles_conversation
+                    ON conversation_roles (conversation_id);
+                CREATE INDEX IF NOT EXISTS conversations_created ON conversations (created_at);
+                CREATE INDEX IF NOT EXISTS conversations_updated ON conversations (updated_at);
+                """
+            )
+            # 버전 1 manifest 에는 title 열이 없음 (값은 버전 확인 후 rebuild 로 채워짐)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(conversations)")}
+            if "title" not in columns:
+                self._conn.execute("ALTER TABLE conversations ADD COLUMN title TEXT")
+            # 이전 manifest 의 append_history 에는 쓰이지 않는 digest 열이 있음 - 키 기록만 옮김
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(append_history)")}
+            if "digest" in columns:
+                self._conn.execute("ALTER TABLE append_history RENAME TO append_history_old")
+                self._conn.execute("DROP INDEX IF EXISTS append_history_conversation")
+                self._conn.execute(
+                    "CREATE TABLE append_history (conversation_id TEXT NOT NULL, "
+                    "idempotency_key TEXT, appended_at REAL NOT NULL)"
+                )
+                self._conn.execute(
+                    "INSERT INTO append_history (conversation_id, idempotency_key, appended_at) "
+                    "SELECT conversation_id, idempotency_key, appended_at FROM append_history_old "
+                    "WHERE idempotency_key IS NOT NULL"
+                )
+                self._conn.execute("DROP TABLE append_history_old")
+                self._conn.execute(
+                    "CREATE INDEX append_history_conversation ON append_history (conversation_id, appended_at)"
+                )
+
+    @property
+    def is_initialized(self) -> bool:
+        """manifest 가 한 번이라도 구축되었는지 여부"""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row is not None and row[0] == MANIFEST_VERSION
+
+    def _upsert(self, data: Dict[str, Any], sort_key: float) -> None:
+        metadata = data.get("metadata", {})
+        title = metadata.get("title") if isinstance(metadata, dict) else None
+        self._conn.execute(
+            "INSERT OR REPLACE INTO conversations "
+            "(id, metadata, created_at, updated_at, message_count, sort_key, title) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                data["id"],
+                json.dumps(metadata, ensure_ascii=False),
+                data.get("created_at"),
+                data.get("updated_at"),
+                len(data.get("messages", [])),
+                sort_key,
+                None if title is None else str(title),
+            ),
+        )
+        self._conn.execute("DELETE FROM conversation_tags WHERE conversation_id = ?", (data["id"],))
+        self._conn.executemany(
+            "INSERT INTO conversation_tags (conversation_id, tag) VALUES (?, ?)",
+            [(data["id"], tag) for tag in metadata_tags(metadata)],
+        )
+        self._conn.execute("DELETE FROM conversation_roles WHERE conversation_id = ?", (data["id"],))
+        self._add_roles(data["id"], [message.get("role") for message in data.get("messages", [])])
+
+    def _add_roles(self, conversation_id: str, roles: List[Optional[str]]) -> None:
+        self._conn.executemany(
+            "INSERT INTO conversation_roles (conversation_id, role, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(role, conversation_id) DO UPDATE SET count = count + excluded.count",
+            [(conversation_id, role, count) for role, count in Counter(str(role or "") for role in roles).items()],
+        )
+
+    def upsert(self, data: Dict[str, Any], sort_key: Optional[float] = None) -> None:
+        """대화 문서로부터 요약 행을 기록"""
+        with self._lock, self._conn:
+            self._upsert(data, time.time() if sort_key is None else sort_key)
+            # 문서를 다시 썼으므로 dedup 비교 대상도 새 문서의 마지막 메시지로 교체 (키는 유지)
+            self._set_tail(data["id"], [message_hash(message) for message in data.get("messages", [])[-APPEND_TAIL_SIZE:]])
+
+    def _set_tail(self, conversation_id: str, hashes: List[str]) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO append_tail (conversation_id, hashes) VALUES (?, ?)",
+            (conversation_id, json.dumps(hashes[-APPEND_TAIL_SIZE:])),
+        )
+
+    def _tail(self, conversation_id: str) -> List[str]:
+        row = self._conn.execute(
+            "SELECT hashes FROM append_tail WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def claim_append(
+        self, conversation_id: str, hashes: List[str], idempotency_key: Optional[str], dedup: bool = False
+    ) -> Optional[int]:
+        """append 요청을 판별해 중복이면 None, 아니면 이미 추가되어 건너뛸 앞쪽 메시지 수
+
+        키가 있으면 최근 키와 비교해 본 적 있는 요청을 중복으로 보고 키를 기록한다.
+        dedup 이면 메시지별 해시를 대화의 마지막 메시지 해시와 비교해, 재시도에 섞여
+        다시 온 앞쪽 메시지를 건너뛴다 (모두 이미 있으면 중복). 둘 다 없으면 같은
+        내용이 연달아 와도 정상 추가한다.
+        """
+        with self._lock, self._conn:
+            if idempotency_key:
+                row = self._conn.execute(
+                    "SELECT 1 FROM append_history WHERE conversation_id = ? AND idempotency_key = ?",
+                    (conversation_id, idempotency_key),
+                ).fetchone()
+                if row is not None:
+                    return None
+            skip = tail_overlap(self._tail(conversation_id), hashes) if dedup else 0
+            if hashes and skip == len(hashes):
+                return None
+            if not idempotency_key:
+                return skip
+
+            self._conn.execute(
+                "INSERT INTO append_history (conversation_id, idempotency_key, appended_at) VALUES (?, ?, ?)",
+                (conversation_id, idempotency_key, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM append_history WHERE conversation_id = ? AND rowid NOT IN ("
+                "SELECT rowid FROM append_history WHERE conversation_id = ? "
+                "ORDER BY appended_at DESC LIMIT ?)",
+                (conversation_id, conversation_id, APPEND_HISTORY_SIZE),
+            )
+            return skip
+
+    def release_append(self, conversation_id: str, idempotency_key: Optional[str]) -> None:
+        """append 가 실패했을 때 claim_append 의 키 기록을 되돌려 재시도가 통과하도록 함"""
+        if not idempotency_key:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM append_history WHERE conversation_id = ? AND idempotency_key = ?",
+                (conversation_id, idempotency_key),
+            )
+
+    def record_append(
+        self,
+        conversation_id: str,
+        roles: List[Optional[str]],
+        updated_at: str,
+        hashes: Optional[List[str]] = None,
+        sort_key: Optional[float] = None,
+    ) -> None:
+        """append 시 메시지 수, 역할별 수, 수정 시각만 갱신 (roles/hashes 는 추가된 메시지의 것)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE conversations SET message_count = message_count + ?, "
+                "updated_at = ?, sort_key = ? WHERE id = ?",
+                (len(roles), updated_at, time.time() if sort_key is None else sort_key, conversation_id),
+            )
+            self._add_roles(conversation_id, roles)
+            if hashes:
+                self._set_tail(conversation_id, self._tail(conversation_id) + hashes)
+
+    def remove(self, conversation_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+            self._conn.execute("DELETE FROM conversation_tags WHERE conversation_id = ?", (conversation_id,))
+            self._conn.execute("DELETE FROM conversation_roles WHERE conversation_id = ?", (conversation_id,))
+            self._conn.execute("DELETE FROM append_history WHERE conversation_id = ?", (conversation_id,))
+            self._conn.execute("DELETE FROM append_tail WHERE conversation_id = ?", (conversation_id,))
+
+    def rebuild(self, entries: Iterable[tuple]) -> int:
+        """(대화 문서, 정렬 키) 목록으로 manifest 를 다시 구축"""
+        count = 0
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM conversations")
+            self._conn.execute("DELETE FROM conversation_tags")
+            self._conn.execute("DELETE FROM conversation_roles")
+            for data, sort_key in entries:
+                self._upsert(data, sort_key)
+                count += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                (MANIFEST_VERSION,),
+            )
+        return count
+
+    @staticmethod
+    def _filter_sql(filters: Optional[Dict[str, Any]]) -> Tuple[List[str], list]:
+        """필터를 conversations 에 대한 WHERE 조건 목록과 인자로 변환"""
+        clauses: List[str] = []
+        params: list = []
+        if not filters:
+            return clauses, params
+        tags = filters.get("tags") or []
+        for tag in [tags] if isinstance(tags, str) else tags:
+            clauses.append("id IN (SELECT conversation_id FROM conversation_tags WHERE tag = ?)")
+            params.append(tag)
+        if filters.get("title"):
+            clauses.append("instr(lower(title), lower(?)) > 0")
+            params.append(filters["title"])
+        if filters.get("role"):
+            clauses.append("id IN (SELECT conversation_id FROM conversation_roles WHERE role = ?)")
+            params.append(filters["role"])
+        for key, column, op in (
+            ("created_after", "created_at", ">="),
+            ("created_before", "created_at", "<"),
+            ("updated_after", "updated_at", ">="),
+            ("updated_before", "updated_at", "<"),
+        ):
+            if filters.get(key):
+                clauses.append(f"{column} {op} ?")
+                params.append(filters[key])
+        return clauses, params
+
+    def matching_ids(self, filters: Optional[Dict[str, Any]]) -> set:
+        """필터에 맞는 대화 id 집합"""
+        clauses, params = self._filter_sql(filters)
+        sql = "SELECT id FROM conversations"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            return {row[0] for row in self._conn.execute(sql, params)}
+
+    def facets(
+        self, filters: Optional[Dict[str, Any]] = None, conversation_ids: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        """필터(와 id 목록)에 맞는 대화의 태그/생성 월/메시지 역할별 개수를 한 번의 쿼리로 집계"""
+        clauses, params = self._filter_sql(filters)
+        if conversation_ids is not None:
+            clauses.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(conversation_ids)))
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        sql = (
+            f"WITH matched AS (SELECT id, created_at FROM conversations{where}) "
+            "SELECT 'total', NULL, COUNT(*) FROM matched "
+            "UNION ALL SELECT 'tags', tag, COUNT(*) FROM conversation_tags "
+            "WHERE conversation_id IN (SELECT id FROM matched) GROUP BY tag "
+            "UNION ALL SELECT 'months', substr(created_at, 1, 7), COUNT(*) FROM matched "
+            "WHERE created_at IS NOT NULL GROUP BY 2 "
+            "UNION ALL SELECT 'roles', role, COUNT(*) FROM conversation_roles "
+            "WHERE conversation_id IN (SELECT id FROM matched) GROUP BY role"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        facets: Dict[str, Any] = {"total": 0, "tags": {}, "months": {}, "roles": {}}
+        for facet, value, count in rows:
+            if facet == "total":
+                facets["total"] = count
+            else:
+                facets[facet][value] = count
+        # 태그는 많은 순으로 상위만, 월은 최근 순
+        facets["tags"] = dict(sorted(facets["tags"].items(), key=lambda item: (-item[1], item[0]))[:FACET_LIMIT])
+        facets["months"] = dict(sorted(facets["months"].items(), reverse=True))
+        return facets
+
+    def list(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """최근 수정 순으로 요약 목록과 다음 페이지 커서 반환
+
+        cursor 가 주어지면 (sort_key, id) 위치 이후를 인덱스 범위로 읽으므로
+        offset 과 달리 깊은 페이지도 비용이 같고, 페이지 사이에 수정이 있어도
+        항목이 중복되거나 빠지지 않는다. filters 는 FILTER_KEYS 조건이다.
+        """
+        sql = "SELECT id, metadata, created_at, updated_at, message_count, sort_key FROM conversations"
+        clauses, params = self._filter_sql(filters)
+        if cursor:
+            sort_key, last_id = decode_cursor(cursor)
+            clauses.append("(sort_key < ? OR (sort_key = ? AND id < ?))")
+            params += [sort_key, sort_key, last_id]
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY sort_key DESC, id DESC LIMIT ?"
+        params.append(limit)
+        if offset and not cursor:
+            sql += " OFFSET ?"
+            params.append(offset)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        next_cursor = encode_cursor(rows[-1][5], rows[-1][0]) if rows and len(rows) == limit else None
+        return [
+            {
+                "id": row[0],
+                "metadata": json.loads(row[1]),
+                "created_at": row[2],
+                "updated_at": row[3],
+                "message_count": row[4],
+            }
+            for row in rows
+        ], next_cursor
+
+    def get_many(self, conversation_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """id 목록의 요약 정보 (없는 id 는 빠짐)"""
+        if not conversation_ids:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, metadata, created_at, updated_at, message_count FROM conversations "
+                f"WHERE id IN ({','.join('?' * len(conversation_ids))})",
+                list(conversation_ids),
+            ).fetchall()
+        return {
+            row[0]: {
+                "id": row[0],
+                "metadata": json.loads(row[1]),
+                "created_at": row[2],
+                "updated_at": row[3],
+                "message_count": row[4],
+            }
+            for row in rows
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,381 @@
+"""로컬 대화 저장소용 디스크 역색인 (BM25 랭킹)"""
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from mcp_server.compression import pack_text, unpack_text
+
+# BM25 파라미터
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+INDEX_VERSION = "3"
+
+# 검색 결과 스니펫 길이와 스니펫당 돌려줄 최대 일치 위치 수
+SNIPPET_CHARS = 160
+MAX_MATCH_OFFSETS = 20
+
+# 메시지 단위 색인 항목: (role, 본문, blob 해시) - blob 에 있는 본문은 색인 DB 에 다시 저장하지 않고,
+# 스니펫용으로 두는 본문도 큰 것은 저장소와 같은 기준으로 압축한다
+MessageEntry = Tuple[Optional[str], str, Optional[str]]
+
+# 한글 음절, 영문/숫자, 그 밖의 유니코드 문자를 각각 별도의 토큰으로 분리
+_TOKEN_RE = re.compile(r"[가-힣]+|[a-z0-9]+|[^\W\d_a-z가-힣]+")
+_HANGUL_RE = re.compile(r"[가-힣]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """텍스트를 색인 토큰으로 분리
+
+    영문/숫자는 단어 단위, 한글은 형태소 분석기 없이도 조사가 붙은 어절을
+    찾을 수 있도록 음절 bigram 단위로 자른다.
+    """
+    tokens: List[str] = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if _HANGUL_RE.fullmatch(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def metadata_texts(value: Any) -> List[str]:
+    """메타데이터에서 색인할 문자열 값만 추출"""
+    if isinstance(value, dict):
+        return [text for item in value.values() for text in metadata_texts(item)]
+    if isinstance(value, list):
+        return [text for item in value for text in metadata_texts(item)]
+    if value is None or isinstance(value, bool):
+        return []
+    return [str(value)]
+
+
+def match_offsets(text: str, terms: Iterable[str]) -> List[Tuple[int, int]]:
+    """text 안에서 색인 토큰과 일치하는 구간 [start, end) 목록 (겹치는 구간은 합침)"""
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # 소문자 변환으로 길이가 바뀌는 문자가 있으면 위치가 어긋나므로 원문 그대로 비교
+        lowered = text
+    spans = []
+    for term in set(terms):
+        ascii_word = term.isascii()
+        start = lowered.find(term)
+        while start != -1:
+            end = start + len(term)
+            # 영문/숫자 토큰은 단어 경계에서만 (index 가 reindex 안에서 잡히지 않도록)
+            if not ascii_word or (
+                (start == 0 or not lowered[start - 1].isalnum())
+                and (end == len(lowered) or not lowered[end].isalnum())
+            ):
+                spans.append((start, end))
+            start = lowered.find(term, start + 1)
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def build_snippet(text: str, terms: Iterable[str], width: int = SNIPPET_CHARS) -> Dict[str, Any]:
+    """첫 일치 위치를 중심으로 한 스니펫과 메시지 안에서의 일치 위치
+
+    offsets 는 메시지 본문 기준, snippet_offset 은 스니펫이 시작하는 위치다.
+    """
+    offsets = match_offsets(text, terms)
+    if offsets:
+        center = offsets[0][0]
+        start = max(0, min(center - width // 3, len(text) - width))
+    else:
+        start = 0
+    snippet = text[start:start + width]
+    return {
+        "snippet": snippet,
+        "snippet_offset": start,
+        "offsets": [list(span) for span in offsets[:MAX_MATCH_OFFSETS]],
+    }
+
+
+class SearchIndex:
+    """토큰 -> 포스팅 리스트 형태의 SQLite 기반 역색인
+
+    검색 시에는 질의 토큰의 포스팅 리스트만 읽고, 문서 수와 전체 길이는
+    meta 테이블에 누적해 두어 BM25 계산에 전체 스캔이 필요 없다. 메시지 단위
+    포스팅과 본문(큰 본문은 압축)도 함께 두어 어느 메시지가 일치했는지와 스니펫을
+    대화 파일을 열지 않고 돌려준다.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS docs (
+                    doc_id TEXT PRIMARY KEY,
+                    length INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, doc_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+                CREATE TABLE IF NOT EXISTS message_postings (
+                    term TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    message_index INTEGER NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, doc_id, message_index)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS message_postings_doc ON message_postings (doc_id);
+                CREATE TABLE IF NOT EXISTS messages (
+                    doc_id TEXT NOT NULL,
+                    message_index INTEGER NOT NULL,
+                    role TEXT,
+                    content,
+                    blob TEXT,
+                    PRIMARY KEY (doc_id, message_index)
+                ) WITHOUT ROWID;
+                """
+            )
+
+    @property
+    def is_initialized(self) -> bool:
+        """색인이 한 번이라도 구축되었는지 여부"""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row is not None and row[0] == INDEX_VERSION
+
+    def _get_stat(self, key: str) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def _add_stat(self, key: str, delta: int) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + ?",
+            (key, str(delta), delta),
+        )
+
+    def _remove(self, doc_id: str) -> None:
+        row = self._conn.execute("SELECT length FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return
+        self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM message_postings WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM messages WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+        self._add_stat("doc_count", -1)
+        self._add_stat("total_length", -row[0])
+
+    def _add(self, doc_id: str, texts: Iterable[str], messages: Sequence[MessageEntry] = ()) -> None:
+        counts: Counter = Counter()
+        for text in texts:
+            counts.update(tokenize(text))
+
+        if messages:
+            # 새 메시지는 이 문서에 이미 색인된 메시지 다음 번호부터
+            start = self._conn.execute(
+                "SELECT COALESCE(MAX(message_index) + 1, 0) FROM messages WHERE doc_id = ?", (doc_id,)
+            ).fetchone()[0]
+            message_rows = []
+            posting_rows = []
+            for index, (role, content, blob) in enumerate(messages, start):
+                message_counts = Counter(tokenize(content))
+                counts.update(message_counts)
+                message_rows.append((doc_id, index, role, None if blob else pack_text(content), blob))
+                posting_rows.extend((term, doc_id, index, tf) for term, tf in message_counts.items())
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages (doc_id, message_index, role, content, blob) "
+                "VALUES (?, ?, ?, ?, ?)",
+                message_rows,
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO message_postings (term, doc_id, message_index, tf) VALUES (?, ?, ?, ?)",
+                posting_rows,
+            )
+        length = sum(counts.values())
+
+        row = self._conn.execute("SELECT length FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            self._conn.execute("INSERT INTO docs (doc_id, length) VALUES (?, ?)", (doc_id, length))
+            self._add_stat("doc_count", 1)
+        else:
+            self._conn.execute("UPDATE docs SET length = length + ? WHERE doc_id = ?", (length, doc_id))
+        self._add_stat("total_length", length)
+
+        self._conn.executemany(
+            "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?) "
+            "ON CONFLICT(term, doc_id) DO UPDATE SET tf = tf + excluded.tf",
+            [(term, doc_id, tf) for term, tf in counts.items()],
+        )
+
+    def index_document(self, doc_id: str, texts: Iterable[str], messages: Sequence[MessageEntry] = ()) -> None:
+        """문서를 (재)색인 - 기존 포스팅은 모두 교체
+
+        texts 는 메타데이터처럼 문서 단위로만 색인할 텍스트, messages 는 메시지 순서대로의
+        (role, 본문, blob 해시) 항목이다.
+        """
+        with self._lock, self._conn:
+            self._remove(doc_id)
+            self._add(doc_id, texts, messages)
+
+    def add_to_document(self, doc_id: str, messages: Sequence[MessageEntry]) -> None:
+        """기존 문서에 메시지를 추가 색인 (append 용 증분 갱신)"""
+        with self._lock, self._conn:
+            self._add(doc_id, (), messages)
+
+    def remove_document(self, doc_id: str) -> None:
+        """문서를 색인에서 제거"""
+        with self._lock, self._conn:
+            self._remove(doc_id)
+
+    def rebuild(self, documents: Iterable[Tuple[str, Iterable[str], Sequence[MessageEntry]]]) -> int:
+        """(doc_id, 문서 텍스트, 메시지 항목)으로 전체 색인을 처음부터 다시 구축"""
+        count = 0
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM postings")
+                self._conn.execute("DELETE FROM message_postings")
+                self._conn.execute("DELETE FROM messages")
+                self._conn.execute("DELETE FROM docs")
+                self._conn.execute("DELETE FROM meta")
+                for doc_id, texts, messages in documents:
+                    self._add(doc_id, texts, messages)
+                    count += 1
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('version', ?)", (INDEX_VERSION,)
+                )
+            # 이전 버전의 평문 본문이 차지하던 공간을 돌려받음 (트랜잭션 밖에서만 가능)
+            self._conn.execute("VACUUM")
+        return count
+
+    def search(
+        self, query: str, limit: Optional[int] = 20, allowed: Optional[Set[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """BM25 점수 순으로 (doc_id, score) 목록 반환
+
+        allowed 가 있으면 그 문서만 순위에 넣고, limit 이 None 이면 일치한 문서를 모두 반환한다.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            doc_count = self._get_stat("doc_count")
+            if doc_count <= 0:
+                return []
+            avg_length = max(self._get_stat("total_length") / doc_count, 1.0)
+
+            scores: Dict[str, float] = {}
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p "
+                    "JOIN docs d ON d.doc_id = p.doc_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not rows:
+                    continue
+                df = len(rows)
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                for doc_id, tf, length in rows:
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked if limit is None else ranked[:limit]
+
+    def message_hits(
+        self, doc_ids: Sequence[str], query: str, per_doc: int = 3, role: Optional[str] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """문서별로 질의와 가장 잘 맞는 메시지 per_doc 개 (메시지 포스팅만 읽음)
+
+        점수는 메시지 안의 질의 토큰별 idf * 포화된 tf 의 합이다. 각 항목은
+        message_index, role, score 와 본문(content, blob 에 있으면 None) 및 blob 해시를 담는다.
+        role 이 있으면 그 역할의 메시지만 본다.
+        """
+        terms = sorted(set(tokenize(query)))
+        if not terms or not doc_ids:
+            return {}
+        term_marks = ",".join("?" * len(terms))
+        doc_marks = ",".join("?" * len(doc_ids))
+
+        with self._lock:
+            doc_count = max(self._get_stat("doc_count"), 1)
+            idf = {
+                term: math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                for term, df in self._conn.execute(
+                    f"SELECT term, COUNT(*) FROM postings WHERE term IN ({term_marks}) GROUP BY term", terms
+                )
+            }
+            sql = "SELECT p.term, p.doc_id, p.message_index, p.tf FROM message_postings p "
+            params = terms + list(doc_ids)
+            if role is not None:
+                sql += "JOIN messages m ON m.doc_id = p.doc_id AND m.message_index = p.message_index "
+            sql += f"WHERE p.term IN ({term_marks}) AND p.doc_id IN ({doc_marks})"
+            if role is not None:
+                sql += " AND m.role = ?"
+                params.append(role)
+            scores: Dict[Tuple[str, int], float] = {}
+            for term, doc_id, message_index, tf in self._conn.execute(sql, params):
+                key = (doc_id, message_index)
+                scores[key] = scores.get(key, 0.0) + idf.get(term, 0.0) * tf * (BM25_K1 + 1) / (tf + BM25_K1)
+
+            best: Dict[str, List[Tuple[float, int]]] = {}
+            for (doc_id, message_index), score in scores.items():
+                best.setdefault(doc_id, []).append((score, message_index))
+            keys = []
+            for doc_id, entries in best.items():
+                entries.sort(key=lambda item: (-item[0], item[1]))
+                del entries[per_doc:]
+                keys.extend((doc_id, message_index) for _, message_index in entries)
+            rows = self.get_messages(keys)
+
+        return {
+            doc_id: [
+                dict(rows[(doc_id, message_index)], score=round(score, 4))
+                for score, message_index in entries
+                if (doc_id, message_index) in rows
+            ]
+            for doc_id, entries in best.items()
+        }
+
+    def get_messages(self, keys: Sequence[Tuple[str, int]]) -> Dict[Tuple[str, int], Dict[str, Any]]:
+        """(doc_id, message_index) 목록의 색인된 메시지 (role, content, blob)"""
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, message_index, role, content, blob FROM messages "
+                f"WHERE (doc_id, message_index) IN (VALUES {','.join(['(?, ?)'] * len(keys))})",
+                [value for key in keys for value in key],
+            ).fetchall()
+        return {
+            (doc_id, message_index): {
+                "message_index": message_index,
+                "role": role,
+                "content": None if content is None else unpack_text(content),
+                "blob": blob,
+            }
+            for doc_id, message_index, role, content, blob in rows
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,12 +1,18 @@
 #!/usr/bin/env python3
 import asyncio
+import functools
+import gzip
 import json
 import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from uuid import uuid4
 
+import httpx
 from mcp.server import Server
 from mcp.types import (
     Tool,
@@ -16,120 +22,546 @@ from mcp.types import (
 )
 from mcp.server.stdio import stdio_server
 
+from mcp_server.cache import ConversationCache
+from mcp_server.blobs import BlobStore
+from mcp_server.compression import compress_messages
+from mcp_server.manifest import FILTER_KEYS, ConversationManifest, message_hash
+from mcp_server.search_index import SearchIndex, build_snippet, metadata_texts, tokenize
+from mcp_server.sqlite_storage import SQLiteConversationStorage, SQLiteSearchIndex, migrate_json_directory
+from mcp_server.storage import ConversationStorage, StorageBackend
+from mcp_server.sync import SyncEngine, SyncState
+from mcp_server.vector_index import open_vector_index
+
 # 대화 저장 디렉토리
 STORAGE_DIR = Path.home() / ".pensieve-mcp" / "conversations"
 STORAGE_DIR.mkdir(parents=True, exist_ok=True)
 
+# 큰 메시지 본문을 해시 기준으로 한 번만 저장하는 blob 저장소
+BLOB_DIR = STORAGE_DIR.parent / "blobs"
+blob_store = BlobStore(BLOB_DIR)
+
+# 저장소 백엔드: json(기본, 기본 문서 + append 로그 파일) | sqlite(WAL 모드 SQLite + FTS5)
+STORAGE_BACKEND = os.getenv("PENSIEVE_STORAGE", "json").lower()
+INDEX_PATH = STORAGE_DIR.parent / "search_index.db"
+SQLITE_STORAGE_PATH = STORAGE_DIR.parent / "conversations.db"
+storage: StorageBackend
+if STORAGE_BACKEND == "sqlite":
+    storage = SQLiteConversationStorage(SQLITE_STORAGE_PATH, resolve=blob_store.resolve_message)
+    # 처음 열 때 기존 JSON 디렉토리의 대화를 한 번 옮김 (원본 파일은 그대로 둠)
+    _migration = migrate_json_directory(STORAGE_DIR, storage)
+    if _migration["migrated"]:
+        print(f"JSON 대화 {_migration['migrated']}개를 {SQLITE_STORAGE_PATH} 로 옮겼습니다", file=sys.stderr)
+    # 검색은 저장소의 FTS5 테이블을 그대로 사용
+    search_index = SQLiteSearchIndex(storage)
+elif STORAGE_BACKEND == "json":
+    storage = ConversationStorage(STORAGE_DIR)
+    # 검색용 역색인 (대화 디렉토리 옆에 저장)
+    search_index = SearchIndex(INDEX_PATH)
+else:
+    raise ValueError(f"알 수 없는 PENSIEVE_STORAGE 값: {STORAGE_BACKEND}")
+
+# 의미 검색용 벡터 색인 (PENSIEVE_VECTOR_SEARCH=on 이고 numpy 가 있을 때만, 아니면 None)
+VECTOR_DIR = STORAGE_DIR.parent / "vectors"
+vector_index = open_vector_index(VECTOR_DIR)
+# hybrid 검색에서 벡터 점수의 비중 (나머지는 BM25)
+HYBRID_ALPHA = float(os.getenv("PENSIEVE_HYBRID_ALPHA", "0.5"))
+
+# 목록 조회용 요약 정보 (메시지 본문 없이 id/메타데이터/메시지 수만 보관)
+MANIFEST_PATH = STORAGE_DIR.parent / "manifest.db"
+manifest = ConversationManifest(MANIFEST_PATH)
+
+# 클라우드 동기화용 로컬 변경 로그와 대화 연결 정보
+SYNC_STATE_PATH = STORAGE_DIR.parent / "sync.db"
+sync_state = SyncState(SYNC_STATE_PATH)
+_sync_lock = threading.Lock()
+
+# 내보내기 파일 기본 위치
+EXPORT_DIR = STORAGE_DIR.parent / "exports"
+
 # 서버 인스턴스
 app = Server("pensieve-mcp")
 
-# 메모리 내 대화 캐시 (성능 향상)
-conversation_cache: Dict[str, Dict[str, Any]] = {}
+# 파일/SQLite I/O 를 이벤트 루프 밖에서 실행하는 제한된 스레드 풀
+IO_WORKERS = int(os.getenv("PENSIEVE_IO_WORKERS", "4"))
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="pensieve-io")
+
+# 색인/manifest 최초 구축이 여러 스레드에서 동시에 일어나지 않도록 보호
+_bootstrap_lock = threading.Lock()
+
+# 메모리 내 대화 캐시 (항목 수/바이트 크기 제한 LRU, 파일 mtime 으로 무효화)
+conversation_cache = ConversationCache(
+    max_entries=int(os.getenv("PENSIEVE_CACHE_MAX_ENTRIES", "256")),
+    max_bytes=int(os.getenv("PENSIEVE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
+
+# 대화별 쓰기 잠금 - 저장소 기록과 캐시 갱신이 여러 I/O 스레드에서 같은 순서로 일어나도록
+_write_locks: Dict[str, threading.Lock] = {}
+_write_locks_guard = threading.Lock()
+
+
+def _write_lock(conversation_id: str) -> threading.Lock:
+    with _write_locks_guard:
+        lock = _write_locks.get(conversation_id)
+        if lock is None:
+            lock = _write_locks[conversation_id] = threading.Lock()
+        return lock
+
+
+def _message_texts(messages: List[Dict[str, Any]]) -> List[str]:
+    return [blob_store.resolve_message(message).get("content", "") for message in messages]
+
+
+def _index_entries(messages: List[Dict[str, Any]]) -> List[tuple]:
+    """메시지 단위 색인 항목 (role, 본문, blob 해시) - blob 본문은 색인에 다시 저장하지 않음"""
+    entries = []
+    for message in messages:
+        ref = message.get("content_ref")
+        content = blob_store.resolve_message(message).get("content", "")
+        entries.append((message.get("role"), content, ref["hash"] if ref else None))
+    return entries
+
+
+def ensure_search_index() -> None:
+    """색인이 없으면 기존 대화 파일로부터 한 번 구축"""
+    if search_index.is_initialized:
+        return
+    with _bootstrap_lock:
+        if not search_index.is_initialized:
+            search_index.rebuild(
+                (data["id"], metadata_texts(data.get("metadata", {})), _index_entries(data.get("messages", [])))
+                for data, _ in storage.iter_all()
+            )
+
+
+def ensure_vector_index() -> None:
+    """벡터 색인이 없거나 임베딩 설정이 바뀌었으면 기존 대화 파일로부터 한 번 구축"""
+    if vector_index is None or vector_index.is_initialized:
+        return
+    with _bootstrap_lock:
+        if not vector_index.is_initialized:
+            vector_index.rebuild(
+                (
+                    data["id"],
+                    _message_texts(data.get("messages", [])),
+                    " ".join(metadata_texts(data.get("metadata", {}))),
+                )
+                for data, _ in storage.iter_all()
+            )
+
+
+def ensure_manifest() -> None:
+    """manifest 가 없으면 기존 대화 파일로부터 한 번 구축"""
+    if manifest.is_initialized:
+        return
+    with _bootstrap_lock:
+        if not manifest.is_initialized:
+            manifest.rebuild(storage.iter_all())
+
+
+async def run_io(func, *args, **kwargs):
+    """블로킹 저장소 함수를 I/O 스레드 풀에서 실행"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(func, *args, **kwargs))
+
+
+async def to_json_text(value: Any) -> str:
+    """큰 응답의 JSON 직렬화도 이벤트 루프를 막지 않도록 스레드 풀에서 수행"""
+    return await run_io(json.dumps, value, ensure_ascii=False, indent=2)
+
+
+def write_conversation(conversation_data: Dict[str, Any]) -> Dict[str, Any]:
+    """대화 문서 전체를 기록하고 캐시/색인/manifest/변경 로그를 갱신
+
+    아주 큰 본문은 blob 참조로, 그보다 작은 큰 메시지는 압축해 기록하며 캐시에도
+    그 형태로 보관한다.
+    """
+    ensure_search_index()
+    ensure_vector_index()
+    ensure_manifest()
+    conversation_id = conversation_data["id"]
+    
+    # 파일로 저장하고 캐시에도 저장 - blob 참조 교체와 이전 blob 정리는 기록이 끝난 뒤에
+    with _write_lock(conversation_id):
+        messages, hashes = blob_store.store_messages(conversation_data.get("messages", []))
+        try:
+            stored = dict(conversation_data, messages=compress_messages(messages))
+            storage.write(stored)
+        except Exception:
+            blob_store.abort(hashes)
+            raise
+        blob_store.commit(conversation_id, hashes, replace=True)
+        conversation_cache.put(conversation_id, stored, storage.mtime(conversation_id))
+        
+        # 검색 색인 및 manifest 갱신 - 색인은 메시지 위치를 색인 시점에 매기므로
+        # 같은 대화의 다른 쓰기와 순서가 섞이지 않게 잠금 안에서 한다
+        search_index.index_document(
+            conversation_id, metadata_texts(conversation_data.get("metadata", {})), _index_entries(messages)
+        )
+        manifest.upsert(conversation_data)
+        if vector_index is not None:
+            vector_index.index_document(
+                conversation_id,
+                _message_texts(conversation_data.get("messages", [])),
+                " ".join(metadata_texts(conversation_data.get("metadata", {}))),
+            )
+    
+    sync_state.record_change(conversation_id, "save")
+    
+    return conversation_data
 
 
 def save_conversation(conversation_id: str, messages: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """대화를 파일 시스템에 저장"""
-    conversation_data = {
+    return write_conversation({
         "id": conversation_id,
         "messages": messages,
         "metadata": metadata or {},
         "created_at": datetime.now().isoformat(),
         "updated_at": datetime.now().isoformat()
-    }
+    })
+
+
+def append_to_conversation(
+    conversation_id: str,
+    new_messages: List[Dict[str, Any]],
+    idempotency_key: Optional[str] = None,
+    dedup: bool = False
+) -> Optional[Dict[str, Any]]:
+    """기존 대화에 메시지를 추가
+
+    기존 문서를 다시 쓰지 않고 새 메시지만 로그에 기록하며, 색인과 manifest 도
+    추가된 메시지만 증분 반영한다. 이미 받은 Idempotency-Key 로 다시 오면 아무것도
+    쓰지 않고 duplicate 로 표시해 돌려준다. dedup 이면 대화 끝에 이미 있는 앞쪽
+    메시지를 건너뛰고 나머지만 추가한다 (건너뛴 수는 skipped).
+    """
+    ensure_search_index()
+    ensure_vector_index()
+    ensure_manifest()
+    if not storage.exists(conversation_id):
+        return None
     
-    # 파일로 저장
-    file_path = STORAGE_DIR / f"{conversation_id}.json"
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(conversation_data, f, ensure_ascii=False, indent=2)
+    hashes = [message_hash(message) for message in new_messages]
+    # 판별부터 manifest 갱신까지 한 잠금 안에서 해야 동시에 온 같은 재시도 중 하나만 추가되고
+    # 로그와 캐시의 append 순서도 같다
+    with _write_lock(conversation_id):
+        skip = manifest.claim_append(conversation_id, hashes, idempotency_key, dedup)
+        if skip is None:
+            return {"id": conversation_id, "added": 0, "skipped": len(new_messages), "duplicate": True}
+        new_messages = new_messages[skip:]
+        
+        updated_at = datetime.now().isoformat()
+        referenced, blob_hashes = blob_store.store_messages(new_messages)
+        try:
+            stored_messages = compress_messages(referenced)
+            # 다른 프로세스가 그 사이 수정했다면 캐시 항목을 먼저 버린다
+            conversation_cache.get(conversation_id, storage.mtime(conversation_id))
+            storage.append(conversation_id, stored_messages, updated_at)
+        except Exception:
+            blob_store.abort(blob_hashes)
+            manifest.release_append(conversation_id, idempotency_key)
+            raise
+        blob_store.commit(conversation_id, blob_hashes)
+        
+        # 캐시된 문서가 있으면 같은 내용으로 갱신
+        conversation_cache.append_messages(
+            conversation_id, stored_messages, updated_at, storage.mtime(conversation_id)
+        )
+        manifest.record_append(
+            conversation_id, [message.get("role") for message in new_messages], updated_at, hashes[skip:]
+        )
+        # 색인의 메시지 위치가 로그의 append 순서와 같도록 잠금 안에서 반영
+        search_index.add_to_document(conversation_id, _index_entries(referenced))
+        if vector_index is not None:
+            vector_index.add_messages(conversation_id, _message_texts(new_messages))
     
-    # 캐시에도 저장
-    conversation_cache[conversation_id] = conversation_data
+    sync_state.record_change(conversation_id, "append")
     
-    return conversation_data
+    return {
+        "id": conversation_id,
+        "updated_at": updated_at,
+        "added": len(new_messages),
+        "skipped": skip,
+        "duplicate": False,
+    }
+
+
+def delete_conversation(conversation_id: str) -> bool:
+    """대화를 삭제하고 캐시/색인/manifest 에서도 제거"""
+    ensure_search_index()
+    ensure_vector_index()
+    ensure_manifest()
+    with _write_lock(conversation_id):
+        deleted = storage.delete(conversation_id)
+        conversation_cache.invalidate(conversation_id)
+        blob_store.release(conversation_id)
+        search_index.remove_document(conversation_id)
+        manifest.remove(conversation_id)
+        if vector_index is not None:
+            vector_index.remove_document(conversation_id)
+    if deleted:
+        sync_state.record_change(conversation_id, "delete")
+    return deleted
+
+
+def sync_with_cloud(api_url: str, token: str) -> Dict[str, Any]:
+    """클라우드 API 와 마지막 동기화 이후의 변경만 주고받음 (동시에 하나만 실행)"""
+    if not _sync_lock.acquire(blocking=False):
+        raise RuntimeError("이미 동기화가 진행 중입니다")
+    try:
+        with httpx.Client(
+            base_url=api_url,
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=httpx.Timeout(30, connect=10),
+        ) as client:
+            engine = SyncEngine(
+                sync_state,
+                client,
+                load=lambda conversation_id: blob_store.resolve_conversation(load_conversation(conversation_id)),
+                write=write_conversation,
+                append=append_to_conversation,
+                delete=delete_conversation,
+            )
+            return engine.run()
+    finally:
+        _sync_lock.release()
 
 
 def load_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
     """대화를 파일 시스템에서 불러오기"""
-    # 캐시 확인
-    if conversation_id in conversation_cache:
-        return conversation_cache[conversation_id]
+    # 캐시 확인 (파일이 바뀌었으면 무효화)
+    mtime = storage.mtime(conversation_id)
+    cached = conversation_cache.get(conversation_id, mtime)
+    if cached is not None:
+        return cached
+    
+    # 파일에서 로드 (기본 문서 + append 로그)
+    conversation_data = storage.read(conversation_id)
+    if conversation_data is not None:
+        conversation_cache.put(conversation_id, conversation_data, mtime)
     
-    # 파일에서 로드
-    file_path = STORAGE_DIR / f"{conversation_id}.json"
-    if file_path.exists():
-        with open(file_path, 'r', encoding='utf-8') as f:
-            conversation_data = json.load(f)
-            conversation_cache[conversation_id] = conversation_data
-            return conversation_data
+    return conversation_data
+
+
+def slice_messages(
+    conversation: Dict[str, Any],
+    tail: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """대화의 메시지 중 요청한 구간만 담은 사본 반환
+
+    tail(마지막 N개), after(해당 인덱스 이후), limit 을 지원하며 message_offset,
+    message_count, next_after 로 전체 중 어느 구간인지 알려준다.
+    """
+    messages = conversation.get("messages", [])
+    total = len(messages)
+    if tail is not None:
+        start = max(total - tail, 0)
+        end = total
+    else:
+        start = min(after + 1 if after is not None else 0, total)
+        end = total if limit is None else min(start + limit, total)
     
-    return None
+    window = dict(conversation)
+    window["messages"] = messages[start:end]
+    window["message_count"] = total
+    window["message_offset"] = start
+    window["next_after"] = end - 1 if end < total else None
+    return window
+
+
+def list_conversations(
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    facets: bool = False
+) -> Dict[str, Any]:
+    """저장된 대화 목록과 다음 페이지 커서 반환 (manifest 에서 조회, 대화 파일은 열지 않음)
+
+    filters 로 태그/제목/역할/날짜 범위를 거르고, facets 이면 필터에 맞는 전체 대화의
+    태그/월/역할별 개수를 함께 돌려준다.
+    """
+    ensure_manifest()
+    conversations, next_cursor = manifest.list(limit, offset, cursor, filters)
+    result = {"conversations": conversations, "next_cursor": next_cursor}
+    if facets:
+        result["facets"] = manifest.facets(filters)
+    return result
+
+
+def _normalize_scores(scores: Dict[str, float]) -> Dict[str, float]:
+    """점수를 0~1 로 맞춤 (BM25 와 코사인 유사도의 척도가 달라서)"""
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    if high - low < 1e-9:
+        return {key: 1.0 for key in scores}
+    return {key: (value - low) / (high - low) for key, value in scores.items()}
 
 
-def list_conversations(limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
-    """저장된 모든 대화 목록 반환"""
-    conversations = []
+def search_conversations(
+    query: str,
+    limit: int = 20,
+    mode: str = "keyword",
+    matches_per_conversation: int = 3,
+    filters: Optional[Dict[str, Any]] = None,
+    facets: bool = False
+) -> Any:
+    """대화 내용 검색
+
+    mode: keyword(역색인 + BM25), semantic(벡터 색인), hybrid(두 점수를 정규화해
+    PENSIEVE_HYBRID_ALPHA 비중으로 합산). 대화마다 가장 잘 맞는 메시지
+    matches_per_conversation 개를 메시지 위치, 스니펫, 일치 위치와 함께 돌려준다.
+    filters 에 맞는 대화만 순위에 넣으며 (role 이 있으면 일치 메시지도 그 역할만),
+    facets 이면 {"results", "facets"} 형태로 일치한 전체 대화의 패싯 개수를 함께 돌려준다.
+    """
+    if mode not in ("keyword", "semantic", "hybrid"):
+        raise ValueError(f"알 수 없는 검색 방식: {mode}")
+    if mode != "keyword" and vector_index is None:
+        raise RuntimeError(
+            "semantic/hybrid 검색에는 PENSIEVE_VECTOR_SEARCH=on 과 numpy 가 필요합니다 (pip install 'pensieve-mcp[vector]')"
+        )
     
-    # 모든 JSON 파일 읽기
-    json_files = sorted(STORAGE_DIR.glob("*.json"), key=lambda x: x.stat().st_mtime, reverse=True)
+    ensure_search_index()
+    ensure_manifest()
+    # 필터가 있으면 manifest 보조 인덱스로 후보 대화를 먼저 정함
+    allowed = manifest.matching_ids(filters) if filters else None
+    # 융합할 때는 양쪽에서 후보를 넉넉히 가져오고, 패싯은 일치한 문서 전체로 집계
+    candidates = limit * 3 if mode == "hybrid" else limit
+    keyword_scores: Dict[str, float] = {}
+    vector_hits: Dict[str, tuple] = {}
+    if mode != "semantic":
+        keyword_ranked = search_index.search(query, None if facets else candidates, allowed)
+        keyword_scores = dict(keyword_ranked[:candidates])
+    if mode != "keyword":
+        ensure_vector_index()
+        vector_hits = {
+            doc_id: (score, message_index)
+            for doc_id, score, message_index in vector_index.search(query, candidates, allowed)
+        }
     
-    for file_path in json_files[offset:offset + limit]:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                # 메타데이터만 포함한 간략한 정보
-                conversations.append({
-                    "id": data["id"],
-                    "metadata": data.get("metadata", {}),
-                    "created_at": data.get("created_at"),
-                    "updated_at": data.get("updated_at"),
-                    "message_count": len(data.get("messages", []))
-                })
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
+    if mode == "keyword":
+        ranked = list(keyword_scores.items())
+    elif mode == "semantic":
+        ranked = [(doc_id, hit[0]) for doc_id, hit in vector_hits.items()]
+    else:
+        keyword_norm = _normalize_scores(keyword_scores)
+        vector_norm = _normalize_scores({doc_id: hit[0] for doc_id, hit in vector_hits.items()})
+        fused = {
+            doc_id: HYBRID_ALPHA * vector_norm.get(doc_id, 0.0) + (1 - HYBRID_ALPHA) * keyword_norm.get(doc_id, 0.0)
+            for doc_id in set(keyword_norm) | set(vector_norm)
+        }
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
     
-    return conversations
+    # 대화 파일은 열지 않고 manifest 요약과 색인의 메시지 단위 일치만으로 결과를 만듦
+    role = (filters or {}).get("role")
+    conversation_ids = [conversation_id for conversation_id, _ in ranked]
+    summaries = manifest.get_many(conversation_ids)
+    hits = search_index.message_hits(conversation_ids, query, matches_per_conversation, role)
+    # 벡터 색인이 가리킨 메시지는 토큰이 겹치지 않아도 일치 목록에 넣음
+    vector_keys = [
+        (conversation_id, vector_hits[conversation_id][1])
+        for conversation_id in conversation_ids
+        if conversation_id in vector_hits and vector_hits[conversation_id][1] >= 0
+        and all(hit["message_index"] != vector_hits[conversation_id][1] for hit in hits.get(conversation_id, []))
+    ]
+    for (conversation_id, message_index), row in search_index.get_messages(vector_keys).items():
+        if role is not None and row["role"] != role:
+            continue
+        row["score"] = round(vector_hits[conversation_id][0], 4)
+        hits.setdefault(conversation_id, []).insert(0, row)
+    
+    query_terms = tokenize(query)
+    results = []
+    for conversation_id, score in ranked:
+        summary = summaries.get(conversation_id)
+        if summary is None:
+            continue
+        
+        result = dict(summary, score=round(score, 4))
+        if mode == "hybrid":
+            result["keyword_score"] = round(keyword_scores.get(conversation_id, 0.0), 4)
+            result["vector_score"] = round(vector_hits.get(conversation_id, (0.0,))[0], 4)
+        
+        matches = []
+        for hit in hits.get(conversation_id, [])[:matches_per_conversation]:
+            content = hit["content"] if hit["blob"] is None else blob_store.get(hit["blob"])
+            matches.append({
+                "message_index": hit["message_index"],
+                "role": hit["role"],
+                "score": hit["score"],
+                **build_snippet(content, query_terms),
+            })
+        result["matches"] = matches
+        results.append(result)
+    
+    if facets:
+        matched = {conversation_id for conversation_id, _ in keyword_ranked} if mode != "semantic" else set()
+        matched.update(vector_hits)
+        return {"results": results, "facets": manifest.facets(conversation_ids=matched)}
+    return results
 
 
-def search_conversations(query: str, limit: int = 20) -> List[Dict[str, Any]]:
-    """대화 내용 검색"""
-    results = []
-    query_lower = query.lower()
+def export_conversations(path: Optional[Path] = None, compress: bool = False) -> Dict[str, Any]:
+    """모든 대화를 NDJSON 파일로 내보내기
+
+    대화 파일을 하나씩 읽어 바로 기록하므로 저장소 크기와 관계없이 메모리
+    사용량이 일정하다. 완성된 파일만 보이도록 임시 파일에 쓴 뒤 이름을 바꾼다.
+    """
+    if path is None:
+        suffix = ".ndjson.gz" if compress else ".ndjson"
+        path = EXPORT_DIR / f"conversations-{datetime.now().strftime('%Y%m%d-%H%M%S')}{suffix}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
     
-    for file_path in STORAGE_DIR.glob("*.json"):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-                # 메시지 내용에서 검색
-                for message in data.get("messages", []):
-                    content = message.get("content", "").lower()
-                    if query_lower in content:
-                        results.append({
-                            "id": data["id"],
-                            "metadata": data.get("metadata", {}),
-                            "created_at": data.get("created_at"),
-                            "matched_message": message,
-                            "message_count": len(data.get("messages", []))
-                        })
-                        break
-                
-                # 메타데이터에서도 검색
-                metadata_str = json.dumps(data.get("metadata", {})).lower()
-                if query_lower in metadata_str and data["id"] not in [r["id"] for r in results]:
-                    results.append({
-                        "id": data["id"],
-                        "metadata": data.get("metadata", {}),
-                        "created_at": data.get("created_at"),
-                        "message_count": len(data.get("messages", []))
-                    })
-                    
-                if len(results) >= limit:
-                    break
-                    
-        except Exception as e:
-            print(f"Error searching {file_path}: {e}")
+    count = 0
+    opener = gzip.open if compress else open
+    try:
+        with opener(tmp_path, "wt", encoding="utf-8") as f:
+            for data, _ in storage.iter_all():
+                f.write(json.dumps(blob_store.resolve_conversation(data), ensure_ascii=False))
+                f.write("\n")
+                count += 1
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
     
-    return results[:limit]
+    return {"path": str(path), "count": count, "bytes": path.stat().st_size}
+
+
+# list/search 도구가 공유하는 필터/패싯 인자
+FILTER_PROPERTIES = {
+    "tags": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "모두 포함해야 하는 metadata.tags"
+    },
+    "title": {
+        "type": "string",
+        "description": "metadata.title 에 포함된 문자열 (대소문자 무시)"
+    },
+    "role": {
+        "type": "string",
+        "enum": ["user", "assistant", "system"],
+        "description": "이 역할의 메시지가 있는 대화만 (검색에서는 일치 메시지도 이 역할만)"
+    },
+    "created_after": {"type": "string", "description": "생성 시각 하한 (ISO 8601, 포함)"},
+    "created_before": {"type": "string", "description": "생성 시각 상한 (ISO 8601, 미포함)"},
+    "updated_after": {"type": "string", "description": "수정 시각 하한 (ISO 8601, 포함)"},
+    "updated_before": {"type": "string", "description": "수정 시각 상한 (ISO 8601, 미포함)"},
+    "facets": {
+        "type": "boolean",
+        "description": "조건에 맞는 전체 대화의 태그/월/역할별 개수를 함께 반환",
+        "default": False
+    }
+}
+
+
+def filter_arguments(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """도구 인자에서 필터 조건만 추출"""
+    return {key: arguments[key] for key in FILTER_KEYS if arguments.get(key)}
 
 
 @app.list_tools()
@@ -168,13 +600,25 @@ async def list_tools() -> List[Tool]:
         ),
         Tool(
             name="load_conversation",
-            description="저장된 대화를 불러옵니다",
+            description="저장된 대화를 불러옵니다. 긴 대화는 tail/after/limit 으로 일부 메시지만 가져올 수 있습니다",
             inputSchema={
                 "type": "object",
                 "properties": {
                     "conversation_id": {
                         "type": "string",
                         "description": "불러올 대화 ID"
+                    },
+                    "tail": {
+                        "type": "integer",
+                        "description": "마지막 N개 메시지만 조회"
+                    },
+                    "after": {
+                        "type": "integer",
+                        "description": "이 인덱스 다음 메시지부터 조회 (이전 응답의 next_after)"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "조회할 최대 메시지 수"
                     }
                 },
                 "required": ["conversation_id"]
@@ -193,9 +637,14 @@ async def list_tools() -> List[Tool]:
                     },
                     "offset": {
                         "type": "integer",
-                        "description": "시작 위치 (기본값: 0)",
+                        "description": "시작 위치 (기본값: 0, cursor 가 있으면 무시)",
                         "default": 0
-                    }
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "이전 응답의 next_cursor (다음 페이지 조회)"
+                    },
+                    **FILTER_PROPERTIES
                 }
             }
         ),
@@ -213,11 +662,80 @@ async def list_tools() -> List[Tool]:
                         "type": "integer",
                         "description": "최대 결과 수 (기본값: 20)",
                         "default": 20
-                    }
+                    },
+                    "mode": {
+                        "type": "string",
+                        "enum": ["keyword", "semantic", "hybrid"],
+                        "description": "keyword(BM25), semantic(의미 유사도), hybrid(둘을 합산) (기본값: keyword)",
+                        "default": "keyword"
+                    },
+                    "matches_per_conversation": {
+                        "type": "integer",
+                        "description": "대화마다 돌려줄 일치 메시지 수 (기본값: 3)",
+                        "default": 3
+                    },
+                    **FILTER_PROPERTIES
                 },
                 "required": ["query"]
             }
         ),
+        Tool(
+            name="export_conversations",
+            description="저장된 모든 대화를 NDJSON 파일(한 줄에 대화 하나)로 내보냅니다",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "저장할 파일 경로 (기본값: ~/.pensieve-mcp/exports/conversations-<시각>.ndjson)"
+                    },
+                    "gzip": {
+                        "type": "boolean",
+                        "description": "gzip 으로 압축 (기본값: false)",
+                        "default": False
+                    }
+                }
+            }
+        ),
+        Tool(
+            name="delete_conversation",
+            description="저장된 대화를 삭제합니다",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "conversation_id": {
+                        "type": "string",
+                        "description": "삭제할 대화 ID"
+                    }
+                },
+                "required": ["conversation_id"]
+            }
+        ),
+        Tool(
+            name="sync_conversations",
+            description="클라우드 API 와 대화를 동기화합니다 (마지막 동기화 이후 변경분만 전송)",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "api_url": {
+                        "type": "string",
+                        "description": "API 주소 (기본값: PENSIEVE_API_URL 환경 변수)"
+                    },
+                    "token": {
+                        "type": "string",
+                        "description": "API 액세스 토큰 (기본값: PENSIEVE_API_TOKEN 환경 변수)"
+                    }
+                }
+            }
+        ),
+        Tool(
+            name="get_cache_stats",
+            description="대화 캐시의 사용량과 적중/실패/축출 횟수를 조회합니다",
+            inputSchema={
+                "type": "object",
+                "properties": {}
+            }
+        ),
         Tool(
             name="append_to_conversation",
             description="기존 대화에 메시지를 추가합니다",
@@ -239,6 +757,14 @@ async def list_tools() -> List[Tool]:
                             },
                             "required": ["role", "content"]
                         }
+                    },
+                    "idempotency_key": {
+                        "type": "string",
+                        "description": "재시도 시 같은 값을 주면 중복 추가되지 않음"
+                    },
+                    "dedup": {
+                        "type": "boolean",
+                        "description": "대화 끝에 이미 있는 앞쪽 메시지는 건너뛰고 나머지만 추가 (키 없는 재시도용, 기본값: false)"
                     }
                 },
                 "required": ["conversation_id", "messages"]
@@ -256,7 +782,7 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
             messages = arguments["messages"]
             metadata = arguments.get("metadata", {})
             
-            result = save_conversation(conversation_id, messages, metadata)
+            result = await run_io(save_conversation, conversation_id, messages, metadata)
             return [TextContent(
                 type="text",
                 text=f"대화가 저장되었습니다. ID: {result['id']}"
@@ -264,12 +790,18 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
             
         elif name == "load_conversation":
             conversation_id = arguments["conversation_id"]
-            conversation = load_conversation(conversation_id)
+            conversation = await run_io(load_conversation, conversation_id)
+            
+            window = {key: arguments.get(key) for key in ("tail", "after", "limit")}
+            if conversation and any(value is not None for value in window.values()):
+                conversation = slice_messages(conversation, **window)
+            # blob 참조/압축된 메시지는 실제로 돌려줄 구간만 복원
+            conversation = await run_io(blob_store.resolve_conversation, conversation)
             
             if conversation:
                 return [TextContent(
                     type="text",
-                    text=json.dumps(conversation, ensure_ascii=False, indent=2)
+                    text=await to_json_text(conversation)
                 )]
             else:
                 return [TextContent(
@@ -280,49 +812,99 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
         elif name == "list_conversations":
             limit = arguments.get("limit", 50)
             offset = arguments.get("offset", 0)
+            cursor = arguments.get("cursor")
             
-            conversations = list_conversations(limit, offset)
+            conversations = await run_io(
+                list_conversations, limit, offset, cursor, filter_arguments(arguments), arguments.get("facets", False)
+            )
             return [TextContent(
                 type="text",
-                text=json.dumps(conversations, ensure_ascii=False, indent=2)
+                text=await to_json_text(conversations)
             )]
             
         elif name == "search_conversations":
             query = arguments["query"]
             limit = arguments.get("limit", 20)
+            mode = arguments.get("mode", "keyword")
+            matches = arguments.get("matches_per_conversation", 3)
             
-            results = search_conversations(query, limit)
+            results = await run_io(
+                search_conversations, query, limit, mode, matches,
+                filter_arguments(arguments), arguments.get("facets", False)
+            )
             return [TextContent(
                 type="text",
-                text=json.dumps(results, ensure_ascii=False, indent=2)
+                text=await to_json_text(results)
             )]
             
         elif name == "append_to_conversation":
             conversation_id = arguments["conversation_id"]
             new_messages = arguments["messages"]
             
-            # 기존 대화 로드
-            conversation = load_conversation(conversation_id)
+            conversation = await run_io(
+                append_to_conversation, conversation_id, new_messages,
+                arguments.get("idempotency_key"), arguments.get("dedup", False)
+            )
             if not conversation:
                 return [TextContent(
                     type="text",
                     text=f"대화를 찾을 수 없습니다: {conversation_id}"
                 )]
+            if conversation["duplicate"]:
+                return [TextContent(
+                    type="text",
+                    text="이미 추가된 메시지입니다 (중복 요청은 무시되었습니다)."
+                )]
             
-            # 메시지 추가
-            conversation["messages"].extend(new_messages)
-            conversation["updated_at"] = datetime.now().isoformat()
+            text = f"대화에 {conversation['added']}개의 메시지가 추가되었습니다."
+            if conversation["skipped"]:
+                text += f" (이미 있던 {conversation['skipped']}개는 건너뜀)"
+            return [TextContent(
+                type="text",
+                text=text
+            )]
             
-            # 저장
-            result = save_conversation(
-                conversation_id,
-                conversation["messages"],
-                conversation.get("metadata", {})
-            )
+        elif name == "export_conversations":
+            path = Path(arguments["path"]).expanduser() if arguments.get("path") else None
+            result = await run_io(export_conversations, path, arguments.get("gzip", False))
+            return [TextContent(
+                type="text",
+                text=f"대화 {result['count']}개를 내보냈습니다: {result['path']} ({result['bytes']} bytes)"
+            )]
+            
+        elif name == "delete_conversation":
+            conversation_id = arguments["conversation_id"]
+            if not await run_io(delete_conversation, conversation_id):
+                return [TextContent(
+                    type="text",
+                    text=f"대화를 찾을 수 없습니다: {conversation_id}"
+                )]
+            return [TextContent(
+                type="text",
+                text=f"대화가 삭제되었습니다: {conversation_id}"
+            )]
             
+        elif name == "sync_conversations":
+            api_url = arguments.get("api_url") or os.getenv("PENSIEVE_API_URL")
+            token = arguments.get("token") or os.getenv("PENSIEVE_API_TOKEN")
+            if not api_url or not token:
+                return [TextContent(
+                    type="text",
+                    text="API 주소와 토큰이 필요합니다. PENSIEVE_API_URL/PENSIEVE_API_TOKEN 을 설정하거나 인자로 전달하세요."
+                )]
+            
+            report = await run_io(sync_with_cloud, api_url, token)
             return [TextContent(
                 type="text",
-                text=f"대화에 {len(new_messages)}개의 메시지가 추가되었습니다."
+                text=await to_json_text(report)
+            )]
+            
+        elif name == "get_cache_stats":
+            return [TextContent(
+                type="text",
+                text=json.dumps(
+                    dict(conversation_cache.stats(), blobs=blob_store.stats()), ensure_ascii=False, indent=2
+                )
             )]
             
         else:
@@ -340,12 +922,15 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
 
 async def main():
     """서버 실행"""
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            app.create_initialization_options()
-        )
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                app.create_initialization_options()
+            )
+    finally:
+        io_executor.shutdown(wait=True)
 
 
 if __name__ == "__main__":
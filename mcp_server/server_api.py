@@ -1,13 +1,27 @@
 #!/usr/bin/env python3
 import asyncio
+import base64
+import hashlib
+import itertools
 import json
 import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
 from typing import Dict, List, Optional, Any
 import httpx
 from mcp.server import Server
 from mcp.types import Tool, TextContent
 from mcp.server.stdio import stdio_server
 
+from mcp_server.blobs import BlobStore
+from mcp_server.manifest import FILTER_KEYS
+from mcp_server.sqlite_storage import SQLiteConversationStorage
+from mcp_server.storage import ConversationStorage, StorageBackend
+
 # API 설정
 API_BASE_URL = os.getenv("PENSIEVE_API_URL", "http://localhost:8000")
 API_TOKEN = os.getenv("PENSIEVE_API_TOKEN", "")
@@ -15,13 +29,376 @@ API_TOKEN = os.getenv("PENSIEVE_API_TOKEN", "")
 # 서버 인스턴스
 app = Server("pensieve-mcp")
 
-# HTTP 클라이언트
-async def get_http_client():
-    global API_TOKEN
-    headers = {}
+# HTTP 연결 풀 설정
+HTTP_MAX_CONNECTIONS = int(os.getenv("PENSIEVE_HTTP_MAX_CONNECTIONS", "10"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("PENSIEVE_HTTP_MAX_KEEPALIVE", "5"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("PENSIEVE_HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP_TIMEOUT = float(os.getenv("PENSIEVE_HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("PENSIEVE_HTTP_CONNECT_TIMEOUT", "10"))
+
+# h2 패키지가 설치되어 있으면 HTTP/2 사용
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+# 프로세스 전체에서 공유하는 HTTP 클라이언트 (keep-alive 연결 재사용)
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _apply_auth_header(client: httpx.AsyncClient) -> None:
+    """현재 API_TOKEN 으로 인증 헤더를 갱신"""
     if API_TOKEN:
-        headers["Authorization"] = f"Bearer {API_TOKEN}"
-    return httpx.AsyncClient(base_url=API_BASE_URL, headers=headers)
+        client.headers["Authorization"] = f"Bearer {API_TOKEN}"
+    else:
+        client.headers.pop("Authorization", None)
+
+
+def set_api_token(token: str) -> None:
+    """API 토큰을 바꾸고 공유 클라이언트의 인증 헤더를 다시 만든다"""
+    global API_TOKEN
+    API_TOKEN = token
+    if _http_client is not None and not _http_client.is_closed:
+        _apply_auth_header(_http_client)
+
+
+# HTTP 클라이언트
+async def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            base_url=API_BASE_URL,
+            http2=HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+        _apply_auth_header(_http_client)
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """공유 클라이언트의 연결을 정리"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# 같은 내용의 append 가 이 시간 안에 다시 호출되면 같은 Idempotency-Key 로 재전송
+APPEND_RETRY_WINDOW = float(os.getenv("PENSIEVE_APPEND_RETRY_WINDOW", "300"))
+# (대화 ID, 메시지 해시) -> (키, 최초 전송 시각)
+_recent_append_keys: "OrderedDict[tuple, tuple]" = OrderedDict()
+_RECENT_APPEND_KEYS_MAX = 256
+
+
+def append_idempotency_key(conversation_id: str, messages: List[Dict[str, Any]]) -> str:
+    """append 재시도에 쓸 Idempotency-Key
+
+    타임아웃 뒤 클라이언트가 같은 호출을 반복하면 같은 키를 돌려주므로 서버가
+    중복 append 를 무시한다. 창이 지난 뒤의 같은 내용은 새 키를 받아 정상 추가된다.
+    """
+    digest = hashlib.sha256(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    entry_key = (conversation_id, digest)
+    now = time.monotonic()
+    entry = _recent_append_keys.get(entry_key)
+    if entry is None or now - entry[1] > APPEND_RETRY_WINDOW:
+        entry = (str(uuid.uuid4()), now)
+        _recent_append_keys[entry_key] = entry
+    _recent_append_keys.move_to_end(entry_key)
+    while len(_recent_append_keys) > _RECENT_APPEND_KEYS_MAX:
+        _recent_append_keys.popitem(last=False)
+    return entry[0]
+
+
+# 로컬 저장소 가져오기 설정
+LOCAL_STORAGE_DIR = Path.home() / ".pensieve-mcp" / "conversations"
+# 로컬 MCP 서버와 같은 저장소 백엔드 설정 (json | sqlite)
+LOCAL_STORAGE_BACKEND = os.getenv("PENSIEVE_STORAGE", "json").lower()
+IMPORT_BATCH_SIZE = int(os.getenv("PENSIEVE_IMPORT_BATCH_SIZE", "100"))
+IMPORT_CONCURRENCY = int(os.getenv("PENSIEVE_IMPORT_CONCURRENCY", "4"))
+# 응답에 포함할 실패 항목 수
+IMPORT_MAX_REPORTED_ERRORS = 20
+
+# 조회 응답 캐시 설정 (ETag 조건부 요청으로 재검증)
+RESPONSE_CACHE_ENABLED = os.getenv("PENSIEVE_API_CACHE", "1") != "0"
+RESPONSE_CACHE_DIR = Path(os.getenv(
+    "PENSIEVE_API_CACHE_DIR", str(Path.home() / ".pensieve-mcp" / "api_cache")
+))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("PENSIEVE_API_CACHE_MAX_ENTRIES", "256"))
+# 디스크 캐시 최대 크기 - 넘으면 오래 쓰지 않은 파일부터 이 크기의 80% 까지 지움
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("PENSIEVE_API_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESPONSE_CACHE_PRUNE_RATIO = 0.8
+# 본문과 함께 보관해 304 응답 시 복원할 헤더
+RESPONSE_CACHE_HEADERS = ("X-Next-Cursor",)
+
+
+class ResponseCache:
+    """ETag 와 응답 본문을 보관하는 메모리 LRU + 디스크 2단 캐시
+
+    메모리에 없으면 디스크에서 읽어 오므로 프로세스를 새로 띄운 직후에도
+    조건부 요청(If-None-Match)으로 304 응답을 받을 수 있다. 디스크 쪽은 읽을 때마다
+    파일 mtime 을 갱신하고, 전체 크기가 max_bytes 를 넘으면 mtime 이 오래된 파일부터 지운다.
+    """
+
+    def __init__(self, directory: Path, max_entries: int = 256, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._disk_lock = threading.Lock()
+        # 디스크 사용량 추정치 (처음 기록할 때 디렉토리를 훑어 계산)
+        self._disk_bytes: Optional[int] = None
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # 최근에 쓴 항목이 정리 대상에서 뒤로 밀리도록
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("key") == key else None
+
+    def _write_disk(self, key: str, entry: Dict[str, Any]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        # 같은 키를 동시에 기록해도 임시 파일이 겹치지 않도록 고유한 이름 사용
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, prefix=f"{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(dict(entry, key=key), f, ensure_ascii=False)
+            size = os.path.getsize(tmp_name)
+            try:
+                previous = path.stat().st_size
+            except FileNotFoundError:
+                previous = 0
+            os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+        self._account(size - previous)
+
+    def _account(self, delta: int) -> None:
+        """디스크 사용량을 갱신하고 한도를 넘으면 정리"""
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += delta
+            if self._disk_bytes > self.max_bytes:
+                self._prune()
+
+    def _disk_files(self) -> List[tuple]:
+        files = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _prune(self) -> None:
+        """mtime 이 오래된 파일부터 지워 max_bytes * RESPONSE_CACHE_PRUNE_RATIO 이하로"""
+        files = sorted(self._disk_files(), key=lambda item: item[0])
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * RESPONSE_CACHE_PRUNE_RATIO
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except FileNotFoundError:
+                total -= size
+        self._disk_bytes = total
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is None:
+                return None
+        self._remember(key, entry)
+        return entry
+
+    async def put(self, key: str, etag: str, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        entry = {"etag": etag, "body": body, "headers": headers or {}}
+        self._remember(key, entry)
+        await asyncio.to_thread(self._write_disk, key, entry)
+
+    async def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+        path = self._path(key)
+        if path.exists():
+            await asyncio.to_thread(path.unlink)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES)
+
+
+def _token_subject() -> str:
+    """캐시 키에 쓸 사용자 식별자 (JWT sub, 해석 실패 시 토큰 해시)"""
+    try:
+        payload = API_TOKEN.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload))["sub"]
+    except Exception:
+        return hashlib.sha256(API_TOKEN.encode("utf-8")).hexdigest()
+
+
+async def cached_get(client: httpx.AsyncClient, path: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+    """ETag 조건부 요청을 사용하는 GET
+
+    서버가 304 를 돌려주면 캐시된 본문으로 200 응답을 만들어 반환하므로
+    호출하는 쪽은 일반 GET 과 똑같이 다룰 수 있다.
+    """
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    if not RESPONSE_CACHE_ENABLED:
+        return await client.get(path, params=params)
+
+    query = "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+    key = f"{API_BASE_URL}|{_token_subject()}|{path}?{query}"
+    entry = await response_cache.get(key)
+    headers = {"If-None-Match": entry["etag"]} if entry else {}
+
+    response = await client.get(path, params=params, headers=headers)
+    if response.status_code == 304 and entry:
+        headers = dict(entry.get("headers", {}), ETag=entry["etag"])
+        return httpx.Response(200, json=entry["body"], headers=headers)
+
+    etag = response.headers.get("ETag")
+    if response.status_code == 200 and etag:
+        kept = {name: response.headers[name] for name in RESPONSE_CACHE_HEADERS if name in response.headers}
+        await response_cache.put(key, etag, response.json(), kept)
+    elif response.status_code == 404 and entry:
+        await response_cache.invalidate(key)
+    return response
+
+def open_local_storage(directory: Path) -> StorageBackend:
+    """PENSIEVE_STORAGE 에 맞는 로컬 저장소를 엶 (sqlite 는 디렉터리 옆의 conversations.db)"""
+    if LOCAL_STORAGE_BACKEND == "sqlite":
+        path = directory.parent / "conversations.db"
+        if not path.is_file():
+            raise FileNotFoundError(f"로컬 SQLite 저장소를 찾을 수 없습니다: {path}")
+        return SQLiteConversationStorage(path)
+    if LOCAL_STORAGE_BACKEND == "json":
+        if not directory.is_dir():
+            raise FileNotFoundError(f"로컬 저장소를 찾을 수 없습니다: {directory}")
+        return ConversationStorage(directory)
+    raise ValueError(f"알 수 없는 PENSIEVE_STORAGE 값: {LOCAL_STORAGE_BACKEND}")
+
+async def import_local_store(
+    client: httpx.AsyncClient,
+    directory: Path,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    concurrency: int = IMPORT_CONCURRENCY,
+) -> Dict[str, Any]:
+    """로컬 대화 파일을 NDJSON 묶음으로 /conversations/import 에 전송
+
+    PENSIEVE_STORAGE 로 고른 백엔드(json 디렉터리 또는 conversations.db)에서
+    한 묶음씩 읽으면서 동시에 최대 concurrency 개의 요청만 보내므로
+    메모리에는 batch_size * concurrency 개 이하의 대화만 올라간다. 로컬 ID 를
+    그대로 보내기 때문에 중간에 실패해도 다시 실행하면 이어서 가져온다.
+    """
+    storage = open_local_storage(directory)
+    documents = storage.iter_all()
+    blob_store = BlobStore(directory.parent / "blobs")
+
+    def next_batch() -> List[Dict[str, Any]]:
+        return [blob_store.resolve_conversation(data) for data, _ in itertools.islice(documents, batch_size)]
+
+    report: Dict[str, Any] = {"created": 0, "exists": 0, "error": 0, "errors": []}
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(batch: List[Dict[str, Any]]) -> None:
+        try:
+            body = "".join(json.dumps(data, ensure_ascii=False) + "\n" for data in batch)
+            response = await client.post(
+                "/conversations/import",
+                content=body.encode("utf-8"),
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+            if response.status_code != 200:
+                report["error"] += len(batch)
+                report["errors"].append({"ids": [data.get("id") for data in batch], "error": response.text})
+                return
+            result = response.json()
+            for key in ("created", "exists", "error"):
+                report[key] += result.get(key, 0)
+            report["errors"].extend(item for item in result["results"] if item["status"] == "error")
+        except httpx.HTTPError as e:
+            report["error"] += len(batch)
+            report["errors"].append({"ids": [data.get("id") for data in batch], "error": str(e)})
+        finally:
+            slots.release()
+
+    tasks = []
+    try:
+        while True:
+            await slots.acquire()
+            batch = await asyncio.to_thread(next_batch)
+            if not batch:
+                slots.release()
+                break
+            tasks.append(asyncio.create_task(send(batch)))
+        await asyncio.gather(*tasks)
+    finally:
+        if isinstance(storage, SQLiteConversationStorage):
+            storage.close()
+
+    report["errors"] = report["errors"][:IMPORT_MAX_REPORTED_ERRORS]
+    return report
+
+# 목록/검색 도구 공통 필터 인자
+FILTER_PROPERTIES = {
+    "tags": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "모두 포함해야 하는 metadata.tags"
+    },
+    "title": {
+        "type": "string",
+        "description": "metadata.title 에 포함된 문자열 (대소문자 무시)"
+    },
+    "role": {
+        "type": "string",
+        "enum": ["user", "assistant", "system"],
+        "description": "이 역할의 메시지가 있는 대화만 (검색에서는 일치 메시지도 이 역할만)"
+    },
+    "created_after": {"type": "string", "description": "생성 시각 하한 (ISO 8601, 포함)"},
+    "created_before": {"type": "string", "description": "생성 시각 상한 (ISO 8601, 미포함)"},
+    "updated_after": {"type": "string", "description": "수정 시각 하한 (ISO 8601, 포함)"},
+    "updated_before": {"type": "string", "description": "수정 시각 상한 (ISO 8601, 미포함)"},
+    "facets": {
+        "type": "boolean",
+        "description": "조건에 맞는 전체 대화의 태그/월/역할별 개수를 함께 반환",
+        "default": False
+    }
+}
+
+def filter_params(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """도구 인자에서 필터 조건을 API 쿼리 파라미터로 추출"""
+    params = {key: arguments[key] for key in FILTER_KEYS if arguments.get(key)}
+    if arguments.get("facets"):
+        params["facets"] = "true"
+    return params
 
 @app.list_tools()
 async def list_tools() -> List[Tool]:
@@ -55,13 +432,25 @@ async def list_tools() -> List[Tool]:
         ),
         Tool(
             name="load_conversation",
-            description="저장된 대화를 불러옵니다",
+            description="저장된 대화를 불러옵니다. 긴 대화는 tail/after/limit 으로 일부 메시지만 가져올 수 있습니다",
             inputSchema={
                 "type": "object",
                 "properties": {
                     "conversation_id": {
                         "type": "string",
                         "description": "불러올 대화 ID"
+                    },
+                    "tail": {
+                        "type": "integer",
+                        "description": "마지막 N개 메시지만 조회"
+                    },
+                    "after": {
+                        "type": "integer",
+                        "description": "이 인덱스 다음 메시지부터 조회 (이전 응답의 next_after)"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "조회할 최대 메시지 수"
                     }
                 },
                 "required": ["conversation_id"]
@@ -80,9 +469,14 @@ async def list_tools() -> List[Tool]:
                     },
                     "offset": {
                         "type": "integer",
-                        "description": "시작 위치 (기본값: 0)",
+                        "description": "시작 위치 (기본값: 0, cursor 가 있으면 무시)",
                         "default": 0
-                    }
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "이전 응답의 next_cursor (다음 페이지 조회)"
+                    },
+                    **FILTER_PROPERTIES
                 }
             }
         ),
@@ -100,7 +494,8 @@ async def list_tools() -> List[Tool]:
                         "type": "integer",
                         "description": "최대 결과 수 (기본값: 20)",
                         "default": 20
-                    }
+                    },
+                    **FILTER_PROPERTIES
                 },
                 "required": ["query"]
             }
@@ -126,11 +521,42 @@ async def list_tools() -> List[Tool]:
                             },
                             "required": ["role", "content"]
                         }
+                    },
+                    "idempotency_key": {
+                        "type": "string",
+                        "description": "재시도 시 같은 값을 주면 중복 추가되지 않음 (생략 시 같은 내용의 재호출에 같은 키를 자동으로 씀)"
+                    },
+                    "dedup": {
+                        "type": "boolean",
+                        "description": "대화 끝에 이미 있는 앞쪽 메시지는 건너뛰고 나머지만 추가 (키 없는 재시도용, 기본값: false)"
                     }
                 },
                 "required": ["conversation_id", "messages"]
             }
         ),
+        Tool(
+            name="import_local_store",
+            description="로컬 모드(server.py)에 저장된 대화를 클라우드로 가져옵니다 (다시 실행해도 중복되지 않음)",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "directory": {
+                        "type": "string",
+                        "description": "로컬 대화 디렉터리 (기본값: ~/.pensieve-mcp/conversations, PENSIEVE_STORAGE=sqlite 이면 옆의 conversations.db 를 읽음)"
+                    },
+                    "batch_size": {
+                        "type": "integer",
+                        "description": f"요청 하나에 담을 대화 수 (기본값: {IMPORT_BATCH_SIZE})",
+                        "default": IMPORT_BATCH_SIZE
+                    },
+                    "concurrency": {
+                        "type": "integer",
+                        "description": f"동시에 보낼 요청 수 (기본값: {IMPORT_CONCURRENCY})",
+                        "default": IMPORT_CONCURRENCY
+                    }
+                }
+            }
+        ),
         Tool(
             name="set_api_token",
             description="API 토큰을 설정합니다 (로그인 후 받은 토큰)",
@@ -186,59 +612,57 @@ async def list_tools() -> List[Tool]:
 @app.call_tool()
 async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
     """도구 실행"""
-    global API_TOKEN
-    
     try:
         if name == "set_api_token":
-            API_TOKEN = arguments["token"]
+            set_api_token(arguments["token"])
             return [TextContent(
                 type="text",
                 text="API 토큰이 설정되었습니다. 이제 대화를 저장하고 불러올 수 있습니다."
             )]
         
         elif name == "login":
-            async with httpx.AsyncClient(base_url=API_BASE_URL) as client:
-                response = await client.post(
-                    "/auth/login",
-                    json={
-                        "email": arguments["email"],
-                        "password": arguments["password"]
-                    }
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    API_TOKEN = data["access_token"]
-                    return [TextContent(
-                        type="text",
-                        text=f"로그인 성공! 토큰이 자동으로 설정되었습니다."
-                    )]
-                else:
-                    return [TextContent(
-                        type="text",
-                        text=f"로그인 실패: {response.text}"
-                    )]
+            client = await get_http_client()
+            response = await client.post(
+                "/auth/login",
+                json={
+                    "email": arguments["email"],
+                    "password": arguments["password"]
+                }
+            )
+            if response.status_code == 200:
+                data = response.json()
+                set_api_token(data["access_token"])
+                return [TextContent(
+                    type="text",
+                    text=f"로그인 성공! 토큰이 자동으로 설정되었습니다."
+                )]
+            else:
+                return [TextContent(
+                    type="text",
+                    text=f"로그인 실패: {response.text}"
+                )]
 
         elif name == "register":
-            async with httpx.AsyncClient(base_url=API_BASE_URL) as client:
-                response = await client.post(
-                    "/auth/register",
-                    json={
-                        "email": arguments["email"],
-                        "password": arguments["password"]
-                    }
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    API_TOKEN = data["access_token"]
-                    return [TextContent(
-                        type="text",
-                        text=f"회원가입 성공! 토큰이 자동으로 설정되었습니다."
-                    )]
-                else:
-                    return [TextContent(
-                        type="text",
-                        text=f"회원가입 실패: {response.text}"
-                    )]
+            client = await get_http_client()
+            response = await client.post(
+                "/auth/register",
+                json={
+                    "email": arguments["email"],
+                    "password": arguments["password"]
+                }
+            )
+            if response.status_code == 200:
+                data = response.json()
+                set_api_token(data["access_token"])
+                return [TextContent(
+                    type="text",
+                    text=f"회원가입 성공! 토큰이 자동으로 설정되었습니다."
+                )]
+            else:
+                return [TextContent(
+                    type="text",
+                    text=f"회원가입 실패: {response.text}"
+                )]
         
         # 나머지 도구들은 인증이 필요
         if not API_TOKEN:
@@ -248,122 +672,161 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
             )]
         
         client = await get_http_client()
-        async with client:
-            if name == "save_conversation":
-                messages = arguments["messages"]
-                metadata = arguments.get("metadata", {})
+        if name == "save_conversation":
+            messages = arguments["messages"]
+            metadata = arguments.get("metadata", {})
                 
-                # 디버그: API 토큰 확인
-                import sys
-                print(f"DEBUG: API_TOKEN exists: {bool(API_TOKEN)}", file=sys.stderr)
-                print(f"DEBUG: API_BASE_URL: {API_BASE_URL}", file=sys.stderr)
+            # 디버그: API 토큰 확인
+            import sys
+            print(f"DEBUG: API_TOKEN exists: {bool(API_TOKEN)}", file=sys.stderr)
+            print(f"DEBUG: API_BASE_URL: {API_BASE_URL}", file=sys.stderr)
                 
-                response = await client.post(
-                    "/conversations",
-                    json={
-                        "messages": messages,
-                        "metadata": metadata
-                    }
-                )
+            response = await client.post(
+                "/conversations",
+                json={
+                    "messages": messages,
+                    "metadata": metadata
+                }
+            )
                 
-                print(f"DEBUG: Response status: {response.status_code}", file=sys.stderr)
-                print(f"DEBUG: Response text: {response.text[:200]}", file=sys.stderr)
+            print(f"DEBUG: Response status: {response.status_code}", file=sys.stderr)
+            print(f"DEBUG: Response text: {response.text[:200]}", file=sys.stderr)
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    return [TextContent(
-                        type="text",
-                        text=f"대화가 저장되었습니다. ID: {data['id']}"
-                    )]
-                else:
-                    return [TextContent(
-                        type="text",
-                        text=f"대화 저장 실패: {response.text}"
-                    )]
+            if response.status_code == 200:
+                data = response.json()
+                return [TextContent(
+                    type="text",
+                    text=f"대화가 저장되었습니다. ID: {data['id']}"
+                )]
+            else:
+                return [TextContent(
+                    type="text",
+                    text=f"대화 저장 실패: {response.text}"
+                )]
             
-            elif name == "load_conversation":
-                conversation_id = arguments["conversation_id"]
-                response = await client.get(f"/conversations/{conversation_id}")
+        elif name == "load_conversation":
+            conversation_id = arguments["conversation_id"]
+            params = {
+                key: arguments[key] for key in ("tail", "after", "limit")
+                if arguments.get(key) is not None
+            }
+            response = await cached_get(client, f"/conversations/{conversation_id}", params=params or None)
                 
-                if response.status_code == 200:
-                    conversation = response.json()
-                    return [TextContent(
-                        type="text",
-                        text=json.dumps(conversation, ensure_ascii=False, indent=2)
-                    )]
-                else:
-                    return [TextContent(
-                        type="text",
-                        text=f"대화를 찾을 수 없습니다: {response.text}"
-                    )]
+            if response.status_code == 200:
+                conversation = response.json()
+                return [TextContent(
+                    type="text",
+                    text=json.dumps(conversation, ensure_ascii=False, indent=2)
+                )]
+            else:
+                return [TextContent(
+                    type="text",
+                    text=f"대화를 찾을 수 없습니다: {response.text}"
+                )]
             
-            elif name == "list_conversations":
-                limit = arguments.get("limit", 50)
-                offset = arguments.get("offset", 0)
+        elif name == "list_conversations":
+            limit = arguments.get("limit", 50)
+            offset = arguments.get("offset", 0)
+            cursor = arguments.get("cursor")
                 
-                response = await client.get(
-                    "/conversations",
-                    params={"limit": limit, "offset": offset}
-                )
+            response = await cached_get(
+                client,
+                "/conversations",
+                params={"limit": limit, "offset": offset, "cursor": cursor, **filter_params(arguments)}
+            )
                 
-                if response.status_code == 200:
-                    conversations = response.json()
-                    return [TextContent(
-                        type="text",
-                        text=json.dumps(conversations, ensure_ascii=False, indent=2)
-                    )]
+            if response.status_code == 200:
+                body = response.json()
+                if isinstance(body, dict):
+                    conversations = dict(body, next_cursor=response.headers.get("X-Next-Cursor"))
                 else:
-                    return [TextContent(
-                        type="text",
-                        text=f"대화 목록 조회 실패: {response.text}"
-                    )]
+                    conversations = {
+                        "conversations": body,
+                        "next_cursor": response.headers.get("X-Next-Cursor")
+                    }
+                return [TextContent(
+                    type="text",
+                    text=json.dumps(conversations, ensure_ascii=False, indent=2)
+                )]
+            else:
+                return [TextContent(
+                    type="text",
+                    text=f"대화 목록 조회 실패: {response.text}"
+                )]
             
-            elif name == "search_conversations":
-                query = arguments["query"]
-                limit = arguments.get("limit", 20)
+        elif name == "search_conversations":
+            query = arguments["query"]
+            limit = arguments.get("limit", 20)
                 
-                response = await client.get(
-                    "/conversations/search",
-                    params={"query": query, "limit": limit}
-                )
+            response = await client.get(
+                "/conversations/search",
+                params={"query": query, "limit": limit, **filter_params(arguments)}
+            )
                 
-                if response.status_code == 200:
-                    results = response.json()
-                    return [TextContent(
-                        type="text",
-                        text=json.dumps(results, ensure_ascii=False, indent=2)
-                    )]
-                else:
-                    return [TextContent(
-                        type="text",
-                        text=f"검색 실패: {response.text}"
-                    )]
+            if response.status_code == 200:
+                results = response.json()
+                return [TextContent(
+                    type="text",
+                    text=json.dumps(results, ensure_ascii=False, indent=2)
+                )]
+            else:
+                return [TextContent(
+                    type="text",
+                    text=f"검색 실패: {response.text}"
+                )]
             
-            elif name == "append_to_conversation":
-                conversation_id = arguments["conversation_id"]
-                messages = arguments["messages"]
+        elif name == "append_to_conversation":
+            conversation_id = arguments["conversation_id"]
+            messages = arguments["messages"]
+            key = arguments.get("idempotency_key") or append_idempotency_key(conversation_id, messages)
                 
-                response = await client.post(
-                    f"/conversations/{conversation_id}/messages",
-                    json=messages
-                )
+            response = await client.post(
+                f"/conversations/{conversation_id}/messages",
+                json=messages,
+                params={"dedup": "true"} if arguments.get("dedup") else None,
+                headers={"Idempotency-Key": key}
+            )
                 
-                if response.status_code == 200:
+            if response.status_code == 200:
+                result = response.json()
+                if result.get("duplicate"):
+                    # 자동 키는 같은 내용의 재호출을 재시도로 보므로, 의도한 반복이면 새 키로 다시 보내도록 안내
                     return [TextContent(
                         type="text",
-                        text=f"대화에 {len(messages)}개의 메시지가 추가되었습니다."
+                        text="이미 추가된 메시지입니다 (중복 요청은 무시되었습니다). "
+                             "같은 내용을 한 번 더 추가하려면 새 idempotency_key 를 지정해 다시 호출하세요."
                     )]
-                else:
-                    return [TextContent(
-                        type="text",
-                        text=f"메시지 추가 실패: {response.text}"
-                    )]
-            
+                text = f"대화에 {result.get('added', len(messages))}개의 메시지가 추가되었습니다."
+                if result.get("skipped"):
+                    text += f" (이미 있던 {result['skipped']}개는 건너뜀)"
+                return [TextContent(
+                    type="text",
+                    text=text
+                )]
             else:
                 return [TextContent(
                     type="text",
-                    text=f"알 수 없는 도구: {name}"
+                    text=f"메시지 추가 실패: {response.text}"
                 )]
+            
+        elif name == "import_local_store":
+            directory = Path(arguments.get("directory") or LOCAL_STORAGE_DIR).expanduser()
+            report = await import_local_store(
+                client,
+                directory,
+                batch_size=max(1, arguments.get("batch_size", IMPORT_BATCH_SIZE)),
+                concurrency=max(1, arguments.get("concurrency", IMPORT_CONCURRENCY)),
+            )
+            return [TextContent(
+                type="text",
+                text=json.dumps(report, ensure_ascii=False, indent=2)
+            )]
+            
+        else:
+            return [TextContent(
+                type="text",
+                text=f"알 수 없는 도구: {name}"
+            )]
                 
     except Exception as e:
         return [TextContent(
@@ -373,12 +836,15 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
 
 async def main():
     """서버 실행"""
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            app.create_initialization_options()
-        )
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                app.create_initialization_options()
+            )
+    finally:
+        await close_http_client()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
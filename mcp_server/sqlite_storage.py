@@ -0,0 +1,402 @@
+"""SQLite 대화 저장소 (PENSIEVE_STORAGE=sqlite)
+
+대화마다 파일 두 개를 두는 ConversationStorage 대신 WAL 모드의 SQLite 파일 하나에
+conversations / messages 테이블로 저장한다. 목록 순회에 디렉토리 glob 이 필요 없고,
+append 는 메시지 행만 추가하며, 대화를 다시 쓸 때도 해당 대화의 행만 교체한다.
+
+메시지 본문은 search_index.tokenize 로 자른 토큰을 FTS5 테이블에 같은 트랜잭션으로
+기록하므로, 이 백엔드에서는 별도의 역색인 DB 없이 SQLiteSearchIndex 가 검색을 맡는다.
+SQL 은 모듈 상수로 고정해 sqlite3 의 문장 캐시가 준비된 문장을 재사용한다.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from mcp_server.compression import expand_message
+from mcp_server.search_index import metadata_texts, tokenize
+from mcp_server.storage import FSYNC_MODE, ConversationStorage
+
+# 연결별로 캐시할 준비된 문장 수
+STATEMENT_CACHE_SIZE = 256
+# 마이그레이션 시 한 트랜잭션에 넣을 대화 수
+MIGRATE_BATCH_SIZE = 500
+
+# 메시지 행에 별도 컬럼으로 두는 필드 (나머지는 extra 에 JSON 으로)
+_MESSAGE_COLUMNS = ("role", "content")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    document TEXT NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id TEXT NOT NULL,
+    message_index INTEGER NOT NULL,
+    role TEXT,
+    content TEXT,
+    extra TEXT,
+    UNIQUE (conversation_id, message_index)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(tokens, tokenize = 'unicode61 remove_diacritics 0');
+CREATE VIRTUAL TABLE IF NOT EXISTS conversation_fts USING fts5(tokens, tokenize = 'unicode61 remove_diacritics 0');
+"""
+
+_SELECT_DOCUMENT = "SELECT document FROM conversations WHERE id = ?"
+_SELECT_MTIME = "SELECT mtime FROM conversations WHERE id = ?"
+_SELECT_SEQ = "SELECT seq FROM conversations WHERE id = ?"
+_SELECT_MESSAGES = (
+    "SELECT role, content, extra FROM messages WHERE conversation_id = ? ORDER BY message_index"
+)
+_NEXT_MESSAGE_INDEX = (
+    "SELECT COALESCE(MAX(message_index) + 1, 0) FROM messages WHERE conversation_id = ?"
+)
+_INSERT_CONVERSATION = "INSERT INTO conversations (id, document, mtime) VALUES (?, ?, ?)"
+_UPDATE_CONVERSATION = "UPDATE conversations SET document = ?, mtime = ? WHERE seq = ?"
+_TOUCH_CONVERSATION = (
+    "UPDATE conversations SET document = json_set(document, '$.updated_at', ?), mtime = ? WHERE seq = ?"
+)
+_DELETE_CONVERSATION = "DELETE FROM conversations WHERE seq = ?"
+_INSERT_MESSAGE = (
+    "INSERT INTO messages (conversation_id, message_index, role, content, extra) VALUES (?, ?, ?, ?, ?)"
+)
+_INSERT_MESSAGE_FTS = "INSERT INTO message_fts (rowid, tokens) VALUES (?, ?)"
+_DELETE_MESSAGE_FTS = (
+    "DELETE FROM message_fts WHERE rowid IN (SELECT id FROM messages WHERE conversation_id = ?)"
+)
+_DELETE_MESSAGES = "DELETE FROM messages WHERE conversation_id = ?"
+_REPLACE_CONVERSATION_FTS = "INSERT OR REPLACE INTO conversation_fts (rowid, tokens) VALUES (?, ?)"
+_DELETE_CONVERSATION_FTS = "DELETE FROM conversation_fts WHERE rowid = ?"
+
+# 대화 점수는 메타데이터와 일치한 메시지들의 bm25 점수 합
+_SEARCH = """
+WITH hits AS (
+    SELECT m.conversation_id AS id, -bm25(message_fts) AS score
+    FROM message_fts JOIN messages m ON m.id = message_fts.rowid
+    WHERE message_fts MATCH :query
+    UNION ALL
+    SELECT c.id, -bm25(conversation_fts)
+    FROM conversation_fts JOIN conversations c ON c.seq = conversation_fts.rowid
+    WHERE conversation_fts MATCH :query
+)
+SELECT id, SUM(score) AS total FROM hits
+WHERE :allowed IS NULL OR id IN (SELECT value FROM json_each(:allowed))
+GROUP BY id ORDER BY total DESC LIMIT :limit
+"""
+_MESSAGE_HITS = """
+SELECT m.conversation_id, m.message_index, -bm25(message_fts)
+FROM message_fts JOIN messages m ON m.id = message_fts.rowid
+WHERE message_fts MATCH :query
+  AND m.conversation_id IN (SELECT value FROM json_each(:ids))
+  AND (:role IS NULL OR m.role = :role)
+"""
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def fts_query(query: str) -> Optional[str]:
+    """질의를 색인과 같은 토큰의 OR 조건 FTS5 MATCH 식으로 (토큰이 없으면 None)"""
+    terms = sorted(set(tokenize(query)))
+    if not terms:
+        return None
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class SQLiteConversationStorage:
+    """conversations / messages 테이블 기반 대화 저장소 (ConversationStorage 와 같은 인터페이스)
+
+    resolve 는 색인할 본문을 얻는 함수로, blob 참조 메시지의 본문을 FTS 에 넣기 위해
+    BlobStore.resolve_message 를 넘긴다 (기본은 압축 해제만).
+    """
+
+    def __init__(self, path: Path, resolve: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._resolve = resolve or expand_message
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            str(self.path), check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # PENSIEVE_FSYNC 가 always/group 이면 커밋마다 fsync
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if FSYNC_MODE in ('always', 'group') else 'NORMAL'}")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    # 변환
+
+    @staticmethod
+    def _message_row(message: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        content = message.get("content")
+        if not isinstance(content, str):
+            content = None
+        extra = {
+            key: value for key, value in message.items()
+            if key not in _MESSAGE_COLUMNS or (key == "content" and content is None)
+        }
+        return message.get("role"), content, _dumps(extra) if extra else None
+
+    @staticmethod
+    def _message(role: Optional[str], content: Optional[str], extra: Optional[str]) -> Dict[str, Any]:
+        message: Dict[str, Any] = {}
+        if role is not None:
+            message["role"] = role
+        if content is not None:
+            message["content"] = content
+        if extra:
+            message.update(json.loads(extra))
+        return message
+
+    def _message_tokens(self, message: Dict[str, Any]) -> str:
+        content = self._resolve(message).get("content")
+        return " ".join(tokenize(content)) if isinstance(content, str) else ""
+
+    # 쓰기 (잠금과 트랜잭션 안에서 호출)
+
+    def _seq(self, conversation_id: str) -> Optional[int]:
+        row = self._conn.execute(_SELECT_SEQ, (conversation_id,)).fetchone()
+        return row[0] if row else None
+
+    def _insert_messages(self, conversation_id: str, messages: Sequence[Dict[str, Any]], start: int) -> None:
+        for index, message in enumerate(messages, start):
+            cursor = self._conn.execute(
+                _INSERT_MESSAGE, (conversation_id, index, *self._message_row(message))
+            )
+            self._conn.execute(_INSERT_MESSAGE_FTS, (cursor.lastrowid, self._message_tokens(message)))
+
+    def _write(self, data: Dict[str, Any], mtime: float) -> None:
+        conversation_id = data["id"]
+        document = _dumps({key: value for key, value in data.items() if key != "messages"})
+        seq = self._seq(conversation_id)
+        if seq is None:
+            seq = self._conn.execute(_INSERT_CONVERSATION, (conversation_id, document, mtime)).lastrowid
+        else:
+            self._conn.execute(_UPDATE_CONVERSATION, (document, mtime, seq))
+            self._conn.execute(_DELETE_MESSAGE_FTS, (conversation_id,))
+            self._conn.execute(_DELETE_MESSAGES, (conversation_id,))
+        tokens = " ".join(tokenize(" ".join(metadata_texts(data.get("metadata", {})))))
+        self._conn.execute(_REPLACE_CONVERSATION_FTS, (seq, tokens))
+        self._insert_messages(conversation_id, data.get("messages", []), 0)
+
+    # 공개 API
+
+    def exists(self, conversation_id: str) -> bool:
+        with self._lock:
+            return self._seq(conversation_id) is not None
+
+    def mtime(self, conversation_id: str) -> float:
+        """마지막으로 쓰거나 append 한 시각 (캐시 무효화용, 없으면 0)"""
+        with self._lock:
+            row = self._conn.execute(_SELECT_MTIME, (conversation_id,)).fetchone()
+        return row[0] if row else 0.0
+
+    def read(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(_SELECT_DOCUMENT, (conversation_id,)).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(_SELECT_MESSAGES, (conversation_id,)).fetchall()
+        data = json.loads(row[0])
+        data["messages"] = [self._message(*message) for message in rows]
+        return data
+
+    def write(self, data: Dict[str, Any]) -> None:
+        """대화 문서 전체를 기록 (기존 메시지 행은 교체)"""
+        with self._lock, self._conn:
+            self._write(data, time.time())
+
+    def write_many(self, documents: Iterable[Dict[str, Any]]) -> int:
+        """여러 대화를 한 트랜잭션으로 기록"""
+        count = 0
+        with self._lock, self._conn:
+            for data in documents:
+                self._write(data, time.time())
+                count += 1
+        return count
+
+    def append(self, conversation_id: str, messages: List[Dict[str, Any]], updated_at: str) -> None:
+        """새 메시지 행만 추가 - 비용은 추가된 메시지 크기에 비례"""
+        with self._lock, self._conn:
+            seq = self._seq(conversation_id)
+            if seq is None:
+                raise KeyError(conversation_id)
+            start = self._conn.execute(_NEXT_MESSAGE_INDEX, (conversation_id,)).fetchone()[0]
+            self._insert_messages(conversation_id, messages, start)
+            self._conn.execute(_TOUCH_CONVERSATION, (updated_at, time.time(), seq))
+
+    def delete(self, conversation_id: str) -> bool:
+        """대화와 메시지 행을 삭제 - 대화가 있었으면 True"""
+        with self._lock, self._conn:
+            seq = self._seq(conversation_id)
+            if seq is None:
+                return False
+            self._conn.execute(_DELETE_MESSAGE_FTS, (conversation_id,))
+            self._conn.execute(_DELETE_MESSAGES, (conversation_id,))
+            self._conn.execute(_DELETE_CONVERSATION_FTS, (seq,))
+            self._conn.execute(_DELETE_CONVERSATION, (seq,))
+            return True
+
+    def iter_all(self) -> Iterator[Tuple[Dict[str, Any], float]]:
+        """저장된 모든 대화를 (문서, 최근 수정 시각)으로 순회"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, mtime FROM conversations ORDER BY seq").fetchall()
+        for conversation_id, mtime in rows:
+            data = self.read(conversation_id)
+            if data is not None:
+                yield data, mtime
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    def compact(self, conversation_id: str) -> None:
+        """병합할 로그가 없으므로 아무것도 하지 않음 (ConversationStorage 호환)"""
+
+    def wait_for_compactions(self) -> None:
+        """병합할 로그가 없으므로 아무것도 하지 않음 (ConversationStorage 호환)"""
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SQLiteSearchIndex:
+    """SQLiteConversationStorage 의 FTS5 테이블을 쓰는 SearchIndex 호환 검색기
+
+    색인은 저장과 같은 트랜잭션에서 갱신되므로 index_document 등의 갱신 메서드는
+    아무것도 하지 않는다.
+    """
+
+    is_initialized = True
+
+    def __init__(self, storage: SQLiteConversationStorage):
+        self.storage = storage
+
+    def index_document(self, doc_id: str, texts: Iterable[str], messages: Sequence[Any] = ()) -> None:
+        pass
+
+    def add_to_document(self, doc_id: str, messages: Sequence[Any]) -> None:
+        pass
+
+    def remove_document(self, doc_id: str) -> None:
+        pass
+
+    def rebuild(self, documents: Iterable[Any]) -> int:
+        return 0
+
+    def search(
+        self, query: str, limit: Optional[int] = 20, allowed: Optional[Set[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """bm25 점수 순으로 (doc_id, score) 목록 반환 (SearchIndex.search 와 같은 인자)"""
+        match = fts_query(query)
+        if match is None:
+            return []
+        params = {
+            "query": match,
+            "allowed": None if allowed is None else json.dumps(list(allowed)),
+            "limit": -1 if limit is None else limit,
+        }
+        storage = self.storage
+        with storage._lock:
+            return [(doc_id, score) for doc_id, score in storage._conn.execute(_SEARCH, params)]
+
+    def message_hits(
+        self, doc_ids: Sequence[str], query: str, per_doc: int = 3, role: Optional[str] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """문서별로 bm25 점수가 가장 높은 메시지 per_doc 개"""
+        match = fts_query(query)
+        if match is None or not doc_ids:
+            return {}
+        params = {"query": match, "ids": json.dumps(list(doc_ids)), "role": role}
+        best: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+        with self.storage._lock:
+            for doc_id, message_index, score in self.storage._conn.execute(_MESSAGE_HITS, params):
+                best[doc_id].append((score, message_index))
+        keys = []
+        for doc_id, entries in best.items():
+            entries.sort(key=lambda item: (-item[0], item[1]))
+            del entries[per_doc:]
+            keys.extend((doc_id, message_index) for _, message_index in entries)
+        rows = self.get_messages(keys)
+        return {
+            doc_id: [
+                dict(rows[(doc_id, message_index)], score=round(score, 4))
+                for score, message_index in entries
+                if (doc_id, message_index) in rows
+            ]
+            for doc_id, entries in best.items()
+        }
+
+    def get_messages(self, keys: Sequence[Tuple[str, int]]) -> Dict[Tuple[str, int], Dict[str, Any]]:
+        """(doc_id, message_index) 목록의 메시지 (role, content, blob) - SearchIndex.get_messages 와 같은 형태"""
+        if not keys:
+            return {}
+        with self.storage._lock:
+            rows = self.storage._conn.execute(
+                "SELECT conversation_id, message_index, role, content, extra FROM messages "
+                f"WHERE (conversation_id, message_index) IN (VALUES {','.join(['(?, ?)'] * len(keys))})",
+                [value for key in keys for value in key],
+            ).fetchall()
+        result = {}
+        for doc_id, message_index, role, content, extra in rows:
+            message = SQLiteConversationStorage._message(role, content, extra)
+            ref = message.get("content_ref")
+            result[(doc_id, message_index)] = {
+                "message_index": message_index,
+                "role": role,
+                "content": None if ref else expand_message(message).get("content", ""),
+                "blob": ref["hash"] if ref else None,
+            }
+        return result
+
+
+def migrate_json_directory(
+    directory: Path, target: SQLiteConversationStorage, batch_size: int = MIGRATE_BATCH_SIZE
+) -> Dict[str, Any]:
+    """JSON 파일 저장소(기본 문서 + append 로그)의 대화를 SQLite 저장소로 한 번 옮김
+
+    이미 옮긴 적이 있으면(meta.migrated_from) 아무것도 하지 않으며, 대상에 같은 id 가
+    있으면 건너뛴다. 원본 파일은 지우지 않는다.
+    """
+    directory = Path(directory)
+    report: Dict[str, Any] = {"source": str(directory), "migrated": 0, "skipped": 0, "already_migrated": False}
+    if target.get_meta("migrated_from") is not None:
+        report["already_migrated"] = True
+        return report
+    if directory.is_dir():
+        batch: List[Dict[str, Any]] = []
+        for data, _ in ConversationStorage(directory).iter_all():
+            if target.exists(data["id"]):
+                report["skipped"] += 1
+                continue
+            batch.append(data)
+            if len(batch) >= batch_size:
+                report["migrated"] += target.write_many(batch)
+                batch = []
+        report["migrated"] += target.write_many(batch)
+    target.set_meta("migrated_from", str(directory))
+    return report
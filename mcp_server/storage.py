@@ -0,0 +1,410 @@
+"""대화 파일 저장소
+
+대화 하나는 기본 문서(`{id}.json`)와 append 전용 메시지 로그(`{id}.log`, JSONL)로
+구성된다. append 는 새 메시지만 로그 끝에 한 줄로 기록하고, 로그가 충분히 커지면
+백그라운드 스레드가 기본 문서에 병합(compaction)한다.
+
+로그의 각 레코드는 단조 증가하는 seq 를 가지며, 기본 문서는 마지막으로 병합한
+seq 를 `_log_seq` 에 기록한다. 병합 도중 중단되더라도 이미 반영된 레코드는
+seq 비교로 건너뛰므로 메시지가 중복되지 않는다.
+
+stdio MCP 서버에서는 stdout 이 JSON-RPC 채널이므로 오류 메시지는 stderr 로만 쓴다.
+
+모든 파일 교체는 임시 파일에 쓴 뒤 rename 하는 원자적 쓰기로 이루어지므로,
+쓰기 도중 중단되거나 동시에 읽는 쪽이 잘린 파일을 보는 일이 없다.
+PENSIEVE_FSYNC 로 내구성 수준을 고른다.
+
+- none: fsync 하지 않음 (기본값, OS 페이지 캐시에 맡김)
+- always: 쓰기마다 fsync
+- group: 거의 동시에 들어온 쓰기들의 fsync 를 한 번에 묶어 처리 (group commit)
+"""
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Tuple
+
+# 로그가 이 크기와 기본 문서 크기 중 큰 값을 넘으면 병합
+COMPACT_MIN_BYTES = int(os.getenv("PENSIEVE_COMPACT_MIN_BYTES", str(256 * 1024)))
+# 로그 레코드 수가 이 값을 넘어도 병합 (로드 시 재생 비용 제한)
+COMPACT_MAX_RECORDS = int(os.getenv("PENSIEVE_COMPACT_MAX_RECORDS", "512"))
+
+# 기본 문서에만 저장되는 내부 필드
+_LOG_SEQ_FIELD = "_log_seq"
+
+FSYNC_MODE = os.getenv("PENSIEVE_FSYNC", "none").lower()
+# group 모드에서 리더가 다른 쓰기를 모으기 위해 기다리는 시간
+GROUP_COMMIT_WINDOW = float(os.getenv("PENSIEVE_GROUP_COMMIT_MS", "0")) / 1000
+
+
+def _fsync_path(path: Path) -> None:
+    """파일 또는 디렉토리를 fsync (디렉토리 fsync 를 지원하지 않는 플랫폼은 무시)"""
+    if path.is_dir() and os.name == "nt":
+        return
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class GroupCommitter:
+    """여러 스레드의 fsync 요청을 배치로 묶어 처리
+
+    먼저 도착한 스레드가 리더가 되어 그때까지 쌓인 경로를 한 번에 fsync 하고,
+    그 사이 도착한 요청은 다음 배치로 넘어간다. 같은 경로(특히 디렉토리)는
+    배치 안에서 한 번만 fsync 된다.
+    """
+
+    def __init__(self, window: float = 0.0):
+        self.window = window
+        self._cond = threading.Condition()
+        self._pending: set = set()
+        self._batch = 0  # 현재 모으고 있는 배치 번호
+        self._flushed = -1  # 마지막으로 완료된 배치 번호
+        self._flushing = False
+        self._errors: Dict[int, BaseException] = {}
+        self.batches = 0
+        self.requests = 0
+
+    def sync(self, *paths: Path) -> None:
+        """주어진 경로들이 디스크에 기록될 때까지 대기"""
+        with self._cond:
+            self._pending.update(paths)
+            self.requests += 1
+            batch = self._batch
+            while self._flushed < batch:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+
+                self._flushing = True
+                if self.window:
+                    self._cond.release()
+                    try:
+                        time.sleep(self.window)
+                    finally:
+                        self._cond.acquire()
+                flushing_batch = self._batch
+                targets, self._pending = self._pending, set()
+                self._batch += 1
+
+                self._cond.release()
+                error = None
+                try:
+                    for target in targets:
+                        _fsync_path(target)
+                except BaseException as e:
+                    error = e
+                finally:
+                    self._cond.acquire()
+                    if error is not None:
+                        self._errors[flushing_batch] = error
+                    self._flushed = flushing_batch
+                    self._flushing = False
+                    self.batches += 1
+                    self._cond.notify_all()
+
+            error = self._errors.get(batch)
+        if error is not None:
+            raise error
+
+
+_group_committer = GroupCommitter(GROUP_COMMIT_WINDOW)
+
+
+def sync_paths(*paths: Path) -> None:
+    """FSYNC_MODE 에 따라 경로들을 디스크에 반영"""
+    if FSYNC_MODE == "always":
+        for path in paths:
+            _fsync_path(path)
+    elif FSYNC_MODE == "group":
+        _group_committer.sync(*paths)
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """임시 파일에 쓰고 fsync 후 rename 하여 원자적으로 교체"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+        sync_paths(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+    sync_paths(path.parent)
+
+
+class StorageBackend(Protocol):
+    """대화 저장소 인터페이스
+
+    server.py 는 ConversationStorage/SQLiteConversationStorage 를 이 타입으로 고르고,
+    stores.ConversationStore 가 목록/검색/일괄 저장을 더해 엔진 비교에 쓴다.
+    API 서버(api_server/main.py)의 MongoConversationBackend 는 같은 연산의 비동기판이다.
+
+    mtime 은 없는 대화에 0.0 을, read 는 None 을 돌려준다 (예외 없음).
+    """
+
+    def exists(self, conversation_id: str) -> bool: ...
+
+    def mtime(self, conversation_id: str) -> float: ...
+
+    def read(self, conversation_id: str) -> Optional[Dict[str, Any]]: ...
+
+    def write(self, data: Dict[str, Any]) -> None: ...
+
+    def append(self, conversation_id: str, messages: List[Dict[str, Any]], updated_at: str) -> None: ...
+
+    def delete(self, conversation_id: str) -> bool: ...
+
+    def iter_all(self) -> Iterator[Tuple[Dict[str, Any], float]]: ...
+
+
+class _LogState:
+    """대화별 로그 상태 (마지막 seq, 바이트 크기, 레코드 수)"""
+
+    __slots__ = ("seq", "size", "records")
+
+    def __init__(self, seq: int = 0, size: int = 0, records: int = 0):
+        self.seq = seq
+        self.size = size
+        self.records = records
+
+
+class ConversationStorage:
+    """기본 문서 + append 로그 형식의 대화 파일 저장소"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._locks: Dict[str, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+        self._log_states: Dict[str, _LogState] = {}
+        self._compaction_queue: "queue.Queue[str]" = queue.Queue()
+        self._pending_compactions: set = set()
+        self._compactor: Optional[threading.Thread] = None
+
+    # 경로 / 잠금
+
+    def base_path(self, conversation_id: str) -> Path:
+        return self.directory / f"{conversation_id}.json"
+
+    def log_path(self, conversation_id: str) -> Path:
+        return self.directory / f"{conversation_id}.log"
+
+    def _lock_for(self, conversation_id: str) -> threading.RLock:
+        with self._locks_guard:
+            lock = self._locks.get(conversation_id)
+            if lock is None:
+                lock = self._locks[conversation_id] = threading.RLock()
+            return lock
+
+    def exists(self, conversation_id: str) -> bool:
+        return self.base_path(conversation_id).exists()
+
+    def mtime(self, conversation_id: str) -> float:
+        """기본 문서와 로그 중 최근 수정 시각"""
+        mtimes = [
+            path.stat().st_mtime
+            for path in (self.base_path(conversation_id), self.log_path(conversation_id))
+            if path.exists()
+        ]
+        return max(mtimes) if mtimes else 0.0
+
+    # 로그
+
+    def _read_log(self, conversation_id: str) -> Tuple[List[Dict[str, Any]], _LogState]:
+        """로그 레코드를 읽고 상태를 계산 - 중단된 마지막 줄은 잘라낸다"""
+        path = self.log_path(conversation_id)
+        records: List[Dict[str, Any]] = []
+        state = _LogState()
+        if not path.exists():
+            return records, state
+
+        with open(path, 'rb') as f:
+            raw = f.read()
+        valid_end = raw.rfind(b"\n") + 1
+        if valid_end < len(raw):
+            with open(path, 'r+b') as f:
+                f.truncate(valid_end)
+
+        for line in raw[:valid_end].splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            state.seq = max(state.seq, record.get("seq", 0))
+            if "messages" in record:
+                records.append(record)
+                state.records += 1
+        state.size = valid_end
+        return records, state
+
+    def _log_state(self, conversation_id: str) -> _LogState:
+        state = self._log_states.get(conversation_id)
+        if state is None:
+            _, state = self._read_log(conversation_id)
+            self._log_states[conversation_id] = state
+        return state
+
+    def _reset_log(self, conversation_id: str, seq: int) -> None:
+        """로그를 마지막 seq 만 담은 헤더 한 줄로 교체"""
+        path = self.log_path(conversation_id)
+        if seq <= 0:
+            if path.exists():
+                path.unlink()
+                sync_paths(path.parent)
+            self._log_states[conversation_id] = _LogState()
+            return
+
+        header = (json.dumps({"seq": seq}) + "\n").encode("utf-8")
+        atomic_write_bytes(path, header)
+        self._log_states[conversation_id] = _LogState(seq=seq, size=len(header))
+
+    # 기본 문서
+
+    def _read_base(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        path = self.base_path(conversation_id)
+        if not path.exists():
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_base(self, data: Dict[str, Any], log_seq: int) -> None:
+        document = dict(data)
+        if log_seq:
+            document[_LOG_SEQ_FIELD] = log_seq
+        # 들여쓰기 없이 기록 (큰 대화에서 공백만으로 수십 % 가 늘어남)
+        encoded = json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        atomic_write_bytes(self.base_path(data["id"]), encoded)
+
+    def _merge(self, conversation_id: str) -> Tuple[Optional[Dict[str, Any]], _LogState]:
+        """기본 문서에 아직 반영되지 않은 로그 레코드를 재생"""
+        data = self._read_base(conversation_id)
+        if data is None:
+            return None, _LogState()
+        records, state = self._read_log(conversation_id)
+        self._log_states[conversation_id] = state
+
+        base_seq = data.pop(_LOG_SEQ_FIELD, 0)
+        for record in records:
+            if record["seq"] <= base_seq:
+                continue
+            data.setdefault("messages", []).extend(record["messages"])
+            data["updated_at"] = record.get("updated_at", data.get("updated_at"))
+        return data, state
+
+    # 공개 API
+
+    def read(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """기본 문서와 로그를 합친 대화 문서 반환"""
+        with self._lock_for(conversation_id):
+            data, _ = self._merge(conversation_id)
+            return data
+
+    def write(self, data: Dict[str, Any]) -> None:
+        """대화 문서 전체를 기록 (기존 로그는 무효화)"""
+        conversation_id = data["id"]
+        with self._lock_for(conversation_id):
+            seq = self._log_state(conversation_id).seq
+            self._write_base(data, seq)
+            self._reset_log(conversation_id, seq)
+
+    def append(self, conversation_id: str, messages: List[Dict[str, Any]], updated_at: str) -> None:
+        """새 메시지만 로그 끝에 기록 - 비용은 추가된 메시지 크기에 비례"""
+        with self._lock_for(conversation_id):
+            state = self._log_state(conversation_id)
+            record = {"seq": state.seq + 1, "updated_at": updated_at, "messages": messages}
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            path = self.log_path(conversation_id)
+            created = not path.exists()
+            with open(path, 'ab') as f:
+                f.write(line)
+            if created:
+                sync_paths(path, path.parent)
+            else:
+                sync_paths(path)
+            state.seq += 1
+            state.size += len(line)
+            state.records += 1
+
+            if self._needs_compaction(conversation_id, state):
+                self._schedule_compaction(conversation_id)
+
+    def delete(self, conversation_id: str) -> bool:
+        """기본 문서와 로그를 삭제 - 문서가 있었으면 True"""
+        with self._lock_for(conversation_id):
+            existed = False
+            for path in (self.base_path(conversation_id), self.log_path(conversation_id)):
+                try:
+                    path.unlink()
+                    existed = existed or path.suffix == ".json"
+                except FileNotFoundError:
+                    pass
+            self._log_states.pop(conversation_id, None)
+            sync_paths(self.directory)
+            return existed
+
+    def iter_all(self) -> Iterator[Tuple[Dict[str, Any], float]]:
+        """저장된 모든 대화를 (문서, 최근 수정 시각)으로 순회"""
+        for file_path in self.directory.glob("*.json"):
+            conversation_id = file_path.stem
+            try:
+                data = self.read(conversation_id)
+                if data is not None:
+                    yield data, self.mtime(conversation_id)
+            except Exception as e:
+                print(f"Error loading {file_path}: {e}", file=sys.stderr)
+
+    # 병합
+
+    def _needs_compaction(self, conversation_id: str, state: _LogState) -> bool:
+        if state.records >= COMPACT_MAX_RECORDS:
+            return True
+        try:
+            base_size = self.base_path(conversation_id).stat().st_size
+        except FileNotFoundError:
+            return False
+        return state.size >= max(COMPACT_MIN_BYTES, base_size)
+
+    def _schedule_compaction(self, conversation_id: str) -> None:
+        with self._locks_guard:
+            if conversation_id in self._pending_compactions:
+                return
+            self._pending_compactions.add(conversation_id)
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(
+                    target=self._compaction_worker, name="pensieve-compactor", daemon=True
+                )
+                self._compactor.start()
+        self._compaction_queue.put(conversation_id)
+
+    def _compaction_worker(self) -> None:
+        while True:
+            conversation_id = self._compaction_queue.get()
+            with self._locks_guard:
+                self._pending_compactions.discard(conversation_id)
+            try:
+                self.compact(conversation_id)
+            except Exception as e:
+                print(f"Error compacting {conversation_id}: {e}", file=sys.stderr)
+            finally:
+                self._compaction_queue.task_done()
+
+    def compact(self, conversation_id: str) -> None:
+        """로그를 기본 문서에 병합하고 로그를 헤더만 남기고 비움"""
+        with self._lock_for(conversation_id):
+            data, state = self._merge(conversation_id)
+            if data is None or state.records == 0:
+                return
+            self._write_base(data, state.seq)
+            self._reset_log(conversation_id, state.seq)
+
+    def wait_for_compactions(self) -> None:
+        """예약된 병합 작업이 모두 끝날 때까지 대기"""
+        self._compaction_queue.join()
@@ -0,0 +1,427 @@
+"""저장 엔진별 ConversationStore 구현 (벤치마크와 엔진 비교용)
+
+ConversationStore 는 server.py 가 쓰는 StorageBackend 에 목록/검색/일괄 저장을 더한
+것이라 엔진마다 같은 이름의 연산을 같은 의미로 제공한다.
+
+- memory: 프로세스 메모리 dict + 메모리 역색인
+- json: ConversationStorage(파일) + SearchIndex(BM25) + manifest
+- sqlite: SQLiteConversationStorage(FTS5) + manifest
+- mongo: API 서버와 같은 문서 형태의 MongoDB 컬렉션 (pymongo 필요)
+
+server.py 는 blob/벡터/캐시/동기화까지 포함한 자체 경로를 쓰며, 여기의 로컬 엔진은
+그 아래의 StorageBackend/색인/manifest 만 같은 방식으로 묶는다. 목록은 모든 엔진이
+(updated_at, id) 내림차순이다.
+"""
+import math
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol, Tuple
+
+from mcp_server.manifest import ConversationManifest, decode_cursor, encode_cursor
+from mcp_server.search_index import SearchIndex, metadata_texts, tokenize
+from mcp_server.sqlite_storage import SQLiteConversationStorage, SQLiteSearchIndex
+from mcp_server.storage import ConversationStorage, StorageBackend
+
+try:
+    import pymongo
+except ImportError:
+    pymongo = None
+
+ENGINES = ("memory", "json", "sqlite", "mongo")
+
+
+class ConversationStore(StorageBackend, Protocol):
+    """엔진 공통 대화 저장소 인터페이스 (StorageBackend + 목록/검색/일괄 저장)
+
+    대화 문서는 {"id", "messages", "metadata", "created_at", "updated_at"} 형태이고
+    시각은 ISO 8601 문자열이다. append 는 없는 대화에 KeyError 를 낸다.
+    """
+
+    name: str
+
+    def write_many(self, documents: Iterable[Dict[str, Any]]) -> int: ...
+
+    def list(self, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]: ...
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]: ...
+
+    def close(self) -> None: ...
+
+
+def _summary(conversation: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": conversation["id"],
+        "metadata": conversation.get("metadata", {}),
+        "created_at": conversation.get("created_at"),
+        "updated_at": conversation.get("updated_at"),
+        "message_count": len(conversation.get("messages", [])),
+    }
+
+
+def _sort_key(updated_at: Optional[str]) -> float:
+    try:
+        return datetime.fromisoformat(updated_at).timestamp() if updated_at else 0.0
+    except ValueError:
+        return 0.0
+
+
+class MemoryStore:
+    """dict 와 토큰 -> 대화별 tf 메모리 역색인 (다른 엔진의 기준선)"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._conversations: Dict[str, Dict[str, Any]] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._postings: Dict[str, Counter] = {}
+        self._terms: Dict[str, Counter] = {}
+
+    def _index(self, conversation_id: str, texts: Iterable[str]) -> None:
+        counts = self._terms.setdefault(conversation_id, Counter())
+        for text in texts:
+            for term, tf in Counter(tokenize(text)).items():
+                counts[term] += tf
+                self._postings.setdefault(term, Counter())[conversation_id] += tf
+
+    def _unindex(self, conversation_id: str) -> None:
+        for term in self._terms.pop(conversation_id, {}):
+            postings = self._postings[term]
+            del postings[conversation_id]
+            if not postings:
+                del self._postings[term]
+
+    def exists(self, conversation_id: str) -> bool:
+        return conversation_id in self._conversations
+
+    def mtime(self, conversation_id: str) -> float:
+        return self._mtimes.get(conversation_id, 0.0)
+
+    def write(self, conversation: Dict[str, Any]) -> None:
+        conversation_id = conversation["id"]
+        self._unindex(conversation_id)
+        self._conversations[conversation_id] = dict(conversation, messages=list(conversation.get("messages", [])))
+        self._mtimes[conversation_id] = time.time()
+        self._index(
+            conversation_id,
+            metadata_texts(conversation.get("metadata", {}))
+            + [message.get("content", "") for message in conversation.get("messages", [])],
+        )
+
+    def read(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        return self._conversations.get(conversation_id)
+
+    def append(self, conversation_id: str, messages: List[Dict[str, Any]], updated_at: str) -> None:
+        conversation = self._conversations[conversation_id]
+        conversation["messages"].extend(messages)
+        conversation["updated_at"] = updated_at
+        self._mtimes[conversation_id] = time.time()
+        self._index(conversation_id, [message.get("content", "") for message in messages])
+
+    def iter_all(self) -> Iterator[Tuple[Dict[str, Any], float]]:
+        for conversation_id, conversation in list(self._conversations.items()):
+            yield conversation, self._mtimes[conversation_id]
+
+    def list(self, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # 정렬된 목록을 따로 유지하지 않으므로 매번 정렬 (O(n log n))
+        entries = sorted(
+            ((_sort_key(conversation.get("updated_at")), conversation_id)
+             for conversation_id, conversation in self._conversations.items()),
+            reverse=True,
+        )
+        if cursor:
+            position = decode_cursor(cursor)
+            entries = [entry for entry in entries if entry < position]
+        page = entries[:limit]
+        next_cursor = encode_cursor(*page[-1]) if len(page) == limit else None
+        return [_summary(self._conversations[conversation_id]) for _, conversation_id in page], next_cursor
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        total = max(len(self._conversations), 1)
+        scores: Counter = Counter()
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for conversation_id, tf in postings.items():
+                scores[conversation_id] += idf * tf / (tf + 1.2)
+        return scores.most_common(limit)
+
+    def delete(self, conversation_id: str) -> bool:
+        if self._conversations.pop(conversation_id, None) is None:
+            return False
+        del self._mtimes[conversation_id]
+        self._unindex(conversation_id)
+        return True
+
+    def write_many(self, documents: Iterable[Dict[str, Any]]) -> int:
+        count = 0
+        for conversation in documents:
+            self.write(conversation)
+            count += 1
+        return count
+
+    def close(self) -> None:
+        self._conversations.clear()
+        self._mtimes.clear()
+        self._postings.clear()
+        self._terms.clear()
+
+
+class LocalStore:
+    """StorageBackend + 검색 색인 + manifest 를 server.py 와 같은 순서로 갱신하는 로컬 엔진
+
+    manifest 의 sort_key 는 server.py 처럼 쓴 시각이 아니라 updated_at 으로 맞춰서
+    목록 순서가 다른 엔진과 같다.
+    """
+
+    def __init__(self, name: str, storage: StorageBackend, search_index: Any, manifest: ConversationManifest):
+        self.name = name
+        self.storage = storage
+        self.search_index = search_index
+        self.manifest = manifest
+
+    @staticmethod
+    def _entries(messages: List[Dict[str, Any]]) -> List[tuple]:
+        return [(message.get("role"), message.get("content", ""), None) for message in messages]
+
+    def _index(self, conversation: Dict[str, Any]) -> None:
+        self.search_index.index_document(
+            conversation["id"],
+            metadata_texts(conversation.get("metadata", {})),
+            self._entries(conversation.get("messages", [])),
+        )
+        self.manifest.upsert(conversation, sort_key=_sort_key(conversation.get("updated_at")))
+
+    def exists(self, conversation_id: str) -> bool:
+        return self.storage.exists(conversation_id)
+
+    def mtime(self, conversation_id: str) -> float:
+        return self.storage.mtime(conversation_id)
+
+    def write(self, conversation: Dict[str, Any]) -> None:
+        self.storage.write(conversation)
+        self._index(conversation)
+
+    def read(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        return self.storage.read(conversation_id)
+
+    def append(self, conversation_id: str, messages: List[Dict[str, Any]], updated_at: str) -> None:
+        if not self.storage.exists(conversation_id):
+            raise KeyError(conversation_id)
+        self.storage.append(conversation_id, messages, updated_at)
+        self.search_index.add_to_document(conversation_id, self._entries(messages))
+        self.manifest.record_append(
+            conversation_id, [message.get("role") for message in messages], updated_at, sort_key=_sort_key(updated_at)
+        )
+
+    def iter_all(self) -> Iterator[Tuple[Dict[str, Any], float]]:
+        return self.storage.iter_all()
+
+    def list(self, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return self.manifest.list(limit, 0, cursor)
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        return self.search_index.search(query, limit)
+
+    def delete(self, conversation_id: str) -> bool:
+        deleted = self.storage.delete(conversation_id)
+        self.search_index.remove_document(conversation_id)
+        self.manifest.remove(conversation_id)
+        return deleted
+
+    def write_many(self, documents: Iterable[Dict[str, Any]]) -> int:
+        batch = list(documents)
+        if isinstance(self.storage, SQLiteConversationStorage):
+            # 한 트랜잭션으로 기록
+            self.storage.write_many(batch)
+        else:
+            for conversation in batch:
+                self.storage.write(conversation)
+        for conversation in batch:
+            self._index(conversation)
+        return len(batch)
+
+    def close(self) -> None:
+        if hasattr(self.storage, "wait_for_compactions"):
+            self.storage.wait_for_compactions()
+        for resource in (self.storage, self.search_index, self.manifest):
+            close = getattr(resource, "close", None)
+            if close is not None:
+                close()
+
+
+def json_store(directory: Path) -> LocalStore:
+    directory = Path(directory)
+    return LocalStore(
+        "json",
+        ConversationStorage(directory / "conversations"),
+        SearchIndex(directory / "search_index.db"),
+        ConversationManifest(directory / "manifest.db"),
+    )
+
+
+def sqlite_store(directory: Path) -> LocalStore:
+    directory = Path(directory)
+    storage = SQLiteConversationStorage(directory / "conversations.db")
+    return LocalStore("sqlite", storage, SQLiteSearchIndex(storage), ConversationManifest(directory / "manifest.db"))
+
+
+class MongoStore:
+    """API 서버와 같은 문서 형태({_id, user_id, messages, metadata, ...})의 MongoDB 엔진
+
+    API 서버는 Motor(비동기)를 쓰지만 같은 쿼리와 인덱스를 동기 pymongo 로 실행한다.
+    user_id 하나의 대화만 다룬다.
+    """
+
+    name = "mongo"
+
+    def __init__(self, url: str, database: str, collection: str = "conversations", user_id: str = "bench"):
+        if pymongo is None:
+            raise RuntimeError("mongo 엔진에는 pymongo 패키지가 필요합니다 (pip install 'pensieve-mcp[mongo]')")
+        self._client = pymongo.MongoClient(url)
+        self.collection = self._client[database][collection]
+        self.user_id = user_id
+        self.collection.create_index(
+            [("user_id", pymongo.ASCENDING), ("updated_at", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)],
+            name="user_updated_id",
+        )
+        self.collection.create_index(
+            [("messages.content", pymongo.TEXT), ("metadata.title", pymongo.TEXT), ("metadata.tags", pymongo.TEXT)],
+            name="conversation_text",
+            weights={"metadata.title": 5, "metadata.tags": 3, "messages.content": 1},
+            default_language="none",
+        )
+
+    @staticmethod
+    def _datetime(value: Optional[str]) -> datetime:
+        return datetime.fromisoformat(value) if value else datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def _document(self, conversation: Dict[str, Any]) -> Dict[str, Any]:
+        messages = conversation.get("messages", [])
+        return {
+            "_id": conversation["id"],
+            "user_id": self.user_id,
+            "messages": messages,
+            "metadata": conversation.get("metadata", {}),
+            "created_at": self._datetime(conversation.get("created_at")),
+            "updated_at": self._datetime(conversation.get("updated_at")),
+            "message_count": len(messages),
+        }
+
+    @staticmethod
+    def _conversation(document: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": document["_id"],
+            "messages": document.get("messages", []),
+            "metadata": document.get("metadata", {}),
+            "created_at": document["created_at"].isoformat(),
+            "updated_at": document["updated_at"].isoformat(),
+        }
+
+    @staticmethod
+    def _timestamp(value: datetime) -> float:
+        return value.replace(tzinfo=timezone.utc).timestamp()
+
+    def exists(self, conversation_id: str) -> bool:
+        return self.collection.count_documents({"_id": conversation_id, "user_id": self.user_id}, limit=1) > 0
+
+    def mtime(self, conversation_id: str) -> float:
+        document = self.collection.find_one({"_id": conversation_id, "user_id": self.user_id}, {"updated_at": 1})
+        return 0.0 if document is None else self._timestamp(document["updated_at"])
+
+    def write(self, conversation: Dict[str, Any]) -> None:
+        document = self._document(conversation)
+        self.collection.replace_one({"_id": document["_id"], "user_id": self.user_id}, document, upsert=True)
+
+    def read(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        document = self.collection.find_one({"_id": conversation_id, "user_id": self.user_id})
+        return None if document is None else self._conversation(document)
+
+    def append(self, conversation_id: str, messages: List[Dict[str, Any]], updated_at: str) -> None:
+        result = self.collection.update_one(
+            {"_id": conversation_id, "user_id": self.user_id},
+            {
+                "$push": {"messages": {"$each": messages}},
+                "$set": {"updated_at": self._datetime(updated_at)},
+                "$inc": {"message_count": len(messages)},
+            },
+        )
+        if result.matched_count == 0:
+            raise KeyError(conversation_id)
+
+    def iter_all(self) -> Iterator[Tuple[Dict[str, Any], float]]:
+        for document in self.collection.find({"user_id": self.user_id}):
+            yield self._conversation(document), self._timestamp(document["updated_at"])
+
+    def list(self, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        query: Dict[str, Any] = {"user_id": self.user_id}
+        if cursor:
+            sort_key, conversation_id = decode_cursor(cursor)
+            updated_at = datetime.fromtimestamp(sort_key, timezone.utc).replace(tzinfo=None)
+            query["$or"] = [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "_id": {"$lt": conversation_id}},
+            ]
+        documents = list(
+            self.collection.find(query, {"messages": 0})
+            .sort([("updated_at", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)])
+            .limit(limit)
+        )
+        summaries = [
+            {
+                "id": document["_id"],
+                "metadata": document.get("metadata", {}),
+                "created_at": document["created_at"].isoformat(),
+                "updated_at": document["updated_at"].isoformat(),
+                "message_count": document.get("message_count", 0),
+            }
+            for document in documents
+        ]
+        next_cursor = None
+        if len(documents) == limit:
+            last = documents[-1]
+            next_cursor = encode_cursor(self._timestamp(last["updated_at"]), last["_id"])
+        return summaries, next_cursor
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        documents = self.collection.find(
+            {"user_id": self.user_id, "$text": {"$search": query}},
+            {"score": {"$meta": "textScore"}},
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit)
+        return [(document["_id"], document["score"]) for document in documents]
+
+    def delete(self, conversation_id: str) -> bool:
+        return self.collection.delete_one({"_id": conversation_id, "user_id": self.user_id}).deleted_count > 0
+
+    def write_many(self, documents: Iterable[Dict[str, Any]]) -> int:
+        operations = [
+            pymongo.ReplaceOne({"_id": document["_id"], "user_id": self.user_id}, document, upsert=True)
+            for document in map(self._document, documents)
+        ]
+        if not operations:
+            return 0
+        self.collection.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    def drop(self) -> None:
+        """컬렉션 삭제 (벤치마크 정리용)"""
+        self.collection.drop()
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def open_store(engine: str, directory: Optional[Path] = None, **options: Any) -> ConversationStore:
+    """엔진 이름으로 저장소 생성 - 로컬 엔진은 directory, mongo 는 url/database/collection 옵션을 받음"""
+    if engine == "memory":
+        return MemoryStore()
+    if engine in ("json", "sqlite"):
+        if directory is None:
+            raise ValueError(f"{engine} 엔진에는 저장 디렉토리가 필요합니다")
+        return json_store(directory) if engine == "json" else sqlite_store(directory)
+    if engine == "mongo":
+        return MongoStore(**options)
+    raise ValueError(f"알 수 없는 저장 엔진: {engine}")
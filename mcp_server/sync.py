@@ -0,0 +1,445 @@
+"""로컬 저장소와 클라우드 API 사이의 증분 동기화
+
+양쪽 모두 마지막 동기화 이후의 변경만 주고받는다.
+
+- 로컬: 저장/append/삭제 시 changes 테이블에 대화 ID 를 기록 (변경 로그)
+- 서버: GET /conversations/changes 가 since 토큰 이후 바뀐 대화 요약과 삭제 기록을 반환
+
+대화마다 로컬 ID 와 원격 ID, 그리고 양쪽이 같다고 확인된 앞부분 메시지 수
+(synced_count)와 그 구간의 해시(synced_digest), 마지막으로 본 원격 재작성 버전
+(remote_version)을 links 테이블에 보관한다.
+이후에는 그 뒤에 붙은 메시지만 /conversations/{id}/messages 로 올리거나
+?after= 구간 조회로 내려받는다.
+
+충돌 해결 규칙 (어느 기기에서 실행해도 같은 결과):
+
+1. 삭제가 수정보다 우선한다.
+2. 동기화된 앞부분이 바뀐 경우(전체 재작성)는 append 보다 우선한다. 로컬 재작성은
+   원격을 덮어쓰고, 원격 rewrite_version 이 바뀌었거나 메시지 수가 synced_count 보다
+   줄었으면 원격을 받아온다.
+3. 양쪽 모두 메시지를 덧붙였으면 서버 순서를 따른다. 공통 부분 + 원격 신규 + 로컬 신규
+   순서로 로컬을 다시 쓰고 로컬 신규 메시지를 서버 끝에 붙인다.
+
+메타데이터는 대화를 처음 연결하거나 원격 문서를 통째로 받아올 때만 옮긴다.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+# 한 번의 가져오기 요청에 담을 새 대화 수
+PUSH_BATCH_SIZE = 100
+# 응답에 포함할 실패 항목 수
+MAX_REPORTED_ERRORS = 20
+
+
+class SyncResponseError(Exception):
+    """서버 응답 본문이 JSON 이 아니거나 필요한 필드가 없음"""
+
+
+def messages_digest(messages: List[Dict[str, Any]]) -> str:
+    """서버가 보관하는 필드(role, content)만으로 계산한 메시지 목록 해시"""
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(json.dumps([message.get("role"), message.get("content")], ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def common_prefix(left: List[Dict[str, Any]], right: List[Dict[str, Any]]) -> int:
+    """두 메시지 목록이 앞에서부터 일치하는 길이"""
+    count = 0
+    for a, b in zip(left, right):
+        if (a.get("role"), a.get("content")) != (b.get("role"), b.get("content")):
+            break
+        count += 1
+    return count
+
+
+class Link:
+    __slots__ = ("local_id", "remote_id", "synced_count", "synced_digest", "remote_version")
+
+    def __init__(self, local_id: str, remote_id: str, synced_count: int, synced_digest: str, remote_version: int = 0):
+        self.local_id = local_id
+        self.remote_id = remote_id
+        self.synced_count = synced_count
+        self.synced_digest = synced_digest
+        self.remote_version = remote_version
+
+
+class SyncState:
+    """로컬 변경 로그, 대화 연결 정보, 서버 동기화 토큰을 담는 SQLite 파일"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    changed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS links (
+                    local_id TEXT PRIMARY KEY,
+                    remote_id TEXT NOT NULL UNIQUE,
+                    synced_count INTEGER NOT NULL,
+                    synced_digest TEXT NOT NULL,
+                    remote_version INTEGER NOT NULL DEFAULT 0
+                );
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(links)")}
+            if "remote_version" not in columns:
+                # 이전 버전 sync.db - 서버 문서도 버전 필드가 없으면 0 으로 보므로 기본값 0
+                self._conn.execute("ALTER TABLE links ADD COLUMN remote_version INTEGER NOT NULL DEFAULT 0")
+
+    # 변경 로그
+
+    def record_change(self, conversation_id: str, kind: str) -> None:
+        """로컬 저장(save)/추가(append)/삭제(delete)를 기록"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO changes (conversation_id, kind, changed_at) VALUES (?, ?, ?)",
+                (conversation_id, kind, time.time()),
+            )
+
+    def pending_changes(self) -> Tuple[int, Dict[str, str]]:
+        """아직 올리지 않은 변경의 마지막 seq 와 대화별 마지막 변경 종류"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, conversation_id, kind FROM changes WHERE seq > ? ORDER BY seq",
+                (int(self.get_meta("pushed_seq", "0")),),
+            ).fetchall()
+        last_seq = rows[-1][0] if rows else int(self.get_meta("pushed_seq", "0"))
+        return last_seq, {conversation_id: kind for _, conversation_id, kind in rows}
+
+    def mark_pushed(self, seq: int) -> None:
+        """seq 까지의 변경을 반영 완료로 표시하고 로그에서 지움"""
+        with self._lock, self._conn:
+            self._set_meta("pushed_seq", str(seq))
+            self._conn.execute("DELETE FROM changes WHERE seq <= ?", (seq,))
+
+    # 메타
+
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._set_meta(key, value)
+
+    # 연결 정보
+
+    def _link(self, column: str, value: str) -> Optional[Link]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT local_id, remote_id, synced_count, synced_digest, remote_version FROM links WHERE {column} = ?",
+                (value,),
+            ).fetchone()
+        return Link(*row) if row else None
+
+    def link_for_local(self, local_id: str) -> Optional[Link]:
+        return self._link("local_id", local_id)
+
+    def link_for_remote(self, remote_id: str) -> Optional[Link]:
+        return self._link("remote_id", remote_id)
+
+    def save_link(self, local_id: str, remote_id: str, messages: List[Dict[str, Any]], remote_version: int) -> Link:
+        """messages 까지 양쪽이 같아졌고 원격이 remote_version 재작성 버전임을 기록"""
+        link = Link(local_id, remote_id, len(messages), messages_digest(messages), remote_version)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO links (local_id, remote_id, synced_count, synced_digest, remote_version) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (link.local_id, link.remote_id, link.synced_count, link.synced_digest, link.remote_version),
+            )
+        return link
+
+    def remove_link(self, local_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM links WHERE local_id = ?", (local_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SyncEngine:
+    """SyncState 와 HTTP 클라이언트로 한 번의 양방향 동기화를 수행
+
+    load/write/append/delete 는 로컬 저장소 함수로, 색인과 manifest 갱신 및 변경
+    기록까지 맡는다. 동기화가 로컬에 쓴 내용도 변경 로그에 남지만 다음 동기화에서
+    synced_count 와 비교해 추가 요청 없이 건너뛴다.
+    """
+
+    def __init__(
+        self,
+        state: SyncState,
+        client: httpx.Client,
+        load: Callable[[str], Optional[Dict[str, Any]]],
+        write: Callable[[Dict[str, Any]], Any],
+        append: Callable[[str, List[Dict[str, Any]], Optional[str]], Any],
+        delete: Callable[[str], Any],
+    ):
+        self.state = state
+        self.client = client
+        self.load = load
+        self.write = write
+        self.append = append
+        self.delete = delete
+        self.report: Dict[str, Any] = {}
+
+    # HTTP
+
+    def _request(self, method: str, path: str, required: Tuple[str, ...] = (), **kwargs) -> Dict[str, Any]:
+        """요청을 보내고 JSON 객체 응답을 반환 (required 필드가 빠진 응답은 SyncResponseError)"""
+        response = self.client.request(method, path, **kwargs)
+        response.raise_for_status()
+        try:
+            body = response.json()
+        except ValueError as e:
+            raise SyncResponseError(f"{method} {path}: JSON 이 아닌 응답 ({e})") from e
+        if not isinstance(body, dict) or any(key not in body for key in required):
+            raise SyncResponseError(f"{method} {path}: 응답에 필요한 필드가 없음 ({', '.join(required)})")
+        return body
+
+    def _fetch_messages(self, remote_id: str, after: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """after 인덱스 다음부터 끝까지의 원격 메시지와 마지막 응답 문서"""
+        messages: List[Dict[str, Any]] = []
+        while True:
+            document = self._request("GET", f"/conversations/{remote_id}", params={"after": after})
+            messages.extend(document.get("messages", []))
+            if document.get("next_after") is None:
+                return messages, document
+            after = document["next_after"]
+
+    def _remote_changes(self) -> Tuple[Dict[str, Dict[str, Any]], List[str], Optional[str]]:
+        """since 토큰 이후의 원격 변경을 모든 페이지에 걸쳐 수집"""
+        token = self.state.get_meta("remote_token")
+        changed: Dict[str, Dict[str, Any]] = {}
+        deleted: List[str] = []
+        while True:
+            params = {"since": token} if token else {}
+            page = self._request(
+                "GET", "/conversations/changes", ("conversations", "deleted", "next_token", "has_more"), params=params
+            )
+            for summary in page["conversations"]:
+                changed[summary["id"]] = summary
+            deleted.extend(item["id"] for item in page["deleted"])
+            token = page["next_token"]
+            if not page["has_more"]:
+                return changed, deleted, token
+
+    # 대화 단위 처리
+
+    def _count(self, key: str) -> None:
+        self.report[key] = self.report.get(key, 0) + 1
+
+    def _pull_new(self, summary: Dict[str, Any]) -> None:
+        """로컬에 없는 원격 대화를 원격 ID 그대로 받아옴"""
+        messages, document = self._fetch_messages(summary["id"], -1)
+        self.write({
+            "id": summary["id"],
+            "messages": messages,
+            "metadata": summary.get("metadata") or {},
+            "created_at": summary.get("created_at"),
+            "updated_at": summary.get("updated_at"),
+        })
+        self.state.save_link(summary["id"], summary["id"], messages, document.get("rewrite_version", 0))
+        self._count("pulled_new")
+
+    def _adopt(self, local_id: str, remote_id: str) -> None:
+        """가져오기 등으로 이미 서버에 있는 로컬 대화를 공통 앞부분 기준으로 연결"""
+        local = self.load(local_id) or {"messages": []}
+        remote_messages, document = self._fetch_messages(remote_id, -1)
+        prefix = common_prefix(local.get("messages", []), remote_messages)
+        version = document.get("rewrite_version", 0)
+        link = self.state.save_link(local_id, remote_id, remote_messages[:prefix], version)
+        self._reconcile(link, len(remote_messages), version)
+
+    def _push_new(self, documents: List[Dict[str, Any]]) -> None:
+        """원격에 없는 로컬 대화를 /conversations/import 로 한 번에 올림 (로컬 ID 로 중복 방지)"""
+        for start in range(0, len(documents), PUSH_BATCH_SIZE):
+            batch = documents[start:start + PUSH_BATCH_SIZE]
+            body = "".join(json.dumps(data, ensure_ascii=False) + "\n" for data in batch)
+            result = self._request(
+                "POST",
+                "/conversations/import",
+                ("results",),
+                content=body.encode("utf-8"),
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+            if len(result["results"]) != len(batch):
+                raise SyncResponseError("POST /conversations/import: 결과 수가 보낸 대화 수와 다름")
+            for data, item in zip(batch, result["results"]):
+                try:
+                    if item["status"] == "created":
+                        self.state.save_link(data["id"], item["id"], data.get("messages", []), 0)
+                        self._count("pushed_new")
+                    elif item["status"] == "exists":
+                        self._adopt(data["id"], item["id"])
+                    else:
+                        self._error(data["id"], item.get("error", "import failed"))
+                except (httpx.HTTPError, SyncResponseError, KeyError, TypeError) as e:
+                    self._error(data["id"], str(e) or type(e).__name__)
+
+    def _reconcile(self, link: Link, remote_count: Optional[int], remote_version: Optional[int] = None) -> None:
+        """연결된 대화의 양쪽 변경을 맞춤 - remote_count 가 None 이면 원격 변경 없음"""
+        local = self.load(link.local_id)
+        if local is None:
+            # 로컬 삭제는 원격 수정보다 우선
+            self._delete_remote(link)
+            return
+
+        messages = local.get("messages", [])
+        synced = link.synced_count
+        if remote_count is None:
+            remote_count = synced
+        if remote_version is None:
+            remote_version = link.remote_version
+
+        if len(messages) < synced or messages_digest(messages[:synced]) != link.synced_digest:
+            # 로컬에서 동기화된 부분까지 다시 쓴 경우 - 원격을 통째로 덮어씀
+            result = self._request("PUT", f"/conversations/{link.remote_id}", json={"messages": messages})
+            # 자기 재작성으로 올라간 버전을 기록해 다음 동기화에서 원격 재작성으로 오인하지 않음
+            self.state.save_link(link.local_id, link.remote_id, messages, result.get("rewrite_version", 0))
+            self._count("pushed_replaced")
+            return
+
+        local_new = messages[synced:]
+        if remote_version != link.remote_version or remote_count < synced:
+            # 원격에서 다시 쓴 경우 (메시지 수가 같거나 늘었어도 버전이 바뀌면 재작성)
+            # - 원격 문서 뒤에 로컬 신규 메시지를 붙임
+            base, document = self._fetch_messages(link.remote_id, -1)
+            remote_version = document.get("rewrite_version", remote_version)
+            remote_new: List[Dict[str, Any]] = []
+            merged = base + local_new
+            local = dict(local, metadata=document.get("metadata", local.get("metadata", {})))
+            rewrite = True
+            self._count("pulled_replaced")
+        else:
+            base = messages[:synced]
+            remote_new = self._fetch_messages(link.remote_id, synced - 1)[0] if remote_count > synced else []
+            merged = base + remote_new + local_new
+            rewrite = bool(remote_new and local_new)
+            if rewrite:
+                self._count("conflicts")
+
+        if rewrite:
+            self.write(dict(local, messages=merged))
+        elif remote_new:
+            # 키를 주어 로컬의 "직전과 같은 내용" 중복 판별에 걸리지 않게 함
+            self.append(link.local_id, remote_new, f"sync:{link.remote_id}:{synced}:{messages_digest(remote_new)}")
+        if remote_new:
+            self._count("pulled_appends")
+        if local_new:
+            # 위치와 내용으로 만든 키라 응답을 못 받고 다시 실행해도 중복 추가되지 않음
+            key = f"sync:{link.remote_id}:{synced}:{messages_digest(local_new)}"
+            self._request(
+                "POST",
+                f"/conversations/{link.remote_id}/messages",
+                json=local_new,
+                headers={"Idempotency-Key": key},
+            )
+            self._count("pushed_appends")
+        if rewrite or remote_new or local_new:
+            self.state.save_link(link.local_id, link.remote_id, merged, remote_version)
+
+    def _delete_remote(self, link: Link) -> None:
+        response = self.client.delete(f"/conversations/{link.remote_id}")
+        if response.status_code not in (200, 404):
+            response.raise_for_status()
+        self.state.remove_link(link.local_id)
+        self._count("pushed_deletes")
+
+    def _error(self, conversation_id: str, error: str) -> None:
+        errors = self.report.setdefault("errors", [])
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"id": conversation_id, "error": error})
+        self.report["failed"] = self.report.get("failed", 0) + 1
+
+    # 전체 동기화
+
+    def run(self) -> Dict[str, Any]:
+        """원격 변경을 받고 로컬 변경을 올린 뒤 결과 통계를 반환
+
+        실패한 대화가 있으면 변경 로그 위치와 서버 토큰을 전진시키지 않으므로
+        다시 실행하면 같은 변경을 이어서 처리한다 (이미 맞춘 대화는 건너뜀).
+        """
+        self.report = {}
+        pushed_seq, local_changes = self.state.pending_changes()
+        remote_changed, remote_deleted, token = self._remote_changes()
+
+        for remote_id in remote_deleted:
+            link = self.state.link_for_remote(remote_id)
+            if link is None or remote_id in remote_changed:
+                continue
+            self.delete(link.local_id)
+            self.state.remove_link(link.local_id)
+            local_changes.pop(link.local_id, None)
+            self._count("pulled_deletes")
+
+        for remote_id, summary in remote_changed.items():
+            link = self.state.link_for_remote(remote_id)
+            local_id = link.local_id if link else None
+            try:
+                if link is not None:
+                    self._reconcile(link, summary.get("message_count", 0), summary.get("rewrite_version", 0))
+                else:
+                    client_id = summary.get("client_id")
+                    if client_id and self.state.link_for_local(client_id) is None and self.load(client_id):
+                        local_id = client_id
+                        self._adopt(client_id, remote_id)
+                    else:
+                        self._pull_new(summary)
+            except (httpx.HTTPError, SyncResponseError) as e:
+                # 응답이 깨졌어도 이 대화만 실패로 기록하고 나머지는 계속 처리
+                self._error(local_id or remote_id, str(e))
+            if local_id:
+                local_changes.pop(local_id, None)
+
+        new_documents = []
+        for local_id in local_changes:
+            link = self.state.link_for_local(local_id)
+            try:
+                if link is not None:
+                    self._reconcile(link, None)
+                    continue
+                data = self.load(local_id)
+                if data is not None:
+                    new_documents.append(data)
+            except (httpx.HTTPError, SyncResponseError) as e:
+                self._error(local_id, str(e))
+        if new_documents:
+            try:
+                self._push_new(new_documents)
+            except (httpx.HTTPError, SyncResponseError) as e:
+                for data in new_documents:
+                    self._error(data["id"], str(e))
+
+        if not self.report.get("failed"):
+            self.state.mark_pushed(pushed_seq)
+            self.state.set_meta("remote_token", token)
+        self.state.set_meta("last_sync_at", str(time.time()))
+        return self.report
@@ -0,0 +1,421 @@
+"""로컬 대화 저장소용 의미 검색 벡터 색인
+
+메시지마다 임베딩 벡터 하나를 vectors.f32 (float32 행렬)에 이어 쓰고, 어느 행이 어떤
+대화의 몇 번째 메시지인지는 SQLite 에 기록한다. 행렬은 memmap 으로 읽으므로 전체를
+메모리에 올리지 않는다.
+
+- 행 수가 IVF_MIN_ROWS 미만이면 전체 행렬과의 내적(brute force)으로 찾는다.
+- 그 이상이면 k-means 중심(centroids.npy)으로 행을 목록(list)에 나눠 두고, 질의와
+  가까운 PENSIEVE_VECTOR_NPROBE 개 목록의 행만 비교한다 (IVF).
+
+임베딩은 외부 모델 없이 동작하는 HashingEmbedder 가 기본이며,
+PENSIEVE_EMBEDDER=패키지.모듈:팩토리 로 name/dim/embed(texts) 를 가진 객체를 돌려주는
+팩토리를 지정하면 로컬 모델로 바꿀 수 있다. numpy 가 설치되어 있어야 한다.
+"""
+import hashlib
+import importlib
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from mcp_server.search_index import tokenize
+
+INDEX_VERSION = "1"
+
+VECTOR_DIM = int(os.getenv("PENSIEVE_VECTOR_DIM", "384"))
+VECTOR_NPROBE = int(os.getenv("PENSIEVE_VECTOR_NPROBE", "8"))
+# 이 행 수부터 IVF 목록을 만들어 일부 목록만 탐색
+IVF_MIN_ROWS = int(os.getenv("PENSIEVE_VECTOR_IVF_MIN_ROWS", "50000"))
+IVF_MAX_LISTS = 4096
+KMEANS_ITERATIONS = 10
+KMEANS_MAX_SAMPLE = 100_000
+# 임베딩할 메시지 본문 최대 길이 (긴 붙여넣기가 쓰기 경로를 느리게 하지 않도록)
+EMBED_MAX_CHARS = 8000
+# 삭제된 행이 이 비율을 넘으면 벡터 파일을 다시 씀
+COMPACT_DEAD_RATIO = 0.33
+COMPACT_MIN_DEAD = 1000
+# 메타데이터(제목/태그) 벡터의 message_index
+METADATA_INDEX = -1
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature_hash(feature: str) -> int:
+    # 내장 hash() 는 프로세스마다 달라지므로 고정된 해시를 사용
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashingEmbedder:
+    """외부 모델 없이 동작하는 hashing trick 임베딩
+
+    색인 토큰(영문 단어, 한글 음절 bigram)과 영문 단어의 문자 trigram 을 부호 있는
+    해시로 dim 차원에 모은 뒤 정규화한다. 어형이 바뀐 단어(search/searching)도
+    trigram 을 공유하므로 BM25 가 놓치는 부분 일치를 잡는다.
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> Counter:
+        features: Counter = Counter()
+        for token in tokenize(text[:EMBED_MAX_CHARS]):
+            features[token] += 1.0
+            if token.isascii() and len(token) > 4:
+                padded = f"<{token}>"
+                for i in range(len(padded) - 2):
+                    features["#" + padded[i:i + 3]] += 0.5
+        return features
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                h = _feature_hash(feature)
+                # 최상위 비트로 부호를 정해 해시 충돌이 한쪽으로 쌓이지 않게 함
+                sign = 1.0 if h >> 63 else -1.0
+                weight = 1.0 + math.log(count) if count >= 1 else count
+                vectors[row, h % self.dim] += sign * weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def load_embedder(spec: Optional[str] = None):
+    """PENSIEVE_EMBEDDER 설정으로 임베딩 객체 생성 (hashing 또는 모듈:팩토리)"""
+    spec = spec or os.getenv("PENSIEVE_EMBEDDER", "hashing")
+    if spec == "hashing":
+        return HashingEmbedder()
+    module_name, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"PENSIEVE_EMBEDDER 는 hashing 또는 모듈:팩토리 형식이어야 합니다: {spec}")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+class VectorIndex:
+    """memmap 벡터 행렬 + SQLite 행 정보로 구성된 근사 최근접 이웃 색인"""
+
+    def __init__(self, directory: Path, embedder):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self._vectors_path = self.directory / "vectors.f32"
+        self._centroids_path = self.directory / "centroids.npy"
+        self._lock = threading.RLock()
+        self._matrix_cache: Optional[Tuple[int, Any]] = None
+        self._centroids = np.load(self._centroids_path) if self._centroids_path.exists() else None
+        self._conn = sqlite3.connect(str(self.directory / "vectors.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS docs (
+                    doc_id TEXT PRIMARY KEY,
+                    message_count INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS vectors (
+                    row INTEGER PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    message_index INTEGER NOT NULL,
+                    list_id INTEGER NOT NULL DEFAULT -1
+                );
+                CREATE INDEX IF NOT EXISTS vectors_doc ON vectors (doc_id);
+                CREATE INDEX IF NOT EXISTS vectors_list ON vectors (list_id);
+                """
+            )
+        # SQLite 기록 전에 중단되어 파일 끝에 남은 행은 버림
+        self._truncate(self._get_meta("rows", 0))
+
+    @property
+    def is_initialized(self) -> bool:
+        """현재 임베딩 설정으로 색인이 구축되었는지 여부"""
+        return (
+            self._get_meta("version") == INDEX_VERSION
+            and self._get_meta("embedder") == self.embedder.name
+        )
+
+    def _get_meta(self, key: str, default: Any = None) -> Any:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        return int(row[0]) if isinstance(default, int) else row[0]
+
+    def _set_meta(self, key: str, value: Any) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    # 벡터 파일
+
+    def _truncate(self, rows: int) -> None:
+        if self._vectors_path.exists() and self._vectors_path.stat().st_size != rows * self.dim * 4:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(rows * self.dim * 4)
+            self._matrix_cache = None
+
+    def _write_vectors(self, vectors: "np.ndarray") -> int:
+        """행렬 끝에 벡터를 쓰고 첫 행 번호 반환 (SQLite 기록은 호출한 쪽에서)"""
+        start = self._get_meta("rows", 0)
+        mode = "r+b" if self._vectors_path.exists() else "w+b"
+        with open(self._vectors_path, mode) as f:
+            f.seek(start * self.dim * 4)
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.truncate()
+        self._set_meta("rows", start + len(vectors))
+        self._matrix_cache = None
+        return start
+
+    def _matrix(self) -> Optional["np.ndarray"]:
+        rows = self._get_meta("rows", 0)
+        if rows == 0:
+            return None
+        if self._matrix_cache is None or self._matrix_cache[0] != rows:
+            matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            self._matrix_cache = (rows, matrix)
+        return self._matrix_cache[1]
+
+    # 색인 갱신
+
+    def _assign(self, vectors: "np.ndarray") -> List[int]:
+        if self._centroids is None:
+            return [-1] * len(vectors)
+        return (vectors @ self._centroids.T).argmax(axis=1).tolist()
+
+    def _add(self, doc_id: str, entries: List[Tuple[int, str]]) -> None:
+        entries = [(index, text) for index, text in entries if text and text.strip()]
+        if not entries:
+            return
+        vectors = self.embedder.embed([text for _, text in entries])
+        start = self._write_vectors(vectors)
+        self._conn.executemany(
+            "INSERT INTO vectors (row, doc_id, message_index, list_id) VALUES (?, ?, ?, ?)",
+            [
+                (start + offset, doc_id, index, list_id)
+                for offset, ((index, _), list_id) in enumerate(zip(entries, self._assign(vectors)))
+            ],
+        )
+
+    def _remove(self, doc_id: str) -> None:
+        self._conn.execute("DELETE FROM vectors WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+
+    def index_document(self, doc_id: str, messages: List[str], metadata: str = "") -> None:
+        """대화를 (재)색인 - 기존 벡터는 모두 교체"""
+        with self._lock:
+            with self._conn:
+                self._remove(doc_id)
+                self._add(doc_id, [(METADATA_INDEX, metadata)] + list(enumerate(messages)))
+                self._conn.execute(
+                    "INSERT INTO docs (doc_id, message_count) VALUES (?, ?)", (doc_id, len(messages))
+                )
+            self._maintain()
+
+    def add_messages(self, doc_id: str, messages: List[str]) -> None:
+        """append 된 메시지만 추가 색인"""
+        with self._lock:
+            with self._conn:
+                row = self._conn.execute(
+                    "SELECT message_count FROM docs WHERE doc_id = ?", (doc_id,)
+                ).fetchone()
+                start = row[0] if row else 0
+                self._add(doc_id, list(enumerate(messages, start)))
+                self._conn.execute(
+                    "INSERT INTO docs (doc_id, message_count) VALUES (?, ?) "
+                    "ON CONFLICT(doc_id) DO UPDATE SET message_count = ?",
+                    (doc_id, start + len(messages), start + len(messages)),
+                )
+            self._maintain()
+
+    def remove_document(self, doc_id: str) -> None:
+        with self._lock:
+            with self._conn:
+                self._remove(doc_id)
+            self._maintain()
+
+    def rebuild(self, documents: Iterable[Tuple[str, List[str], str]]) -> int:
+        """(doc_id, 메시지 본문 목록, 메타데이터 텍스트)로 전체 색인을 다시 구축"""
+        count = 0
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM vectors")
+                self._conn.execute("DELETE FROM docs")
+                self._conn.execute("DELETE FROM meta")
+                self._truncate(0)
+                self._drop_centroids()
+                for doc_id, messages, metadata in documents:
+                    self._add(doc_id, [(METADATA_INDEX, metadata)] + list(enumerate(messages)))
+                    self._conn.execute(
+                        "INSERT INTO docs (doc_id, message_count) VALUES (?, ?)", (doc_id, len(messages))
+                    )
+                    count += 1
+                self._set_meta("version", INDEX_VERSION)
+                self._set_meta("embedder", self.embedder.name)
+            self._maintain()
+        return count
+
+    # 정리 / IVF 학습
+
+    def _live_rows(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def _maintain(self) -> None:
+        """삭제된 행이 많으면 압축하고, 행 수가 충분히 늘면 IVF 목록을 (다시) 학습"""
+        rows = self._get_meta("rows", 0)
+        live = self._live_rows()
+        dead = rows - live
+        if dead >= COMPACT_MIN_DEAD and dead > rows * COMPACT_DEAD_RATIO:
+            self._compact()
+        trained = self._get_meta("trained_rows", 0)
+        if live >= IVF_MIN_ROWS and (self._centroids is None or live >= 2 * trained):
+            self._train()
+        elif live < IVF_MIN_ROWS // 2 and self._centroids is not None:
+            with self._conn:
+                self._drop_centroids()
+
+    def _compact(self) -> None:
+        """살아 있는 행만 새 파일로 옮기고 행 번호를 다시 매김"""
+        matrix = self._matrix()
+        old_rows = [row[0] for row in self._conn.execute("SELECT row FROM vectors ORDER BY row")]
+        temp_path = self._vectors_path.with_suffix(".tmp")
+        with open(temp_path, "wb") as f:
+            for i in range(0, len(old_rows), 65536):
+                f.write(np.ascontiguousarray(matrix[old_rows[i:i + 65536]]).tobytes())
+        with self._conn:
+            # 새 행 번호가 기존 번호와 겹치지 않도록 음수를 거쳐 옮김
+            self._conn.executemany(
+                "UPDATE vectors SET row = ? WHERE row = ?",
+                [(-(new + 1), old) for new, old in enumerate(old_rows)],
+            )
+            self._conn.execute("UPDATE vectors SET row = -row - 1")
+            self._matrix_cache = None
+            os.replace(temp_path, self._vectors_path)
+            self._set_meta("rows", len(old_rows))
+
+    def _drop_centroids(self) -> None:
+        self._centroids = None
+        self._conn.execute("UPDATE vectors SET list_id = -1")
+        self._set_meta("trained_rows", 0)
+        if self._centroids_path.exists():
+            self._centroids_path.unlink()
+
+    def _train(self) -> None:
+        """표본으로 spherical k-means 를 돌려 중심을 만들고 모든 행을 목록에 배정"""
+        matrix = self._matrix()
+        live_rows = np.array([row[0] for row in self._conn.execute("SELECT row FROM vectors ORDER BY row")])
+        lists = min(IVF_MAX_LISTS, max(1, int(math.sqrt(len(live_rows)))))
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(live_rows, min(len(live_rows), KMEANS_MAX_SAMPLE), replace=False))
+        sample = np.asarray(matrix[sample_rows])
+        centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = (sample @ centroids.T).argmax(axis=1)
+            for k in range(lists):
+                members = sample[labels == k]
+                if len(members):
+                    centroids[k] = members.sum(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        assignments = []
+        for i in range(0, len(live_rows), 65536):
+            rows = live_rows[i:i + 65536]
+            labels = (np.asarray(matrix[rows]) @ centroids.T).argmax(axis=1)
+            assignments.extend(zip(labels.tolist(), rows.tolist()))
+        with self._conn:
+            self._conn.executemany("UPDATE vectors SET list_id = ? WHERE row = ?", assignments)
+            self._set_meta("trained_rows", len(live_rows))
+        np.save(self._centroids_path, centroids)
+        self._centroids = centroids
+
+    # 검색
+
+    def search(
+        self, query: str, limit: int = 20, allowed: Optional[Set[str]] = None
+    ) -> List[Tuple[str, float, int]]:
+        """코사인 유사도 순으로 (doc_id, score, 가장 가까운 message_index) 반환
+
+        allowed 가 있으면 그 문서만 결과에 넣는다 (후보를 더 넓게 뽑은 뒤 거름).
+        """
+        if not query.strip():
+            return []
+        q = self.embedder.embed([query])[0]
+        # 한 대화에 여러 메시지가 걸리므로 행 후보는 넉넉히 뽑음
+        candidates = limit * (8 if allowed is None else 32)
+        with self._lock:
+            matrix = self._matrix()
+            if matrix is None:
+                return []
+            if self._centroids is not None:
+                probe = np.argsort(-(self._centroids @ q))[:VECTOR_NPROBE].tolist()
+                rows = np.array([
+                    row[0] for row in self._conn.execute(
+                        f"SELECT row FROM vectors WHERE list_id IN ({','.join('?' * len(probe))}) ORDER BY row",
+                        probe,
+                    )
+                ], dtype=np.int64)
+                if len(rows) == 0:
+                    return []
+                scores = np.asarray(matrix[rows]) @ q
+            else:
+                # 삭제된 행도 포함해 계산하고 아래 SQLite 조회에서 걸러냄
+                rows = None
+                scores = np.asarray(matrix) @ q
+            top = np.argpartition(-scores, min(candidates, len(scores) - 1))[:candidates]
+            top = top[np.argsort(-scores[top])]
+            top_rows = rows[top] if rows is not None else top
+            placeholders = ",".join("?" * len(top_rows))
+            info = {
+                row: (doc_id, message_index)
+                for row, doc_id, message_index in self._conn.execute(
+                    f"SELECT row, doc_id, message_index FROM vectors WHERE row IN ({placeholders})",
+                    top_rows.tolist(),
+                )
+            }
+
+        best: Dict[str, Tuple[float, int]] = {}
+        for row, score in zip(top_rows.tolist(), scores[top].tolist()):
+            # 공유하는 특징이 없는 행 (해시 충돌로 생긴 작은 값) 은 결과에서 제외
+            if row not in info or score <= 0:
+                continue
+            doc_id, message_index = info[row]
+            if allowed is not None and doc_id not in allowed:
+                continue
+            if doc_id not in best:
+                best[doc_id] = (score, message_index)
+        ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)
+        return [(doc_id, score, message_index) for doc_id, (score, message_index) in ranked[:limit]]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "embedder": self.embedder.name,
+                "rows": self._get_meta("rows", 0),
+                "live_rows": self._live_rows(),
+                "lists": 0 if self._centroids is None else len(self._centroids),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_vector_index(directory: Path) -> Optional[VectorIndex]:
+    """PENSIEVE_VECTOR_SEARCH=on 이고 numpy 가 있으면 벡터 색인을 연다
+
+    켜 두면 저장/추가마다 임베딩 비용이 들고, 색인이 없을 때의 첫 쓰기나 검색이
+    모든 대화로 색인을 구축하므로 기본은 꺼져 있다.
+    """
+    if np is None or os.getenv("PENSIEVE_VECTOR_SEARCH", "off").lower() not in ("1", "on", "true"):
+        return None
+    return VectorIndex(directory, load_embedder())
@@ -0,0 +1,23 @@
+"""테스트 공용 픽스처"""
+from typing import Any, Dict, List
+
+import pytest
+
+
+def make_conversation(conversation_id: str, messages: List[str], updated_at: str = "2024-01-01T00:00:00", **metadata: Any) -> Dict[str, Any]:
+    """user/assistant 를 번갈아 가진 대화 문서"""
+    return {
+        "id": conversation_id,
+        "messages": [
+            {"role": "user" if index % 2 == 0 else "assistant", "content": content}
+            for index, content in enumerate(messages)
+        ],
+        "metadata": metadata,
+        "created_at": updated_at,
+        "updated_at": updated_at,
+    }
+
+
+@pytest.fixture
+def conversation():
+    return make_conversation
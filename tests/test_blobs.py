@@ -0,0 +1,95 @@
+"""BlobStore: 내용 주소 저장, 참조 수, 고정(pin)과 정리"""
+import hashlib
+
+import pytest
+
+from mcp_server import blobs
+from mcp_server.blobs import BlobStore
+
+BIG_A = "a" * 600
+BIG_B = "b" * 600
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobs, "BLOB_MIN_BYTES", 512)
+    store = BlobStore(tmp_path / "blobs")
+    yield store
+    store.close()
+
+
+def digest(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def save(store, conversation_id, contents, replace=True):
+    """server.write_conversation 처럼 문서를 쓴 뒤 참조를 기록"""
+    messages, hashes = store.store_messages({"role": "user", "content": content} for content in contents)
+    store.commit(conversation_id, hashes, replace=replace)
+    return messages
+
+
+def test_large_bodies_become_refs(store):
+    messages = save(store, "c", ["small", BIG_A])
+    assert messages[0] == {"role": "user", "content": "small"}
+    assert "content" not in messages[1]
+    assert messages[1]["content_ref"] == {"hash": digest(BIG_A), "size": 600}
+    assert store.resolve_message(messages[1])["content"] == BIG_A
+    assert store.resolve_conversation({"messages": messages})["messages"][1]["content"] == BIG_A
+
+
+def test_same_body_is_stored_once(store):
+    save(store, "c1", [BIG_A, BIG_A])
+    save(store, "c2", [BIG_A])
+    assert store.stats() == {"blobs": 1, "references": 3}
+    assert len([path for path in store.directory.rglob("*") if path.is_file() and path.parent != store.directory]) == 1
+
+
+def test_rewrite_collects_orphans_but_keeps_shared(store):
+    save(store, "c1", [BIG_A, BIG_B])
+    save(store, "c2", [BIG_A])
+    save(store, "c1", ["small"])
+
+    assert store.path(digest(BIG_A)).exists()
+    assert not store.path(digest(BIG_B)).exists()
+    store.release("c2")
+    assert not store.path(digest(BIG_A)).exists()
+    assert store.stats() == {"blobs": 0, "references": 0}
+
+
+def test_abort_keeps_the_previous_document_readable(store):
+    previous = save(store, "c", [BIG_A])
+    # 새 문서를 쓰지 못한 경우
+    _, hashes = store.store_messages([{"role": "user", "content": BIG_B}])
+    store.abort(hashes)
+
+    assert store.resolve_message(previous[0])["content"] == BIG_A
+    assert not store.path(digest(BIG_B)).exists()
+    assert store.stats() == {"blobs": 1, "references": 1}
+
+
+def test_abort_of_append_does_not_leak_refs(store):
+    save(store, "c", ["small"])
+    _, hashes = store.store_messages([{"role": "user", "content": BIG_A}])
+    store.abort(hashes)
+    assert store.stats() == {"blobs": 0, "references": 0}
+    assert not store.path(digest(BIG_A)).exists()
+
+
+def test_pinned_blob_survives_concurrent_release(store):
+    save(store, "c1", [BIG_A])
+    # c2 가 같은 본문을 썼지만 아직 문서를 기록하기 전에 c1 이 삭제됨
+    messages, hashes = store.store_messages([{"role": "user", "content": BIG_A}])
+    store.release("c1")
+    assert store.path(digest(BIG_A)).exists()
+
+    store.commit("c2", hashes, replace=True)
+    assert store.resolve_message(messages[0])["content"] == BIG_A
+    store.release("c2")
+    assert not store.path(digest(BIG_A)).exists()
+
+
+def test_append_adds_refs(store):
+    save(store, "c", [BIG_A])
+    save(store, "c", [BIG_B], replace=False)
+    assert store.stats() == {"blobs": 2, "references": 2}
@@ -0,0 +1,81 @@
+"""메시지/바이트 압축 봉투(envelope)"""
+import gzip
+import json
+import os
+
+import pytest
+
+from mcp_server import compression
+from mcp_server.compression import (
+    compress_message,
+    expand_message,
+    export_samples,
+    pack_bytes,
+    pack_text,
+    unpack_bytes,
+    unpack_text,
+)
+
+BODY = "compressible body " * 400
+
+
+@pytest.fixture(autouse=True)
+def zlib_codec(monkeypatch):
+    # zstandard 설치 여부와 관계없이 같은 결과가 나오도록
+    monkeypatch.setattr(compression, "CODEC", "zlib")
+    monkeypatch.setattr(compression, "COMPRESS_MIN_BYTES", 1024)
+
+
+def test_large_message_roundtrip():
+    message = {"role": "user", "content": BODY, "name": "x"}
+    compressed = compress_message(message)
+    assert "content" not in compressed
+    assert compressed["content_z"]["codec"] == "zlib"
+    assert compressed["name"] == "x"
+    assert expand_message(compressed) == message
+
+
+def test_small_or_incompressible_messages_are_untouched(monkeypatch):
+    small = {"role": "user", "content": "short"}
+    assert compress_message(small) is small
+    assert expand_message(small) is small
+    # 임의의 16진 문자열은 절반 정도로만 줄어들므로 비율 한도를 낮추면 압축하지 않음
+    monkeypatch.setattr(compression, "COMPRESS_MAX_RATIO", 0.3)
+    noise = {"role": "user", "content": os.urandom(2048).hex()}
+    assert compress_message(noise) is noise
+
+
+def test_pack_bytes_is_self_describing(monkeypatch):
+    raw = BODY.encode("utf-8")
+    packed = pack_bytes(raw)
+    assert packed.startswith(b'{"codec": "zlib"}\n')
+    assert unpack_bytes(packed) == raw
+    # 압축 방식을 바꿔도 이전에 쓴 데이터를 읽을 수 있음
+    monkeypatch.setattr(compression, "CODEC", "none")
+    assert unpack_bytes(packed) == raw
+    assert unpack_bytes(pack_bytes(raw)) == raw
+
+
+def test_pack_text():
+    assert pack_text("short") == "short"
+    packed = pack_text(BODY)
+    assert isinstance(packed, bytes) and len(packed) < len(BODY)
+    assert unpack_text(packed) == BODY
+    assert unpack_text("short") == "short"
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        unpack_bytes(b'{"codec": "lz4"}\nxxx')
+
+
+def test_export_samples_reads_plain_and_gzip(tmp_path):
+    line = json.dumps({"messages": [{"content": "one"}, {"content": ""}, {"content": "two"}]}) + "\n"
+    plain = tmp_path / "a.ndjson"
+    plain.write_text(line + "\n", encoding="utf-8")
+    packed = tmp_path / "b.ndjson.gz"
+    with gzip.open(packed, "wt", encoding="utf-8") as f:
+        f.write(line)
+
+    assert list(export_samples([plain, packed], 10)) == ["one", "two", "one", "two"]
+    assert list(export_samples([plain, packed], 3)) == ["one", "two", "one"]
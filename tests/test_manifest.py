@@ -0,0 +1,144 @@
+"""ConversationManifest: 목록/커서/필터와 append 판별(Idempotency-Key, dedup)"""
+import sqlite3
+
+import pytest
+
+from mcp_server.manifest import (
+    APPEND_HISTORY_SIZE,
+    ConversationManifest,
+    decode_cursor,
+    encode_cursor,
+    message_hash,
+    tail_overlap,
+)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = ConversationManifest(tmp_path / "manifest.db")
+    yield manifest
+    manifest.close()
+
+
+def hashes(*contents):
+    return [message_hash({"role": "user", "content": content}) for content in contents]
+
+
+def test_tail_overlap():
+    assert tail_overlap(["a", "b", "c"], ["b", "c", "d"]) == 2
+    assert tail_overlap(["a", "b", "c"], ["c"]) == 1
+    assert tail_overlap(["a", "b"], ["x", "a"]) == 0
+    assert tail_overlap([], ["a"]) == 0
+
+
+def test_cursor_roundtrip_and_invalid():
+    assert decode_cursor(encode_cursor(12.5, "abc")) == (12.5, "abc")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_list_pages_by_sort_key_without_duplicates(manifest, conversation):
+    for index in range(7):
+        manifest.upsert(conversation(f"c{index}", ["x"] * index), sort_key=float(index % 3))
+
+    ids, cursor = [], None
+    while True:
+        page, cursor = manifest.list(limit=3, cursor=cursor)
+        ids += [entry["id"] for entry in page]
+        if cursor is None:
+            break
+    # sort_key 내림차순, 같은 sort_key 안에서는 id 내림차순
+    assert ids == ["c5", "c2", "c4", "c1", "c6", "c3", "c0"]
+    assert manifest.get_many(["c3", "missing"])["c3"]["message_count"] == 3
+
+
+def test_filters_and_facets(manifest, conversation):
+    manifest.upsert(conversation("a", ["q", "a"], title="Deploy notes", tags=["ops", "k8s"]))
+    manifest.upsert(conversation("b", ["q"], title="Lunch", tags="food, ops"))
+
+    assert manifest.matching_ids({"tags": ["ops"]}) == {"a", "b"}
+    assert manifest.matching_ids({"tags": ["ops", "k8s"]}) == {"a"}
+    assert manifest.matching_ids({"title": "deploy"}) == {"a"}
+    assert manifest.matching_ids({"role": "assistant"}) == {"a"}
+    facets = manifest.facets()
+    assert facets["total"] == 2
+    assert facets["tags"] == {"ops": 2, "food": 1, "k8s": 1}
+    assert facets["roles"] == {"user": 2, "assistant": 1}
+
+
+def test_idempotency_key_claims_once(manifest, conversation):
+    manifest.upsert(conversation("a", ["one"]))
+    assert manifest.claim_append("a", hashes("two"), "key-1") == 0
+    assert manifest.claim_append("a", hashes("two"), "key-1") is None
+    # 실패한 append 의 키를 되돌리면 재시도가 통과
+    manifest.release_append("a", "key-1")
+    assert manifest.claim_append("a", hashes("two"), "key-1") == 0
+
+
+def test_idempotency_history_is_bounded(manifest, conversation):
+    manifest.upsert(conversation("a", ["one"]))
+    for index in range(APPEND_HISTORY_SIZE + 5):
+        assert manifest.claim_append("a", hashes(str(index)), f"key-{index}") == 0
+    count = manifest._conn.execute("SELECT COUNT(*) FROM append_history WHERE conversation_id = 'a'").fetchone()[0]
+    assert count == APPEND_HISTORY_SIZE
+
+
+def test_repeated_content_without_dedup_is_appended(manifest, conversation):
+    manifest.upsert(conversation("a", ["same"]))
+    assert manifest.claim_append("a", hashes("same"), None) == 0
+
+
+def test_dedup_skips_messages_already_at_the_tail(manifest, conversation):
+    manifest.upsert(conversation("a", ["one"]))
+    assert manifest.claim_append("a", hashes("two", "three"), None, dedup=True) == 0
+    manifest.record_append("a", ["user", "user"], "2024-01-02T00:00:00", hashes("two", "three"))
+
+    # 재시도에 이미 추가된 앞쪽 메시지가 섞여 온 경우
+    assert manifest.claim_append("a", hashes("three", "four"), None, dedup=True) == 1
+    assert manifest.claim_append("a", hashes("two", "three"), None, dedup=True) is None
+    assert manifest.list()[0][0]["message_count"] == 3
+
+
+def test_upsert_resets_dedup_tail(manifest, conversation):
+    manifest.upsert(conversation("a", ["one", "reply", "two"]))
+    assert manifest.claim_append("a", hashes("two"), None, dedup=True) is None
+    manifest.upsert(conversation("a", ["rewritten"]))
+    assert manifest.claim_append("a", hashes("two"), None, dedup=True) == 0
+
+
+def test_remove_drops_rows(manifest, conversation):
+    manifest.upsert(conversation("a", ["one"], tags=["t"]))
+    manifest.claim_append("a", hashes("x"), "key")
+    manifest.remove("a")
+    assert manifest.list() == ([], None)
+    assert manifest.matching_ids({"tags": ["t"]}) == set()
+    assert manifest.claim_append("a", hashes("x"), "key") == 0
+
+
+def test_rebuild_marks_initialized(manifest, conversation):
+    assert not manifest.is_initialized
+    assert manifest.rebuild([(conversation("a", ["one"]), 1.0), (conversation("b", []), 2.0)]) == 2
+    assert manifest.is_initialized
+    assert [entry["id"] for entry in manifest.list()[0]] == ["b", "a"]
+
+
+def test_old_append_history_schema_is_migrated(tmp_path):
+    path = tmp_path / "manifest.db"
+    conn = sqlite3.connect(str(path))
+    conn.executescript(
+        """
+        CREATE TABLE append_history (
+            conversation_id TEXT NOT NULL, idempotency_key TEXT, digest TEXT NOT NULL, appended_at REAL NOT NULL
+        );
+        INSERT INTO append_history VALUES ('a', 'key-1', '', 1.0), ('a', NULL, 'abc', 2.0);
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    manifest = ConversationManifest(path)
+    columns = [row[1] for row in manifest._conn.execute("PRAGMA table_info(append_history)")]
+    assert columns == ["conversation_id", "idempotency_key", "appended_at"]
+    assert manifest.claim_append("a", hashes("x"), "key-1") is None
+    assert manifest.claim_append("a", hashes("x"), "key-2") == 0
+    manifest.close()
@@ -0,0 +1,101 @@
+"""SearchIndex: 토큰화, BM25 순위, 메시지 단위 일치와 증분 색인"""
+import pytest
+
+from mcp_server import compression
+from mcp_server.search_index import INDEX_VERSION, SearchIndex, build_snippet, match_offsets, metadata_texts, tokenize
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(tmp_path / "search_index.db")
+    yield index
+    index.close()
+
+
+def entries(*contents):
+    return [("user", content, None) for content in contents]
+
+
+def test_tokenize_splits_hangul_into_bigrams():
+    assert tokenize("Hello, World 42") == ["hello", "world", "42"]
+    assert tokenize("데이터베이스를") == ["데이", "이터", "터베", "베이", "이스", "스를"]
+    assert tokenize("가") == ["가"]
+
+
+def test_metadata_texts_flattens_values():
+    assert metadata_texts({"title": "t", "tags": ["a", "b"], "pinned": True, "n": 3, "x": None}) == ["t", "a", "b", "3"]
+
+
+def test_match_offsets_respects_word_boundaries():
+    assert match_offsets("index reindex Index", ["index"]) == [(0, 5), (14, 19)]
+    snippet = build_snippet("x" * 300 + " needle", ["needle"], width=40)
+    assert "needle" in snippet["snippet"]
+    assert snippet["offsets"] == [[301, 307]]
+
+
+def test_search_ranks_by_bm25(index):
+    index.index_document("a", ["deploy"], entries("kubernetes deploy deploy"))
+    index.index_document("b", [], entries("deploy once", "lunch"))
+    index.index_document("c", [], entries("unrelated"))
+
+    ranked = index.search("deploy")
+    assert [doc_id for doc_id, _ in ranked] == ["a", "b"]
+    assert index.search("deploy", allowed={"b"})[0][0] == "b"
+    assert index.search("") == []
+
+
+def test_korean_query_matches_word_with_particle(index):
+    index.index_document("a", [], entries("데이터베이스를 설계했다"))
+    assert index.search("데이터베이스")[0][0] == "a"
+
+
+def test_reindex_replaces_postings(index):
+    index.index_document("a", [], entries("alpha"))
+    index.index_document("a", [], entries("beta"))
+    assert index.search("alpha") == []
+    assert index.search("beta")[0][0] == "a"
+
+
+def test_append_continues_message_numbering(index):
+    index.index_document("a", [], entries("first", "second"))
+    index.add_to_document("a", entries("third needle"))
+
+    hits = index.message_hits(["a"], "needle")["a"]
+    assert [hit["message_index"] for hit in hits] == [2]
+    assert hits[0]["content"] == "third needle"
+    assert set(index.get_messages([("a", 0), ("a", 1), ("a", 2)])) == {("a", 0), ("a", 1), ("a", 2)}
+
+
+def test_message_hits_filter_by_role(index):
+    index.index_document("a", [], [("user", "needle question", None), ("assistant", "needle answer", None)])
+    hits = index.message_hits(["a"], "needle", role="assistant")["a"]
+    assert [(hit["message_index"], hit["role"]) for hit in hits] == [(1, "assistant")]
+
+
+def test_blob_messages_store_only_the_hash(index):
+    index.index_document("a", [], [("user", "needle in a blob", "abc123")])
+    hit = index.message_hits(["a"], "needle")["a"][0]
+    assert hit["content"] is None
+    assert hit["blob"] == "abc123"
+
+
+def test_large_bodies_are_stored_compressed(index, monkeypatch):
+    monkeypatch.setattr(compression, "COMPRESS_MIN_BYTES", 64)
+    body = "needle " + "repeated text " * 50
+    index.index_document("a", [], entries(body))
+
+    stored = index._conn.execute("SELECT content FROM messages WHERE doc_id = 'a'").fetchone()[0]
+    assert isinstance(stored, bytes) and len(stored) < len(body)
+    assert index.message_hits(["a"], "needle")["a"][0]["content"] == body
+
+
+def test_remove_and_rebuild(index):
+    index.index_document("a", [], entries("alpha"))
+    index.remove_document("a")
+    assert index.search("alpha") == []
+
+    assert not index.is_initialized
+    assert index.rebuild([("b", ["title"], entries("beta")), ("c", [], entries("beta gamma"))]) == 2
+    assert index.is_initialized
+    assert {doc_id for doc_id, _ in index.search("beta")} == {"b", "c"}
+    assert index._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0] == INDEX_VERSION
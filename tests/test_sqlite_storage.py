@@ -0,0 +1,84 @@
+"""SQLiteConversationStorage / SQLiteSearchIndex 와 JSON 디렉토리 이전"""
+import pytest
+
+from mcp_server.sqlite_storage import SQLiteConversationStorage, SQLiteSearchIndex, fts_query, migrate_json_directory
+from mcp_server.storage import ConversationStorage
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteConversationStorage(tmp_path / "conversations.db")
+    yield store
+    store.close()
+
+
+def contents(data):
+    return [message["content"] for message in data["messages"]]
+
+
+def test_roundtrip_and_append(store, conversation):
+    store.write(conversation("a", ["one", "two"], title="T"))
+    store.append("a", [{"role": "user", "content": "three"}], "2024-01-02T00:00:00")
+
+    data = store.read("a")
+    assert contents(data) == ["one", "two", "three"]
+    assert data["metadata"] == {"title": "T"}
+    assert data["updated_at"] == "2024-01-02T00:00:00"
+    assert store.mtime("a") > 0
+
+
+def test_missing_conversation(store):
+    assert store.read("missing") is None
+    assert store.mtime("missing") == 0.0
+    assert store.delete("missing") is False
+    with pytest.raises(KeyError):
+        store.append("missing", [{"role": "user", "content": "x"}], "2024-01-02T00:00:00")
+
+
+def test_write_replaces_messages(store, conversation):
+    store.write(conversation("a", ["one", "two"]))
+    store.write(conversation("a", ["rewritten"]))
+    assert contents(store.read("a")) == ["rewritten"]
+
+
+def test_write_many_delete_and_iter_all(store, conversation):
+    assert store.write_many(conversation(f"c{index}", [str(index)]) for index in range(3)) == 3
+    assert store.count() == 3
+    assert store.delete("c1") is True
+    assert sorted(data["id"] for data, _ in store.iter_all()) == ["c0", "c2"]
+
+
+def test_fts_query_quotes_tokens():
+    assert fts_query("Hello 데이터") == '"hello" OR "데이" OR "이터"'
+    assert fts_query("!!!") is None
+
+
+def test_search_and_message_hits(store, conversation):
+    store.write(conversation("a", ["deploy the service", "done"]))
+    store.write(conversation("b", ["lunch plans"]))
+    store.append("b", [{"role": "assistant", "content": "deploy after lunch"}], "2024-01-02T00:00:00")
+    index = SQLiteSearchIndex(store)
+
+    assert {doc_id for doc_id, _ in index.search("deploy")} == {"a", "b"}
+    assert index.search("deploy", allowed={"b"})[0][0] == "b"
+    hits = index.message_hits(["b"], "deploy")["b"]
+    assert [(hit["message_index"], hit["content"]) for hit in hits] == [(1, "deploy after lunch")]
+
+    store.delete("b")
+    assert [doc_id for doc_id, _ in index.search("deploy")] == ["a"]
+
+
+def test_migrate_json_directory_runs_once(tmp_path, store, conversation):
+    source = ConversationStorage(tmp_path / "json")
+    source.write(conversation("a", ["one"]))
+    source.append("a", [{"role": "user", "content": "two"}], "2024-01-02T00:00:00")
+    source.write(conversation("b", ["other"]))
+    store.write(conversation("b", ["already here"]))
+
+    report = migrate_json_directory(tmp_path / "json", store)
+    assert (report["migrated"], report["skipped"], report["already_migrated"]) == (1, 1, False)
+    assert contents(store.read("a")) == ["one", "two"]
+    assert contents(store.read("b")) == ["already here"]
+    # 원본은 그대로 두고, 두 번째 실행은 아무것도 하지 않음
+    assert source.exists("a")
+    assert migrate_json_directory(tmp_path / "json", store)["already_migrated"] is True
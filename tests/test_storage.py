@@ -0,0 +1,117 @@
+"""ConversationStorage: 기본 문서 + append 로그, 병합, 잘린 줄 복구"""
+import json
+
+import pytest
+
+from mcp_server import storage as storage_module
+from mcp_server.storage import ConversationStorage, atomic_write_bytes
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ConversationStorage(tmp_path / "conversations")
+
+
+def contents(data):
+    return [message["content"] for message in data["messages"]]
+
+
+def test_write_read_roundtrip(store, conversation):
+    store.write(conversation("a", ["hi", "hello"]))
+    assert store.exists("a")
+    assert contents(store.read("a")) == ["hi", "hello"]
+    assert "_log_seq" not in store.read("a")
+
+
+def test_missing_conversation(store):
+    assert store.read("missing") is None
+    assert not store.exists("missing")
+    assert store.mtime("missing") == 0.0
+    assert store.delete("missing") is False
+
+
+def test_append_writes_only_the_log(store, conversation):
+    store.write(conversation("a", ["one"]))
+    base = store.base_path("a").read_bytes()
+    store.append("a", [{"role": "assistant", "content": "two"}], "2024-01-02T00:00:00")
+    store.append("a", [{"role": "user", "content": "three"}], "2024-01-03T00:00:00")
+
+    assert store.base_path("a").read_bytes() == base
+    data = store.read("a")
+    assert contents(data) == ["one", "two", "three"]
+    assert data["updated_at"] == "2024-01-03T00:00:00"
+    # 새 인스턴스도 같은 결과 (로그 상태를 파일에서 다시 계산)
+    assert contents(ConversationStorage(store.directory).read("a")) == ["one", "two", "three"]
+
+
+def test_torn_last_log_line_is_dropped(store, conversation):
+    store.write(conversation("a", ["one"]))
+    store.append("a", [{"role": "user", "content": "two"}], "2024-01-02T00:00:00")
+    with open(store.log_path("a"), "ab") as f:
+        f.write(b'{"seq": 2, "messages": [{"role": "us')
+
+    reopened = ConversationStorage(store.directory)
+    assert contents(reopened.read("a")) == ["one", "two"]
+    assert store.log_path("a").read_bytes().endswith(b"\n")
+    # 잘린 줄 뒤에 이어 쓴 레코드도 정상적으로 읽힘
+    reopened.append("a", [{"role": "user", "content": "three"}], "2024-01-03T00:00:00")
+    assert contents(ConversationStorage(store.directory).read("a")) == ["one", "two", "three"]
+
+
+def test_compaction_merges_log_into_base(store, conversation, monkeypatch):
+    monkeypatch.setattr(storage_module, "COMPACT_MAX_RECORDS", 3)
+    store.write(conversation("a", ["zero"]))
+    for index in range(1, 4):
+        store.append("a", [{"role": "user", "content": str(index)}], f"2024-01-0{index}T00:00:00")
+    store.wait_for_compactions()
+
+    base = json.loads(store.base_path("a").read_text(encoding="utf-8"))
+    assert [message["content"] for message in base["messages"]] == ["zero", "1", "2", "3"]
+    assert base["_log_seq"] == 3
+    log_lines = store.log_path("a").read_bytes().splitlines()
+    assert [json.loads(line) for line in log_lines] == [{"seq": 3}]
+
+    store.append("a", [{"role": "user", "content": "4"}], "2024-01-05T00:00:00")
+    assert contents(ConversationStorage(store.directory).read("a")) == ["zero", "1", "2", "3", "4"]
+
+
+def test_interrupted_compaction_does_not_duplicate(store, conversation):
+    store.write(conversation("a", ["zero"]))
+    store.append("a", [{"role": "user", "content": "1"}], "2024-01-02T00:00:00")
+    store.append("a", [{"role": "user", "content": "2"}], "2024-01-03T00:00:00")
+    # 기본 문서는 병합했지만 로그를 비우기 전에 중단된 상태
+    merged = store.read("a")
+    store._write_base(merged, 2)
+
+    assert contents(ConversationStorage(store.directory).read("a")) == ["zero", "1", "2"]
+
+
+def test_write_replaces_logged_messages(store, conversation):
+    store.write(conversation("a", ["one"]))
+    store.append("a", [{"role": "user", "content": "two"}], "2024-01-02T00:00:00")
+    store.write(conversation("a", ["rewritten"]))
+
+    assert contents(store.read("a")) == ["rewritten"]
+    store.append("a", [{"role": "user", "content": "after"}], "2024-01-03T00:00:00")
+    assert contents(ConversationStorage(store.directory).read("a")) == ["rewritten", "after"]
+
+
+def test_delete_and_iter_all(store, conversation):
+    store.write(conversation("a", ["one"]))
+    store.write(conversation("b", ["two"]))
+    store.append("b", [{"role": "user", "content": "three"}], "2024-01-02T00:00:00")
+
+    documents = {data["id"]: contents(data) for data, mtime in store.iter_all() if mtime > 0}
+    assert documents == {"a": ["one"], "b": ["two", "three"]}
+
+    assert store.delete("b") is True
+    assert not store.log_path("b").exists()
+    assert [data["id"] for data, _ in store.iter_all()] == ["a"]
+
+
+def test_atomic_write_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "file.json"
+    atomic_write_bytes(path, b"first")
+    atomic_write_bytes(path, b"second")
+    assert path.read_bytes() == b"second"
+    assert [entry.name for entry in tmp_path.iterdir()] == ["file.json"]
@@ -0,0 +1,70 @@
+"""ConversationStore 엔진들이 같은 연산을 같은 의미로 제공하는지"""
+from datetime import datetime
+
+import pytest
+
+from mcp_server.stores import open_store
+
+LOCAL_ENGINES = ("memory", "json", "sqlite")
+
+
+@pytest.fixture(params=LOCAL_ENGINES)
+def store(request, tmp_path):
+    store = open_store(request.param, tmp_path / request.param)
+    yield store
+    store.close()
+
+
+def test_write_read_append(store, conversation):
+    store.write(conversation("a", ["one"]))
+    store.append("a", [{"role": "assistant", "content": "two"}], "2024-01-02T00:00:00")
+
+    data = store.read("a")
+    assert [message["content"] for message in data["messages"]] == ["one", "two"]
+    assert data["updated_at"] == "2024-01-02T00:00:00"
+    assert store.exists("a")
+    assert store.mtime("a") > 0
+
+
+def test_missing_conversation(store):
+    assert store.read("missing") is None
+    assert not store.exists("missing")
+    assert store.mtime("missing") == 0.0
+    assert store.delete("missing") is False
+    with pytest.raises(KeyError):
+        store.append("missing", [{"role": "user", "content": "x"}], "2024-01-02T00:00:00")
+
+
+def test_search_and_delete(store, conversation):
+    store.write_many([conversation("a", ["deploy the service"]), conversation("b", ["lunch"])])
+    assert store.search("deploy")[0][0] == "a"
+    assert store.delete("a") is True
+    assert store.search("deploy") == []
+    assert [data["id"] for data, _ in store.iter_all()] == ["b"]
+
+
+def list_ids(store):
+    ids, cursor = [], None
+    while True:
+        page, cursor = store.list(4, cursor)
+        ids += [entry["id"] for entry in page]
+        if cursor is None:
+            return ids
+
+
+def test_list_order_is_the_same_on_every_engine(tmp_path, conversation):
+    orders = {}
+    for engine in LOCAL_ENGINES:
+        store = open_store(engine, tmp_path / engine)
+        store.write_many(
+            conversation(f"c{index:02d}", ["x"], updated_at=f"2024-01-{index % 5 + 1:02d}T00:00:00")
+            for index in range(10)
+        )
+        store.append("c03", [{"role": "user", "content": "y"}], datetime(2024, 2, 1).isoformat())
+        orders[engine] = list_ids(store)
+        store.close()
+
+    # updated_at 내림차순, 같은 시각이면 id 내림차순
+    assert orders["memory"] == ["c03", "c09", "c04", "c08", "c07", "c02", "c06", "c01", "c05", "c00"]
+    assert orders["json"] == orders["memory"]
+    assert orders["sqlite"] == orders["memory"]